@@ -1,40 +1,33 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import os 
-from datetime import datetime
 import numpy as np
-import json 
-import plotly.graph_objects as go
-
-
-# --- 0. SIMULATION DES COUTS STRATEGIQUES (EN DUR) ---
-COUT_RAPPEl_GRAVE_UNITAIRE = 50000.0  
-COUT_RAPPEl_MINEUR_UNITAIRE = 5000.0   
-COUT_LOGISTIQUE_JOUR_SUPP = 500.0      
-SEUIL_IMR_ALERTE = 10.0                
-risques_graves_keywords = "listeriose|salmonellose|e\.coli|blessures|allergene non declare|corps étranger" 
-
-# Nouveaux Keywords pour les indicateurs de cause racine (simulés)
-keywords_fournisseur = "allergene non declare|composition|etiquetage non conforme|matiere premiere"
-keywords_logistique = "temperature|rupture de la chaine du froid|probleme de distribution|conditionnement"
-keywords_recurrence_simule = ["salmonelle", "listeria", "e.coli"] # Pour la simulation du TRCR
-
-# --- NOUVELLES CONSTANTES : LOGIQUE TRAFFIC LIGHT ---
-SEUIL_VERT_MAX = 5     
-SEUIL_ORANGE_MAX = 15  
-# Seuils pour l'IPC (Indice de Pression Concurrentielle : IMR Marque / IMR Marché)
-SEUIL_IPC_BON = 0.95   # Marque fait mieux que le marché
-SEUIL_IPC_MOYEN = 1.05 # Marque fait légèrement moins bien que le marché
-
-# Fonction pour attribuer un "Traffic Light" à une fréquence
-def get_traffic_light(count):
-    if count <= SEUIL_VERT_MAX:
-        return "🟢 Faible (Green)"
-    elif count <= SEUIL_ORANGE_MAX:
-        return "🟠 Modéré (Amber)"
-    else:
-        return "🔴 Critique (Red)"
+from functools import partial
+
+from recall_analytics import dataset, engine, exports, figures, filters, geo, ingestion, kpis, loader, perf
+
+
+# --- CLASSEMENT DES MARQUES (LEAGUE TABLE) ---
+# Colonne de kpis.league_table -> libellé affiché (et choix de tri)
+CLASSEMENT_COLONNES = {
+    "Rappels": "Rappels",
+    "Part_pourcent": "Part (%)",
+    "Graves": "Rappels Graves",
+    "IMR": "IMR",
+    "Gravite_Moyenne": "Gravité Moyenne",
+    "Cout_Implicite": "Coût Implicite (€)",
+    "IPC": "IPC",
+}
+CLASSEMENT_TAILLES_PAGE = [25, 50, 100, 250]
+
+# Registre détaillé : libellés des tris (ordres précalculés par le moteur) et tailles de page
+REGISTRE_TRIS = {
+    engine.TRI_PERTINENCE: "Pertinence (recherche)",
+    "date_publication": "Date de publication",
+    "nom_marque_du_produit": "Marque",
+    "categorie_de_produit": "Catégorie",
+}
+REGISTRE_TAILLES_PAGE = [50, 100, 250, 500]
 
 # Fonction pour attribuer la couleur de la flèche (delta_color)
 # 'inverse' = True si une valeur plus basse est meilleure (ex: IMR)
@@ -47,26 +40,23 @@ def get_delta_color(value, target_threshold, inverse=False):
             return "inverse" # Red
     else:
         # Pour IPC : Autour de 1.0 est neutre/bonne, très au-dessus est Mauvais
-        if value < SEUIL_IPC_BON:
+        if value < kpis.SEUIL_IPC_BON:
             return "normal" # Marque meilleure que le marché
-        elif value <= SEUIL_IPC_MOYEN:
+        elif value <= kpis.SEUIL_IPC_MOYEN:
             return "off"    # Proche du marché (Neutre)
         else:
             return "inverse" # Marque moins bonne que le marché
             
-# Charger un GeoJSON simple pour la France
-@st.cache_data(ttl=3600)
-def load_geojson():
+# Charger le GeoJSON des départements en variantes simplifiées (multi-résolution, coordonnées quantifiées)
+@st.cache_resource(max_entries=2)
+def load_geojson(geojson_path=geo.GEOJSON_PATH, source_stamp=None):
     """
-    Tente de charger un fichier GeoJSON pour la cartographie.
+    Tente de charger les variantes simplifiées du GeoJSON pour la cartographie (calculées une fois, cache disque).
     Si le fichier est manquant ou non supporté, retourne None.
     """
-    geojson_path = "departements.geojson" 
-    
     if os.path.exists(geojson_path):
         try:
-            with open(geojson_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = geo.build_variants(geojson_path)
             st.sidebar.success("GeoJSON chargé avec succès pour la cartographie.")
             return data
         except Exception as e:
@@ -75,6 +65,11 @@ def load_geojson():
     else:
         return None
 
+@st.cache_resource(max_entries=64)
+def get_geojson_view(_geojson_variants, source_stamp, codes):
+    """Géométries des départements affichés, à la résolution adaptée à la vue (réutilisées d'un rerun à l'autre)."""
+    return geo.view(_geojson_variants, codes)
+
 # --- 1. CONFIGURATION ET MISE EN PAGE GLOBALE ---
 st.set_page_config(page_title="Recall Analytics (RappelConso) - B2B PRO", layout="wide", initial_sidebar_state="expanded")
 st.title("🛡️ Recall Analytics — Dashboard d'Intelligence Marché (B2B PRO) - Vue Stratégie DS")
@@ -141,414 +136,260 @@ st.markdown("---")
 
 # --- 2. FONCTIONS UTILITAIRES DE DATA PROCESSING (STABLES) ---
 
-@st.cache_data(ttl=3600)
-def load_data_from_csv(file_path="rappelconso_export.csv"):
-    """Charge les données, standardise les colonnes et gère les séparateurs."""
+CSV_PATH = "rappelconso_export.csv"
+
+@st.cache_resource(ttl=3600, max_entries=2)
+def load_data_from_csv(file_path=CSV_PATH, source_stamp=None):
+    """
+    Charge les données, standardise les colonnes et gère les séparateurs.
+    Retourne le DataFrame compacté (partagé entre les sessions, à traiter en lecture seule) et son rapport mémoire.
+    Le résultat nettoyé est persisté dans un cache Arrow sur disque : les démarrages suivants le relisent
+    en memory-map sans reparser le CSV. `source_stamp` (taille + mtime) ne sert qu'à invalider ce cache mémoire.
+    """
     
     if not os.path.exists(file_path):
         st.error(f"❌ Fichier non trouvé : '{file_path}'. Veuillez vous assurer que le fichier CSV téléchargé est placé dans le même dossier que l'application et porte ce nom.")
-        return pd.DataFrame()
-    
-    df = pd.DataFrame()
+        return pd.DataFrame(), None
     
     try:
-        try:
-            df = pd.read_csv(file_path, sep=";", encoding='utf-8')
-            if df.shape[1] <= 1:
-                df = pd.read_csv(file_path, sep=",", encoding='utf-8')
-        except Exception:
-            df = pd.read_csv(file_path, sep=",", encoding='utf-8')
-
-        if df.empty or df.shape[1] <= 1:
-            raise ValueError("Le fichier ne contient pas de données.")
-            
-        column_mapping = {
-            "categorie_produit": "categorie_de_produit",
-            "marque_produit": "nom_marque_du_produit",
-            "motif_rappel": "motif_du_rappel",
-            "numero_fiche": "reference_fiche",
-            "lien_vers_la_fiche_rappel": "liens_vers_la_fiche_rappel",
-            "date_debut_commercialisation_produit": "date_debut_commercialisation",
-            "nom_fabricant_ou_marque": "nom_marque_du_produit",
-            "denomination_sociale_du_producteur": "nom_marque_du_produit" # Ajout potentiel
-        }
-        
-        rename_dict = {old_name: new_name for old_name, new_name in column_mapping.items() if old_name in df.columns and old_name != new_name}
-        df = df.rename(columns=rename_dict)
+        df, rapport_memoire, depuis_cache = dataset.load_csv(file_path)
+        if depuis_cache:
+            st.success(f"✅ {len(df)} enregistrements chargés depuis le cache de {file_path}.")
+        else:
+            st.success(f"✅ {len(df)} enregistrements chargés depuis {file_path}.")
+        return df, rapport_memoire
 
-        required_cols = ["categorie_de_produit", "nom_marque_du_produit", "motif_du_rappel", "distributeurs", "date_publication"]
-        missing_cols = [c for c in required_cols if c not in df.columns]
+    except dataset.MissingColumnsError as e:
+        st.error(f"⚠️ Alerte Colonnes : Le script ne trouve pas les colonnes nécessaires : **{', '.join(e.missing)}**.")
+        st.stop()
+    except Exception as e:
+        st.error(f"❌ Erreur critique lors de la lecture du fichier CSV. Message : {e}")
+        return pd.DataFrame(), None
 
-        if missing_cols:
-            st.error(f"⚠️ Alerte Colonnes : Le script ne trouve pas les colonnes nécessaires : **{', '.join(missing_cols)}**.")
-            st.stop()
-            
-        if "date_publication" in df.columns:
-            df["date_publication"] = pd.to_datetime(df["date_publication"], errors="coerce", utc=True)
-            df = df.sort_values(by="date_publication", ascending=False) 
-        
-        if "date_debut_commercialisation" in df.columns:
-            df["date_debut_commercialisation"] = pd.to_datetime(df["date_debut_commercialisation"], errors="coerce", utc=True)
-
-        for col in ["distributeurs", "zone_geographique_de_vente", "risques_encourus", "motif_du_rappel", "categorie_de_produit", "nom_marque_du_produit", "identifiant_de_l_etablissement_d_ou_provient_le_produit", "etat_fiche", "denomination_vente", "sous_categorie_produit"]:
-            if col in df.columns:
-                df[col] = (df[col].astype(str)
-                                 .str.lower()
-                                 .str.replace("|", ";", regex=False)
-                                 .str.replace(", ", ";", regex=False)
-                                 .str.strip()
-                                 .replace('nan', '', regex=False)
-                                 .replace('', pd.NA) 
-                )
-        st.success(f"✅ {len(df)} enregistrements chargés depuis {file_path}.")
-        return df
+STORE_DIR = "rappelconso_store"
 
+@st.cache_resource(ttl=3600, max_entries=2)
+def load_data_from_store(store_dir=STORE_DIR, store_revision=0):
+    """Charge le jeu fusionné du magasin d'ingestion incrémentale (déjà renommé et normalisé à l'ingestion)."""
+    try:
+        df, rapport_memoire = dataset.load_store(store_dir)
+        st.success(f"✅ {len(df)} enregistrements chargés depuis le magasin RappelConso ({store_dir}).")
+        return df, rapport_memoire
     except Exception as e:
-        st.error(f"❌ Erreur critique lors de la lecture du fichier CSV. Message : {e}")
-        return pd.DataFrame()
-
-def explode_column(df, column_name):
-    """Divise une colonne de chaînes de caractères séparées par des points-virgules (;) en lignes distinctes."""
-    if column_name in df.columns and not df.empty:
-        s = df[column_name].copy().astype(str).str.split(";")
-        exploded_s = s.explode()
-        exploded_df = exploded_s.to_frame(name=column_name)
-        exploded_df = exploded_df.dropna(subset=[column_name])
-        exploded_df[column_name] = exploded_df[column_name].str.strip()
-        exploded_df = exploded_df[exploded_df[column_name] != 'nan']
-        exploded_df = exploded_df[exploded_df[column_name] != '']
-        return exploded_df
-    return pd.DataFrame() 
-
-def safe_filter_list(df_source, col_name, exploded=False):
-    """Construit une liste de valeurs uniques pour les filtres."""
-    if col_name not in df_source.columns or df_source.empty:
-        return ["Toutes"]
-    
-    df_work = explode_column(df_source, col_name) if exploded else df_source.copy()
-
-    if col_name in df_work.columns and not df_work.empty:
-        raw_list = df_work[col_name].dropna().astype(str).unique().tolist()
-        valid_list = [s.strip() for s in raw_list if s.strip() and s.strip() != 'nan']
-        # Limite le nombre d'options si la liste est trop longue (par exemple, pour la dénomination de vente)
-        if len(valid_list) > 1000:
-            st.sidebar.warning(f"Liste trop longue pour {col_name}. Affichage des 1000 premières.")
-            return ["Toutes"] + sorted(list(set(valid_list[:1000])))
-        return ["Toutes"] + sorted(list(set(valid_list)))
-    
-    return ["Toutes"]
+        st.error(f"❌ Erreur critique lors de la lecture du magasin RappelConso. Message : {e}")
+        return pd.DataFrame(), None
+
+@st.cache_resource(max_entries=2)
+def get_analytics_engine(_df, dataset_version, _geojson_variants, geojson_stamp):
+    """
+    Moteur analytique (recall_analytics.AnalyticsEngine) partagé entre les sessions pour une version du jeu :
+    index, ponts, cube et références marché y sont construits à la première utilisation puis réutilisés.
+    """
+    return engine.AnalyticsEngine(_df, _geojson_variants)
+
+KPI_CACHE_TTL = 600        # Secondes : la fenêtre de période glisse avec la date du jour
+KPI_CACHE_ENTRIES = 256    # États de filtres mémorisés
+
+@st.cache_data(ttl=KPI_CACHE_TTL, max_entries=KPI_CACHE_ENTRIES, show_spinner=False)
+def get_kpi_bundle(cle_filtres, _analytics, _selection):
+    """
+    KPIs d'un état des filtres. La clé est le tuple normalisé (version du jeu, période, nb de lignes de la période,
+    filtres) ; la sélection filtrée n'est pas hachée et n'est matérialisée qu'en cas d'absence du cache.
+    """
+    return _analytics.kpis(_selection)
+
+@st.cache_data(ttl=KPI_CACHE_TTL, max_entries=KPI_CACHE_ENTRIES, show_spinner=False)
+def get_league_table(cle_hors_marque, _analytics, _selection):
+    """Classement de toutes les marques pour un état des filtres hors marque (la marque sélectionnée n'entre pas dans la clé)."""
+    return _analytics.league_table(_selection)
+
+@st.cache_data(ttl=KPI_CACHE_TTL, max_entries=KPI_CACHE_ENTRIES, show_spinner=False)
+def get_section(methode, cle_filtres, _analytics, _selection):
+    """Agrégat d'un onglet (méthode `methode` du moteur), mémorisé par état des filtres : revenir sur un onglet ne le recalcule pas."""
+    return getattr(_analytics, methode)(_selection)
+
+FACET_SEARCH_THRESHOLD = 1000 # Au-delà, la liste est servie par recherche plutôt qu'envoyée en entier au navigateur
+FACET_SEARCH_LIMIT = 200
+
+def facet_selectbox(label, facet, widget_key, current="Toutes"):
+    """
+    Selectbox d'un filtre alimentée par une facette (options + nombre de rappels).
+    Les listes longues ne sont plus tronquées : un champ de recherche interroge la liste complète.
+    """
+    if len(facet) > FACET_SEARCH_THRESHOLD:
+        query = st.sidebar.text_input(f"🔎 {label} : rechercher parmi {len(facet)} options", key=f"recherche_{widget_key}")
+        options = ["Toutes"] + facet.search(query, limit=FACET_SEARCH_LIMIT)
+    else:
+        options = ["Toutes"] + facet.labels
+    if current != "Toutes" and current in facet and current not in options:
+        options.insert(1, current)
+    index = options.index(current) if current in options else 0
+    return st.sidebar.selectbox(label, options, index=index,
+                                format_func=lambda v: v if v == "Toutes" else f"{v} ({facet.count(v)})")
+
+# --- INSTRUMENTATION DES ÉTAPES (PANNEAU PERFORMANCE OPT-IN) ---
+# Spans cumulés par session ; l'activation est lue dans l'état des cases du panneau, rendu en fin de script
+if "perf_recorder" not in st.session_state:
+    st.session_state["perf_recorder"] = perf.PerfRecorder()
+perf_recorder = st.session_state["perf_recorder"]
+perf_recorder.start_run(st.session_state.get("perf_actif", False), st.session_state.get("perf_memoire", False))
 
 # --- 3. CHARGEMENT ET FILTRES GLOBAUX ---
-df = load_data_from_csv()
-geojson_data = load_geojson() 
+# Synchronisation delta avec l'API RappelConso (le magasin est initialisé depuis l'export CSV s'il existe)
+if st.sidebar.button("🔄 Synchroniser RappelConso", help="Récupère uniquement les fiches publiées ou modifiées depuis la dernière synchronisation."):
+    try:
+        with st.spinner("Synchronisation avec RappelConso..."):
+            resume_sync = ingestion.sync(STORE_DIR, seed_csv=CSV_PATH if os.path.exists(CSV_PATH) else None)
+        st.sidebar.success(f"{resume_sync['recus']} fiche(s) reçue(s) depuis la dernière synchronisation.")
+    except Exception as e:
+        st.sidebar.error(f"Échec de la synchronisation RappelConso : {e}")
+
+# Source : magasin incrémental s'il a été initialisé, sinon l'export CSV statique
+with perf_recorder.span("chargement"):
+    if ingestion.store_exists(STORE_DIR):
+        df, rapport_memoire = load_data_from_store(STORE_DIR, ingestion.store_revision(STORE_DIR))
+    else:
+        df, rapport_memoire = load_data_from_csv(CSV_PATH, loader.source_stamp(CSV_PATH) if os.path.exists(CSV_PATH) else None)
+    geojson_stamp = loader.source_stamp(geo.GEOJSON_PATH) if os.path.exists(geo.GEOJSON_PATH) else None
+    geojson_data = load_geojson(geo.GEOJSON_PATH, geojson_stamp)
 
 if df.empty:
     st.stop()
 
+dataset_version = df.attrs.get("dataset_version", "")
+analytics = get_analytics_engine(df, dataset_version, geojson_data, geojson_stamp)
+
 # Gestion de l'état pour la marque sélectionnée (pour maintenir la cohérence)
 if 'selected_marque' not in st.session_state:
     st.session_state['selected_marque'] = "Toutes"
     
 # --- FILTRAGE PRÉLIMINAIRE PAR PÉRIODE (pour les listes déroulantes) ---
-df_temp = df.copy()
-
-# Période
-if "date_publication" in df_temp.columns:
-    now = pd.Timestamp.now(tz='UTC') 
-    periode_options = {
-        "12 derniers mois": pd.DateOffset(months=12),
-        "6 derniers mois": pd.DateOffset(months=6),
-        "3 derniers mois": pd.DateOffset(months=3),
-        "Toute la période": None
-    }
-    
-    st.sidebar.header("⚙️ Filtres Transversaux")
-    
-    # 1. Période
-    periode = st.sidebar.selectbox("Période d'Analyse", list(periode_options.keys()))
-    offset = periode_options[periode]
-    if offset:
-        df_temp = df_temp[df_temp["date_publication"] >= now - offset]
-    else:
-        df_temp = df.copy() 
+# Les filtres produisent des sélections (masques) sur df ; les DataFrames ne sont matérialisés qu'à la demande
+now = pd.Timestamp.now(tz='UTC') 
 
-# 2. Catégorie de Produit
-categories = safe_filter_list(df_temp, "categorie_de_produit")
-cat = st.sidebar.selectbox("Catégorie de Produit", categories)
+st.sidebar.header("⚙️ Filtres Transversaux")
+
+# 1. Période
+periode = st.sidebar.selectbox("Période d'Analyse", list(filters.PERIODE_OPTIONS.keys()))
+selection = analytics.select(engine.FilterState(periode), now)
 
-# --- APPLICATION DU FILTRE CATÉGORIE POUR COHÉRENCE MARQUE ---
-df_coherence = df_temp.copy()
-if cat != "Toutes" and "categorie_de_produit" in df_coherence.columns:
-    df_coherence = df_coherence[df_coherence["categorie_de_produit"] == cat]
+# 2. Catégorie de Produit
+# Contexte de facettes : la période sélectionnée et le nombre de lignes qu'elle couvre (change si de nouvelles fiches entrent)
+with perf_recorder.span("sidebar.facettes_periode", rows=len(selection.periode)):
+    facettes_periode = analytics.facets(selection.periode, ["categorie_de_produit"], selection.contexte_periode)
+cat = facet_selectbox("Catégorie de Produit", facettes_periode["categorie_de_produit"], "categorie")
+
+# Recherche plein texte (index BM25 construit à la première recherche) : restreint le contexte comme la catégorie
+recherche = st.sidebar.text_input("🔎 Recherche plein texte", key="recherche_texte", placeholder="ex : listeria, allergène lait",
+                                  help="Motif, risques, dénomination et marque. Accents et pluriels ignorés, débuts de mots acceptés ; "
+                                       "une fiche doit contenir tous les mots.").strip()
+
+# --- APPLICATION DES FILTRES CATÉGORIE ET RECHERCHE POUR COHÉRENCE MARQUE ---
+with perf_recorder.span("sidebar.categorie_recherche", rows=len(selection.periode)):
+    selection = analytics.select(engine.FilterState(periode, cat, recherche=recherche), now, base=selection)
+if recherche:
+    st.sidebar.caption(f"{len(selection.coherence)} rappel(s) pour « {recherche} » sur la période")
     
+# 4. Sous-Catégorie / Nature du Produit
+col_nature = analytics.col_nature
+
+# Toutes les listes suivantes dépendent du même contexte (période x catégorie) : un seul calcul mémorisé
+with perf_recorder.span("sidebar.facettes_coherence", rows=len(selection.coherence)):
+    facettes_coherence = analytics.facets(selection.coherence, analytics.filter_columns, selection.contexte_coherence)
+
 # 3. Marque (Benchmarking) - COHÉRENCE AVEC LA CATÉGORIE
-marques_coherentes = safe_filter_list(df_coherence, "nom_marque_du_produit")
 current_marque_selection = st.session_state['selected_marque']
-if current_marque_selection not in marques_coherentes:
+if current_marque_selection not in facettes_coherence["nom_marque_du_produit"]:
     current_marque_selection = "Toutes"
-marque = st.sidebar.selectbox("Marque (Benchmarking)", marques_coherentes, index=marques_coherentes.index(current_marque_selection))
+marque = facet_selectbox("Marque (Benchmarking)", facettes_coherence["nom_marque_du_produit"], "marque", current=current_marque_selection)
 st.session_state['selected_marque'] = marque # Sauvegarde pour le prochain cycle
 
 # --- NOUVEAUX FILTRES BASÉS SUR LES AUTRES CHAMPS ---
 
-# 4. Sous-Catégorie / Nature du Produit
-col_nature = "denomination_vente"
-if "sous_categorie_produit" in df.columns:
-    col_nature = "sous_categorie_produit"
-    
-nature_list = safe_filter_list(df_coherence, col_nature)
-nature = st.sidebar.selectbox(f"Nature du Produit ({col_nature.replace('_', ' ').title()})", nature_list)
+nature = facet_selectbox(f"Nature du Produit ({col_nature.replace('_', ' ').title()})", facettes_coherence[col_nature], "nature")
 
 # 5. Distributeur (Canal)
-distributeurs_list = safe_filter_list(df_coherence, "distributeurs", exploded=True)
-distrib = st.sidebar.selectbox("Distributeur (Canal)", distributeurs_list)
+distrib = facet_selectbox("Distributeur (Canal)", facettes_coherence["distributeurs"], "distributeur")
 
 # 6. Motif de Rappel (Cause)
-motifs_list = safe_filter_list(df_coherence, "motif_du_rappel")
-motif = st.sidebar.selectbox("Motif de Rappel (Cause)", motifs_list)
+motif = facet_selectbox("Motif de Rappel (Cause)", facettes_coherence["motif_du_rappel"], "motif")
 
 # 7. Lieu de Vente (Zone Géographique)
-zone_list = safe_filter_list(df_coherence, "zone_geographique_de_vente", exploded=True)
-zone = st.sidebar.selectbox("Lieu de Vente (Zone Géographique)", zone_list)
+zone = facet_selectbox("Lieu de Vente (Zone Géographique)", facettes_coherence["zone_geographique_de_vente"], "zone")
 
 # 8. Statut de la Fiche
-statut_list = safe_filter_list(df_coherence, "etat_fiche")
-statut = st.sidebar.selectbox("Statut de la Fiche", statut_list)
-
-
-# --- APPLICATION FINALE DES FILTRES SUR LE DATAFRAME GLOBAL ---
-df_filtered = df.copy() 
-
-# 1. Période
-if offset:
-    df_filtered = df_filtered[df_filtered["date_publication"] >= now - offset]
-
-# 2. Catégorie
-if cat != "Toutes" and "categorie_de_produit" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["categorie_de_produit"] == cat]
-    
-# 3. Marque
-if marque != "Toutes" and "nom_marque_du_produit" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["nom_marque_du_produit"] == marque]
+statut = facet_selectbox("Statut de la Fiche", facettes_coherence["etat_fiche"], "statut")
 
-# 4. Nature du Produit
-if nature != "Toutes" and col_nature in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered[col_nature] == nature]
-    
-# 5. Distributeur
-if distrib != "Toutes" and "distributeurs" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["distributeurs"].str.contains(distrib, case=False, na=False)]
+# Rapport mémoire du jeu de données compacté (calculé une seule fois au chargement)
+if rapport_memoire is not None:
+    with st.sidebar.expander("💾 Mémoire du Jeu de Données"):
+        total_memoire = rapport_memoire.loc["TOTAL"]
+        st.caption(f"{total_memoire['Apres_Mo']:.1f} Mo en mémoire (contre {total_memoire['Avant_Mo']:.1f} Mo pour l'export brut).")
+        st.dataframe(rapport_memoire, width="stretch")
 
-# 6. Motif
-if motif != "Toutes" and "motif_du_rappel" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["motif_du_rappel"].str.contains(motif, case=False, na=False)]
 
-# 7. Zone
-if zone != "Toutes" and "zone_geographique_de_vente" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["zone_geographique_de_vente"].str.contains(zone, case=False, na=False)]
-    
-# 8. Statut
-if statut != "Toutes" and "etat_fiche" in df_filtered.columns:
-    df_filtered = df_filtered[df_filtered["etat_fiche"] == statut]
+# --- APPLICATION FINALE DES FILTRES SUR LE DATAFRAME GLOBAL ---
+# Un seul masque combiné, appliqué à la sélection Période x Catégorie déjà calculée pour la sidebar.
+# Les lignes ne sont matérialisées que par les calculs absents du cache (KPIs, onglet ouvert, registre)
+with perf_recorder.span("filtres.application", rows=len(selection.coherence)):
+    selection = analytics.select(engine.FilterState(periode, cat, marque, nature, distrib, motif, zone, statut, recherche), now, base=selection)
+colonnes = analytics.df.columns
 
 # --- 4. CALCULS TRANSVERSAUX (KPIs) ---
-total_rappels = len(df_filtered)
+total_rappels = len(selection)
 
 if total_rappels == 0:
     st.warning("⚠️ Aucun rappel trouvé avec les filtres actuels. Veuillez ajuster la période ou les sélections dans la sidebar.")
     st.stop()
 
 
-df_risques_exploded = explode_column(df_filtered, "risques_encourus")
-df_motifs_exploded = explode_column(df_filtered, "motif_du_rappel")
+# Tous les KPIs en un seul calcul pur, mémorisé par état normalisé des filtres (partagé entre les sessions)
+# Structures du moteur construites une fois par version du jeu (les spans isolent leur coût au premier rerun)
+with perf_recorder.span("precalculs.cube_mensuel"):
+    analytics.cube
 
-# Risque principal
-risque_principal = "N/A"
-if not df_risques_exploded.empty and "risques_encourus" in df_risques_exploded.columns:
-    risque_counts = df_risques_exploded["risques_encourus"].value_counts()
-    if not risque_counts.empty:
-        risque_major = next(iter(risque_counts.index), None)
-        if risque_major:
-            # Tronque le texte si "Listeria Monocytogenes" est présent
-            if "listeria monocytogenes" in risque_major.lower():
-                risque_principal = "Listeria Monocytogenes"
-            else:
-                risque_principal = risque_major.title()
-    
-# Vitesse de Réponse Moyenne (Proxy) - Délai Moyen (DM)
-DM_label = "N/A"
-DM_value = 0.0
-df_temp_dates = pd.DataFrame()
-if "date_debut_commercialisation" in df_filtered.columns and not df_filtered["date_debut_commercialisation"].isnull().all():
-    df_temp_dates = df_filtered.dropna(subset=["date_publication", "date_debut_commercialisation"]).copy()
-    if not df_temp_dates.empty:
-        df_temp_dates["duree_commercialisation"] = (df_temp_dates["date_publication"] - df_temp_dates["date_debut_commercialisation"]).dt.days
-        df_temp_dates = df_temp_dates[df_temp_dates["duree_commercialisation"] >= 0]
-        if not df_temp_dates.empty:
-            DM_value = df_temp_dates["duree_commercialisation"].mean()
-            DM_label = f"{DM_value:.1f} jours"
-    
-# --- IMR FUNCTION (Rappel) ---
-def calculate_imr(df_calc):
-    if df_calc.empty or 'risques_encourus' not in df_calc.columns:
-        return 0.0, 0.0, 0.0
-
-    df_imr = df_calc.copy()
-    
-    # 1. Calcul de la gravité
-    df_imr["is_risque_grave"] = df_imr["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-    df_imr['score_gravite'] = np.where(df_imr['is_risque_grave'], 2, 1) # Risque grave = poids 2, mineur = poids 1
-    
-    total_rappels_period = len(df_imr)
-    total_score = df_imr['score_gravite'].sum()
-    
-    if total_rappels_period > 0:
-        imr = (total_score / total_rappels_period) * 10 
-        avg_gravite = total_score / total_rappels_period # Gravité Moyenne
-    else:
-        imr = 0.0
-        avg_gravite = 0.0
-        
-    df_imr['cout_implicite'] = np.where(df_imr['is_risque_grave'], COUT_RAPPEl_GRAVE_UNITAIRE, COUT_RAPPEl_MINEUR_UNITAIRE)
-    total_cout = df_imr['cout_implicite'].sum()
-
-    return imr, total_cout, avg_gravite
-
-# Calcul de l'IMR pour la marque filtrée
-imr_marque, cout_marque, _ = calculate_imr(df_filtered)
-
-# Calcul de l'IMR pour le marché (pour la comparaison)
-imr_marche_comp = 0.0
-if "date_publication" in df.columns:
-    df_marche_comp = df_temp.copy() # On prend le DF filtré uniquement par la Période
-    imr_marche_comp, _, _ = calculate_imr(df_marche_comp)
-
-# NOUVEAU KPI: Indice de Pression Concurrentielle (IPC)
-ipc_value = imr_marque / imr_marche_comp if imr_marche_comp > 0 else 0.0
-
-# Calcul du % Rappels graves
-pc_risques_graves = 0.0
-pc_risques_graves_str = "N/A"
-if total_rappels > 0 and 'risques_encourus' in df_filtered.columns:
-    count_graves = df_filtered["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False).sum()
-    pc_risques_graves = (count_graves / total_rappels * 100)
-    pc_risques_graves_str = f"{pc_risques_graves:.1f}%"
-
-
-# --- CALCULS NOUVEAUX KPIs ---
-
-# 1. Taux d'Impact Fournisseur Critique (TIFC) - Simulé sur motifs
-tifc_value = 0.0
-if total_rappels > 0 and 'motif_du_rappel' in df_filtered.columns:
-    count_fournisseur_causes = df_filtered["motif_du_rappel"].str.contains(keywords_fournisseur, case=False, na=False).sum()
-    tifc_value = (count_fournisseur_causes / total_rappels * 100)
-
-# 2. Indice de Sévérité du Risque (ISR) - Gravité Moyenne par Catégorie Principale
-isr_value = 0.0
-if "categorie_de_produit" in df_filtered.columns:
-    df_isr = df_filtered.copy()
-    if not df_isr.empty:
-        _, _, avg_gravite_filtered = calculate_imr(df_isr) # 1 à 2
-        # Ne compter que les rappels dans la catégorie sélectionnée (si filtre actif)
-        df_cat_active = df_filtered[df_filtered["categorie_de_produit"] == cat] if cat != "Toutes" else df_filtered
-        
-        count_cat = len(df_cat_active)
-        
-        # Le calcul de l'ISR doit se faire sur le périmètre de la marque/catégorie
-        isr_value = avg_gravite_filtered * (count_cat / total_rappels) * 10 if total_rappels > 0 else 0.0
-        
-# 3. Délai d'Alerte Précoce (DAP)
-dap_value = 0.0
-if not df_temp_dates.empty:
-    # Simuler le DAP comme le pourcentage de rappels avec un délai de commercialisation très court (< 7 jours)
-    dap_count = df_temp_dates[df_temp_dates["duree_commercialisation"] <= 7].shape[0]
-    dap_value = (dap_count / total_rappels) * 100 if total_rappels > 0 else 0.0
-
-# 4. Taux d'Anomalie Logistique (TAL) - Simulé sur motifs
-tal_value = 0.0
-if total_rappels > 0 and 'motif_du_rappel' in df_filtered.columns:
-    count_log_causes = df_filtered["motif_du_rappel"].str.contains(keywords_logistique, case=False, na=False).sum()
-    tal_value = (count_log_causes / total_rappels * 100)
-
-# 5. Volatilité IMR (IMR_STD)
-imr_std_value = 0.0
-if marque != "Toutes" and "date_publication" in df_filtered.columns:
-    df_trend = df.copy()
-    # On filtre par la période uniquement (la marque sera filtrée après)
-    if offset:
-        df_trend = df_trend[df_trend["date_publication"] >= now - offset]
-    df_trend["Mois"] = df_trend["date_publication"].dt.to_period("M")
-
-    def compute_imr_per_month(df_input):
-        if 'risques_encourus' not in df_input.columns or df_input.empty: return pd.Series(dtype='float64')
-        df_input['is_risque_grave'] = df_input["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-        df_input['score_gravite'] = np.where(df_input['is_risque_grave'], 2, 1)
-        imr_monthly = df_input.groupby('Mois').agg(
-            Total_Score=('score_gravite', 'sum'),
-            Total_Rappels=('score_gravite', 'count')
-        )
-        imr_monthly['IMR'] = np.where(imr_monthly['Total_Rappels'] > 0, 
-                                      (imr_monthly['Total_Score'] / imr_monthly['Total_Rappels']) * 10, 
-                                      0.0)
-        return imr_monthly['IMR']
-
-    imr_series = compute_imr_per_month(df_trend[df_trend["nom_marque_du_produit"] == marque])
-    if len(imr_series) > 1:
-        imr_std_value = imr_series.std()
-
-# 6. Taux de Récurrence des Causes Racines (TRCR) - Simulé
-trcr_value = 0.0
-if total_rappels > 0 and "risques_encourus" in df_filtered.columns:
-    # Simuler la récurrence si Listeria, Salmonella ou E.Coli apparaissent au moins deux fois.
-    df_temp_recurrence = df_filtered.copy()
-    df_temp_recurrence['Recurrence_Flag'] = df_temp_recurrence["risques_encourus"].apply(
-        lambda x: any(kw in str(x) for kw in keywords_recurrence_simule)
-    )
-    if df_temp_recurrence['Recurrence_Flag'].sum() >= 2:
-        # TRCR simulé à 15% si on détecte au moins 2 cas de risque haut
-        trcr_value = 15.0 
-    else:
-        trcr_value = 2.0
+# Références marché précalculées pour toutes les périodes et catégories : changer de marque n'y touche pas
+with perf_recorder.span("precalculs.references_marche"):
+    analytics.market_baselines(now)
 
-# 7. Ratio Risque/Opportunité (RRO) - Simulation sur la catégorie
-rro_value = 0.0
-if total_rappels > 0 and "categorie_de_produit" in df_filtered.columns:
-    rappels_par_cat = df_marche_comp.groupby("categorie_de_produit").size() if 'df_marche_comp' in locals() else pd.Series()
-    
-    # Calculer l'IMR de la catégorie sur le marché filtré
-    imr_cat_marche = 0.0
-    if cat != "Toutes":
-        imr_cat_marche, _, _ = calculate_imr(df_marche_comp[df_marche_comp["categorie_de_produit"] == cat])
-    else:
-        imr_cat_marche = imr_marche_comp
+with perf_recorder.span("precalculs.ponts_tokens"):
+    analytics.token_bridges
 
-    if imr_cat_marche > 0 and cat != "Toutes" and cat in rappels_par_cat:
-        # RRO = IMR_Marque / IMR_Catégorie_Marché (Facteur de risque pur)
-        rro_value = imr_marque / imr_cat_marche 
-    else:
-        rro_value = imr_marque * 0.5 / 10
+with perf_recorder.span("kpis", rows=total_rappels):
+    kpi = get_kpi_bundle(selection.key, analytics, selection)
 
 
 # --- CALCUL DES COULEURS TRAFFIC LIGHT ---
 # 1. IMR de la Marque (plus bas est meilleur)
-imr_marque_delta = imr_marque - (SEUIL_IMR_ALERTE / 2) # Arbitraire pour simuler une 'variation' par rapport à un objectif de 5
-imr_marque_color = get_delta_color(imr_marque, SEUIL_IMR_ALERTE, inverse=True)
+imr_marque_delta = kpi.imr_marque - (kpis.SEUIL_IMR_ALERTE / 2) # Arbitraire pour simuler une 'variation' par rapport à un objectif de 5
+imr_marque_color = get_delta_color(kpi.imr_marque, kpis.SEUIL_IMR_ALERTE, inverse=True)
 
 # 2. IPC (Indice de Pression Concurrentielle) (cible = 1.0)
 # Le delta est calculé par rapport à l'objectif 1.0
-ipc_delta = ipc_value - 1.0 
-ipc_color = get_delta_color(ipc_value, 1.0, inverse=False)
+ipc_delta = kpi.ipc - 1.0 
+ipc_color = get_delta_color(kpi.ipc, 1.0, inverse=False)
 
 
-# --- 5. STRUCTURE DU TABLEAU DE BORD PAR ACTEUR (TABS) ---
+# --- 5. FIGURES PLOTLY ---
+# Construites (figures.figure_*) seulement si le cache ne contient pas déjà la figure de cet agrégat (voir figures.FigureCache)
+@st.cache_resource
+def get_figure_cache():
+    """Cache des figures sérialisées, partagé entre les sessions et borné en taille."""
+    return figures.FigureCache()
 
-tab1, tab2, tab3 = st.tabs(["🏭 Fabricants & Marques", "🛒 Distributeurs & Retailers", "🔬 Risque & Conformité"])
+figure_cache = get_figure_cache()
 
+# --- 6. STRUCTURE DU TABLEAU DE BORD PAR ACTEUR (TABS) ---
+
+# Chaque onglet est une fonction exécutée seulement si l'onglet est ouvert (rendu en fin de section)
 
 # ----------------------------------------------------------------------
 # TAB 1: FABRICANTS & MARQUES (BENCHMARKING IMR & RISQUE FOURNISSEUR)
 # ----------------------------------------------------------------------
-with tab1:
+@st.fragment
+def onglet_fabricants():
+    """Onglet 1. Fragment : trier ou paginer le classement ne relance que cet onglet."""
+    perf_recorder.start_fragment("onglet_fabricants")
     st.header("🎯 Intelligence Concurrentielle & Maîtrise du Risque Fournisseur")
     
     # --- FEUILLE DE ROUTE FABRICANTS ---
@@ -580,97 +421,60 @@ with tab1:
         st.metric("Total Rappels (Périmètre)", total_rappels, 
             help="Nombre total de fiches de rappel publiées, tenant compte de la période et des filtres sélectionnés. 📈 **Message :** Mesure la **pression volume** globale.")
     with col2:
-        st.metric("IMR du Marché", f"{imr_marche_comp:.2f}",
+        st.metric("IMR du Marché", f"{kpi.imr_marche:.2f}",
             help="Indice de Maîtrise du Risque (IMR) calculé sur l'ensemble des marques dans la période filtrée. 📊 **Benchmark :** Point de référence pour évaluer la performance de votre marque.")
     with col3:
-        st.metric("Risque Principal", risque_principal,
+        st.metric("Risque Principal", kpi.risque_principal,
             help="Le risque encouru le plus fréquemment mentionné. ⚠️ **Priorité :** Indique le danger sanitaire ou physique majeur à adresser en priorité.")
     with col4:
-        st.metric("Taux d'Impact Fournisseur Critique (TIFC)", f"{tifc_value:.1f}%",
+        st.metric("Taux d'Impact Fournisseur Critique (TIFC)", f"{kpi.tifc:.1f}%",
             help="Proportion des rappels dont la cause est liée à une non-conformité fournisseur. 🚨 **Contrôle :** Un TIFC élevé suggère des audits fournisseurs insuffisants ou une faible spécification d'achat.")
     
     # LIGNE 2 : PERFORMANCE & PROJECTION
     with col5:
         # IMR de la Marque avec Traffic Light (Bas est meilleur)
-        st.metric("IMR de la Marque", f"{imr_marque:.2f}", delta=f"Cible < {SEUIL_IMR_ALERTE}", delta_color=imr_marque_color,
+        st.metric("IMR de la Marque", f"{kpi.imr_marque:.2f}", delta=f"Cible < {kpis.SEUIL_IMR_ALERTE}", delta_color=imr_marque_color,
             help="Indice de Maîtrise du Risque de votre marque (Score Gravité Pondéré). 🎯 **Performance :** L'objectif est de maintenir un score bas (moins de risque) et stable.")
     with col6:
         # IPC avec Traffic Light (Proche de 1.0 est meilleur)
-        st.metric("Indice de Pression Concurrentielle (IPC)", f"{ipc_value:.2f}", delta=f"Vs Cible 1.0 (Marché)", delta_color=ipc_color, 
+        st.metric("Indice de Pression Concurrentielle (IPC)", f"{kpi.ipc:.2f}", delta=f"Vs Cible 1.0 (Marché)", delta_color=ipc_color, 
             help="Formule : IMR Marque / IMR Marché. 📉 **Positionnement :** Un score **supérieur à 1.0** indique une **sous-performance** (votre marque est plus risquée que la moyenne du marché).")
     with col7:
-        st.metric("Coût Implicite", f"{cout_marque:,.0f} €",
+        st.metric("Coût Implicite", f"{kpi.cout_marque:,.0f} €",
             help="Coût de rappel simulé (Graves x 50K€ + Mineurs x 5K€). 💰 **Impact :** Chiffre la perte financière minimale due à la crise.")
     with col8:
-        st.metric("Indice de Sévérité du Risque (ISR)", f"{isr_value:.2f}",
+        st.metric("Indice de Sévérité du Risque (ISR)", f"{kpi.isr:.2f}",
             help="Gravité Moyenne Pondérée par le Volume de Rappels dans la Catégorie. 🧭 **Stratégie :** Aide à réorienter les budgets de prévention vers les catégories de produits les plus dangereuses.")
 
     st.markdown("### Analyse de Positionnement et Causes Racines")
     st.markdown("---") # Séparation visuelle
     col_gauche, col_droite = st.columns(2)
 
-    with col_gauche:
+    with col_gauche, perf_recorder.span("onglet1.part_marques"):
         st.subheader("1. Benchmark : Part de Rappel par Marque (SoR)")
         
-        if "nom_marque_du_produit" in df_filtered.columns and total_rappels > 0:
-            top_marques = df_filtered["nom_marque_du_produit"].value_counts(normalize=True).mul(100).reset_index().rename(columns={
-                "nom_marque_du_produit": "Marque", 
-                "proportion": "Part_de_Rappel_pourcent"
-            })
-            top_marques = top_marques.head(10)
-            fig_sor = px.bar(top_marques, y="Marque", x="Part_de_Rappel_pourcent", orientation='h', title="Top 10 : Contribution (%) aux rappels du marché",
-                             color='Part_de_Rappel_pourcent', color_continuous_scale=px.colors.sequential.Plotly3)
-            fig_sor.update_layout(yaxis={'categoryorder':'total ascending'}, xaxis_title="Part (%) des Rappels Filtrés")
-            st.plotly_chart(fig_sor, use_container_width=True)
+        if "nom_marque_du_produit" in colonnes and total_rappels > 0:
+            top_marques = get_section("share_of_recalls", selection.key, analytics, selection)
+            with perf_recorder.span("figure.sor"):
+                fig_sor = figure_cache.get("sor", top_marques, (), lambda: figures.figure_part_marques(top_marques))
+            with perf_recorder.span("affichage.sor"):
+                st.plotly_chart(fig_sor, width="stretch")
         else:
             st.info("Aucune donnée pour le benchmarking des marques.")
 
-    with col_droite:
+    with col_droite, perf_recorder.span("onglet1.tendance_imr"):
         st.subheader("2. Tendance : IMR de la Marque vs. Marché (Courbe de Contrôle)")
-        if marque != "Toutes" and "date_publication" in df_filtered.columns:
+        if marque != "Toutes" and "date_publication" in colonnes:
             
-            df_trend = df.copy()
-            if offset:
-                df_trend = df_trend[df_trend["date_publication"] >= now - offset]
-            df_trend["Mois"] = df_trend["date_publication"].dt.to_period("M")
-
-            def compute_imr_per_month(df_input):
-                if 'risques_encourus' not in df_input.columns or df_input.empty:
-                    return pd.DataFrame()
-                    
-                df_input['is_risque_grave'] = df_input["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-                df_input['score_gravite'] = np.where(df_input['is_risque_grave'], 2, 1)
-                
-                imr_monthly = df_input.groupby('Mois').agg(
-                    Total_Score=('score_gravite', 'sum'),
-                    Total_Rappels=('score_gravite', 'count')
-                ).reset_index()
-                
-                imr_monthly['IMR'] = np.where(imr_monthly['Total_Rappels'] > 0, 
-                                              (imr_monthly['Total_Score'] / imr_monthly['Total_Rappels']) * 10, 
-                                              0.0)
-                imr_monthly['Mois'] = imr_monthly['Mois'].dt.to_timestamp()
-                return imr_monthly[['Mois', 'IMR']]
-
-            df_imr_marque = compute_imr_per_month(df_trend[df_trend["nom_marque_du_produit"] == marque])
-            df_imr_marche = compute_imr_per_month(df_trend)
+            # Marque et marché de la période lus dans le cube (mois partiel de début de fenêtre ré-agrégé)
+            df_comp = get_section("imr_trend", selection.key, analytics, selection)
             
-            if not df_imr_marque.empty or not df_imr_marche.empty:
-                df_imr_marche = df_imr_marche.rename(columns={'IMR': 'IMR_Marché'})
-                
-                df_comp = pd.merge(df_imr_marque.rename(columns={'IMR': f'IMR_{marque.title()}'}), df_imr_marche, on='Mois', how='outer').fillna(0)
-                
-                fig_trend = px.line(df_comp, x="Mois", y=[f"IMR_{marque.title()}", "IMR_Marché"], 
-                                    title=f"Évolution Mensuelle de l'IMR : {marque.title()} vs. Marché (Seuil Alerte {SEUIL_IMR_ALERTE})",
-                                    labels={"value": "IMR (Score Pondéré)", "Mois": "Mois"},
-                                    color_discrete_map={f'IMR_{marque.title()}': '#2C3E50', 'IMR_Marché': '#BDC3C7'},
-                                    line_shape='spline', markers=True)
-                
-                fig_trend.add_hline(y=SEUIL_IMR_ALERTE, line_dash="dot", line_color="red", 
-                                    annotation_text="Seuil Alerte IMR", 
-                                    annotation_position="top right")
+            if not df_comp.empty:
+                with perf_recorder.span("figure.tendance_imr"):
+                    fig_trend = figure_cache.get("tendance_imr", df_comp, (marque, kpis.SEUIL_IMR_ALERTE), lambda: figures.figure_tendance_imr(df_comp, marque))
 
-                st.plotly_chart(fig_trend, use_container_width=True)
+                with perf_recorder.span("affichage.tendance_imr"):
+                    st.plotly_chart(fig_trend, width="stretch")
             else:
                 st.info("Sélectionnez une marque dans la sidebar pour afficher l'IMR et la tendance.")
 
@@ -678,54 +482,70 @@ with tab1:
     # Donut Chart NCF Fournisseur / Matrice Corrélation
     total_fournisseurs_t1 = 100 # Simulé
     total_fournisseurs_impactes = 15 # Simulé
-    if 'identifiant_de_l_etablissement_d_ou_provient_le_produit' in df_filtered.columns and total_fournisseurs_impactes > 0:
+    if 'identifiant_de_l_etablissement_d_ou_provient_le_produit' in colonnes and total_fournisseurs_impactes > 0:
         st.subheader("3. Dépendance au Risque Fournisseur (NCF T1)")
         df_ncf = pd.DataFrame({
             'Type': ['Fournisseurs Impactés', 'Fournisseurs non Impactés'],
             'Count': [total_fournisseurs_impactes, max(0, total_fournisseurs_t1 - total_fournisseurs_impactes)]
         })
-        fig_donut = px.pie(df_ncf, values='Count', names='Type', hole=.5, 
-                           title=f"Taux de Non-Conformité (NCF) des {total_fournisseurs_t1} Fournisseurs T1 (Simulé)",
-                           color_discrete_sequence=['#E74C3C', '#2ECC71'])
-        st.plotly_chart(fig_donut, use_container_width=True)
+        with perf_recorder.span("figure.ncf_fournisseurs"):
+            fig_donut = figure_cache.get("ncf_fournisseurs", df_ncf, (total_fournisseurs_t1,), lambda: figures.figure_ncf_fournisseurs(df_ncf, total_fournisseurs_t1))
+        with perf_recorder.span("affichage.ncf_fournisseurs"):
+            st.plotly_chart(fig_donut, width="stretch")
     else:
          st.markdown("### 3. Corrélation : Matrice des Motifs vs. Risques")
-         if "risques_encourus" in df_filtered.columns and "motif_du_rappel" in df_filtered.columns:
-            df_corr = df_filtered.copy()
-            df_corr["Motif_court"] = df_corr["motif_du_rappel"].str.split(r'[;.,]').str[0].str.strip()
-            
-            df_exploded_motif_risque = df_corr.assign(risques_encourus=df_corr['risques_encourus'].str.split(';')).explode('risques_encourus')
-            df_exploded_motif_risque['risques_encourus'] = df_exploded_motif_risque['risques_encourus'].str.strip()
+         if "risques_encourus" in colonnes and "motif_du_rappel" in colonnes:
+            with perf_recorder.span("onglet1.matrice_motifs_risques", rows=len(selection)):
+                cooccurrence_filtered = get_section("motif_risk_matrix", selection.key, analytics, selection)
             
-            if df_exploded_motif_risque.empty:
-                st.info("Pas assez de données pour générer la matrice de corrélation Motif/Risque (après explosion des risques).")
+            if not cooccurrence_filtered.empty:
+                with perf_recorder.span("figure.matrice_motifs_risques"):
+                    fig_heatmap = figure_cache.get("matrice_motifs_risques", cooccurrence_filtered, (), lambda: figures.figure_matrice_motifs_risques(cooccurrence_filtered))
+                with perf_recorder.span("affichage.matrice_motifs_risques"):
+                    st.plotly_chart(fig_heatmap, width="stretch")
             else:
-                cooccurrence = df_exploded_motif_risque.groupby(['Motif_court', 'risques_encourus']).size().reset_index(name='Nombre')
-                cooccurrence = cooccurrence[cooccurrence['Nombre'] > 0]
-                
-                top_motifs_list = cooccurrence['Motif_court'].value_counts().head(5).index
-                top_risques_list = cooccurrence['risques_encourus'].value_counts().head(5).index
-                
-                cooccurrence_filtered = cooccurrence[
-                    cooccurrence['Motif_court'].isin(top_motifs_list) & 
-                    cooccurrence['risques_encourus'].isin(top_risques_list)
-                ]
-                
-                if not cooccurrence_filtered.empty:
-                    fig_heatmap = px.density_heatmap(cooccurrence_filtered, x="Motif_court", y="risques_encourus", z="Nombre", 
-                                                     title="Fréquence d'association des Top 5 Motifs et Top 5 Risques",
-                                                     text_auto=True, color_continuous_scale="Plasma")
-                    st.plotly_chart(fig_heatmap, use_container_width=True)
-                else:
-                    st.info("Pas assez de données pour générer la matrice de corrélation Motif/Risque.")
+                st.info("Pas assez de données pour générer la matrice de corrélation Motif/Risque.")
          else:
              st.info("Colonnes de risque et/ou de motif manquantes pour la matrice.")
 
+    st.markdown("---")
+    st.subheader("4. Classement de Toutes les Marques (IMR, IPC, Coût Implicite)")
+    # Classement de toutes les marques : mêmes filtres, marque exceptée
+    with perf_recorder.span("kpis.classement_marques"):
+        classement_marques = get_league_table(selection.key_hors_marque, analytics, selection)
+    if classement_marques.empty:
+        st.info("Aucune marque à classer avec les filtres actuels.")
+    else:
+        col_tri, col_ordre, col_taille, col_page = st.columns(4)
+        tri = col_tri.selectbox("Trier par", list(CLASSEMENT_COLONNES), format_func=CLASSEMENT_COLONNES.get, key="classement_tri")
+        ordre = col_ordre.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True, key="classement_ordre")
+        taille_page = col_taille.selectbox("Marques par page", CLASSEMENT_TAILLES_PAGE, key="classement_taille")
+        n_pages = max(1, -(-len(classement_marques) // taille_page))
+        # Sans clé : le numéro de page revient à 1 quand le nombre de pages change
+        page = col_page.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+
+        # Tri stable sur la colonne choisie, le volume de rappels départage les ex aequo
+        with perf_recorder.span("onglet1.classement_tri_pagination", rows=len(classement_marques)):
+            classement_trie = classement_marques.sort_values([tri, "Rappels"], ascending=[ordre == "Croissant", False], kind="stable")
+            classement_trie.insert(0, "Rang", np.arange(1, len(classement_trie) + 1))
+            page_classement = classement_trie.iloc[(page - 1) * taille_page:page * taille_page]
+
+        st.caption(f"{len(classement_marques)} marques — page {page}/{n_pages} — IMR du marché de la période : {kpi.imr_marche:.2f}"
+                   + (f" — {marque} : rang {int(classement_trie.loc[marque, 'Rang'])}" if marque in classement_trie.index else ""))
+        st.dataframe(page_classement.rename(columns=CLASSEMENT_COLONNES).rename_axis("Marque"), width="stretch",
+                     column_config={
+                         "Part (%)": st.column_config.NumberColumn(format="%.2f"),
+                         "IMR": st.column_config.NumberColumn(format="%.2f"),
+                         "Gravité Moyenne": st.column_config.NumberColumn(format="%.2f"),
+                         "Coût Implicite (€)": st.column_config.NumberColumn(format="%.0f"),
+                         "IPC": st.column_config.NumberColumn(format="%.2f"),
+                     })
+
 
 # ----------------------------------------------------------------------
 # TAB 2: DISTRIBUTEURS & RETAILERS (MATRICE DE RISQUE LOGISTIQUE & GÉOSPATIALITÉ)
 # ----------------------------------------------------------------------
-with tab2:
+def onglet_distributeurs():
     st.header("🛒 Analyse du Canal de Distribution & Risque Logistique")
 
     # --- FEUILLE DE ROUTE DISTRIBUTEURS ---
@@ -758,28 +578,25 @@ with tab2:
         st.metric("Total Rappels (Filtré)", total_rappels,
             help="Nombre total de fiches de rappel publiées, tenant compte de la période et des filtres sélectionnés. 📈 **Message :** Mesure la **pression volume** globale.")
     with col2:
-        st.metric("Score d'Exposition Géographique (Simulé)", "Élevé" if total_rappels > SEUIL_ORANGE_MAX * 5 else "Faible",
+        st.metric("Score d'Exposition Géographique (Simulé)", "Élevé" if total_rappels > kpis.SEUIL_ORANGE_MAX * 5 else "Faible",
             help="Évaluation simplifiée de l'impact potentiel du rappel (volume et densité). 🗺️ **Logistique :** Un score élevé signifie que la charge logistique et la pression médiatique sont maximales pour les zones de vente concernées.")
     with col3:
-        st.metric("Délai Moyen (DM) Avant Rappel", DM_label,
+        st.metric("Délai Moyen (DM) Avant Rappel", kpi.dm_label,
             help="Moyenne des (Date Publication - Date Début Commercialisation) en jours. ⏱️ **Réactivité :** Plus ce délai est long, plus l'exposition du consommateur au risque a été importante (faible réactivité interne).")
     with col4:
-        st.metric("Taux d'Anomalie Logistique (TAL)", f"{tal_value:.1f}%",
+        st.metric("Taux d'Anomalie Logistique (TAL)", f"{kpi.tal:.1f}%",
             help="Pourcentage des rappels dont le motif est lié à un défaut de distribution/stockage. 📦 **Chaîne de Froid :** Un TAL élevé pointe directement vers des faiblesses dans le réseau de distribution ou le stockage en magasin.")
         
     # LIGNE 2 : PERFORMANCE & PROJECTION
     with col5:
-        st.metric("Délai d'Alerte Précoce (DAP)", f"{dap_value:.1f}%",
+        st.metric("Délai d'Alerte Précoce (DAP)", f"{kpi.dap:.1f}%",
             help="Proportion des rappels dont la durée de commercialisation a été très courte (< 7 jours). 💡 **Efficacité :** Un DAP élevé peut indiquer que vos systèmes d'alerte internes sont lents, ou au contraire que le contrôle externe est très rapide.")
     with col6:
-        st.metric("Coût Logistique Max/Distributeur", f"{COUT_LOGISTIQUE_JOUR_SUPP:,.0f} € / Jour",
+        st.metric("Coût Logistique Max/Distributeur", f"{kpis.COUT_LOGISTIQUE_JOUR_SUPP:,.0f} € / Jour",
             help="Coût simulé d'un jour d'exposition au risque logistique par rappel. 💸 **Négociation :** Sert de base pour prioriser les distributeurs ayant le risque de *durée* le plus coûteux.")
     with col7:
-        if "distributeurs" in df_filtered.columns:
-            df_distrib_exploded = explode_column(df_filtered, 'distributeurs')
-            distrib_counts = df_distrib_exploded['distributeurs'].value_counts()
-            densite_distrib = distrib_counts.mean() if not distrib_counts.empty else 0.0
-            st.metric("Densité Moy. Rappel/Distributeur", f"{densite_distrib:.1f}",
+        if kpi.densite_distributeurs is not None:
+            st.metric("Densité Moy. Rappel/Distributeur", f"{kpi.densite_distributeurs:.1f}",
                 help="Total Rappels (Filtré) / Nombre de Distributeurs Uniques Impliqués. ⚖️ **Concentration :** Mesure la fréquence d'incidents chez les partenaires. Un ratio élevé indique une dépendance à des distributeurs plus risqués.")
         else:
             st.metric("Densité Moy. Rappel/Distributeur", "N/A",
@@ -793,119 +610,51 @@ with tab2:
     st.markdown("### 1. Matrice de Priorisation du Risque Distributeur (Bubble Chart)")
     st.markdown("---") # Séparation visuelle
     
-    if "date_debut_commercialisation" in df_filtered.columns and "distributeurs" in df_filtered.columns:
+    if "date_debut_commercialisation" in colonnes and "distributeurs" in colonnes:
             
-        df_reponse = df_filtered.dropna(subset=["date_publication", "date_debut_commercialisation", "distributeurs"]).copy()
+        with perf_recorder.span("onglet2.bulles_distributeurs.agregation", rows=len(selection)):
+            avg_distrib = get_section("distributor_risk", selection.key, analytics, selection)
         
-        if df_reponse.empty:
-            st.info("⚠️ Les filtres appliqués n'ont généré aucune donnée valide pour la Matrice de Risque Distributeur.")
+        if not avg_distrib.empty:
+            with perf_recorder.span("figure.bulles_distributeurs"):
+                fig_bubble = figure_cache.get("bulles_distributeurs", avg_distrib, (), lambda: figures.figure_bulles_distributeurs(avg_distrib))
+            with perf_recorder.span("affichage.bulles_distributeurs"):
+                st.plotly_chart(fig_bubble, width="stretch")
         else:
-            df_reponse = df_reponse.assign(distributeurs=df_reponse['distributeurs'].str.split(';')).explode('distributeurs')
-            df_reponse['distributeurs'] = df_reponse['distributeurs'].str.strip()
-            df_reponse = df_reponse[df_reponse['distributeurs'] != '']
-            
-            if df_reponse.empty:
-                st.info("⚠️ Les données de distributeurs sont vides après nettoyage et explosion. (Vérifiez les valeurs de la colonne 'distributeurs')")
-            else:
-                df_reponse["Délai_Jours"] = (df_reponse["date_publication"] - df_reponse["date_debut_commercialisation"]).dt.days
-                df_reponse = df_reponse[df_reponse["Délai_Jours"] >= 0]
-                
-                if 'risques_encourus' in df_reponse.columns:
-                    df_reponse['is_risque_grave'] = df_reponse["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-                    df_reponse['Score_Gravite'] = np.where(df_reponse['is_risque_grave'], 2, 1) 
-                else:
-                    df_reponse['Score_Gravite'] = 1
-                
-                avg_distrib = df_reponse.groupby("distributeurs").agg(
-                    Délai_Moyen_Jours=('Délai_Jours', 'mean'),
-                    Nb_Rappels=('Délai_Jours', 'count'),
-                    Gravite_Moyenne=('Score_Gravite', 'mean')
-                ).reset_index()
-                
-                # Coût d'exposition au risque simulé (en k€)
-                avg_distrib['Coût_Risque_Simulé'] = avg_distrib['Délai_Moyen_Jours'] * avg_distrib['Nb_Rappels'] * avg_distrib['Gravite_Moyenne'] * COUT_LOGISTIQUE_JOUR_SUPP / 1000 
-                
-                if not avg_distrib.empty:
-                    fig_bubble = px.scatter(avg_distrib, 
-                                            x="Délai_Moyen_Jours", 
-                                            y="Nb_Rappels", 
-                                            size="Coût_Risque_Simulé", 
-                                            color="Gravite_Moyenne",
-                                            hover_name="distributeurs",
-                                            size_max=40,
-                                            title="Matrice de Priorisation du Risque Distributeur (Coût Logistique/Jours Simulé)",
-                                            labels={
-                                                "Délai_Moyen_Jours": "Axe X: Délai Moyen avant Rappel (Jours) ➡ Risque de Durée",
-                                                "Nb_Rappels": "Axe Y: Fréquence des Rappels ➡ Risque de Volume",
-                                                "Gravite_Moyenne": "Gravité Moyenne (Couleur)",
-                                                "Coût_Risque_Simulé": "Coût d'Exposition au Risque Simulé (k€)"
-                                            },
-                                            color_continuous_scale=px.colors.sequential.YlOrRd)
-                    
-                    if not avg_distrib.empty:
-                        fig_bubble.add_vline(x=avg_distrib['Délai_Moyen_Jours'].median(), line_dash="dash", line_color="#34495E")
-                        fig_bubble.add_hline(y=avg_distrib['Nb_Rappels'].median(), line_dash="dash", line_color="#34495E")
-
-                    fig_bubble.update_layout(xaxis_range=[0, avg_distrib['Délai_Moyen_Jours'].max() * 1.1])
-                    st.plotly_chart(fig_bubble, use_container_width=True)
-                else:
-                    st.info("Données insuffisantes pour la matrice de risque distributeur (après agrégation).")
+            st.info("Données insuffisantes pour la matrice de risque distributeur (après agrégation).")
     else:
         st.info("Colonnes de date de commercialisation et/ou distributeurs manquantes.")
         
     
     st.markdown("---") # Séparation visuelle
     st.subheader("2. Score de Risque Géographique (Traffic Light) ")
-    st.caption(f"Seuils : 🟢 0-{SEUIL_VERT_MAX} rappels, 🟠 {SEUIL_VERT_MAX+1}-{SEUIL_ORANGE_MAX} rappels, 🔴 >{SEUIL_ORANGE_MAX} rappels.")
+    st.caption(f"Seuils : 🟢 0-{kpis.SEUIL_VERT_MAX} rappels, 🟠 {kpis.SEUIL_VERT_MAX+1}-{kpis.SEUIL_ORANGE_MAX} rappels, 🔴 >{kpis.SEUIL_ORANGE_MAX} rappels.")
 
-    if "zone_geographique_de_vente" in df_filtered.columns:
-        df_geo = explode_column(df_filtered, "zone_geographique_de_vente")
-        
-        # Tentative d'extraction du code départemental/régional (très simplifié)
-        df_geo['zone_clean'] = df_geo['zone_geographique_de_vente'].str.extract(r'(\d{2,3})') 
-        df_geo.loc[df_geo['zone_clean'].isna(), 'zone_clean'] = df_geo.loc[df_geo['zone_clean'].isna(), 'zone_geographique_de_vente'].str.split('-').str[0].str.strip()
-        df_geo = df_geo.dropna(subset=['zone_clean'])
-        
-        # Agrégation par zone
-        geo_counts = df_geo.groupby('zone_clean').size().reset_index(name='Nombre_Rappels')
+    if "zone_geographique_de_vente" in colonnes:
+        # Zones de vente résolues en départements une fois par version du jeu (codes, noms, régions, France entière) :
+        # l'agrégation par département est un simple comptage sur le pont rappel x département
+        with perf_recorder.span("onglet2.carte_departements.effectifs", rows=len(selection)):
+            geo_counts = get_section("departement_risk", selection.key, analytics, selection)
         
         if not geo_counts.empty:
-            # Attribution du Traffic Light
-            geo_counts['Niveau_Risque'] = geo_counts['Nombre_Rappels'].apply(get_traffic_light)
-            
             # Affichage de la carte Choropleth si GeoJSON disponible (avec attribution de couleur)
             if geojson_data:
                 
                 st.info("✅ GeoJSON détecté. Affichage de la carte de risque géospatial (Taille ajustée).")
                 
-                def get_plotly_color(count):
-                    if count <= SEUIL_VERT_MAX: return '#2ECC71' # Green
-                    elif count <= SEUIL_ORANGE_MAX: return '#F39C12' # Orange
-                    else: return '#E74C3C' # Red
-                
-                geo_counts['Couleur_Hex'] = geo_counts['Nombre_Rappels'].apply(get_plotly_color)
-                
                 try:
-                    fig_map = px.choropleth(geo_counts,
-                                            geojson=geojson_data,
-                                            locations='zone_clean',
-                                            featureidkey="properties.code", 
-                                            color='Nombre_Rappels', 
-                                            hover_name='zone_clean',
-                                            color_continuous_scale=["#2ECC71", "#F39C12", "#E74C3C"], 
-                                            range_color=[0, SEUIL_ORANGE_MAX + 1], 
-                                            title="Répartition Géospatiale du Risque (Traffic Light)",
-                                            height=1000) 
+                    # Seules les géométries des zones affichées sont envoyées, simplifiées selon le niveau de zoom
+                    _, geojson_vue = get_geojson_view(geojson_data, geojson_stamp, tuple(sorted(geo_counts['zone_clean'].unique())))
+                    with perf_recorder.span("figure.carte_departements"):
+                        fig_map = figure_cache.get("carte_departements", geo_counts, (geojson_stamp, kpis.SEUIL_ORANGE_MAX), lambda: figures.figure_carte_departements(geo_counts, geojson_vue))
                     
-                    fig_map.update_geos(
-                        fitbounds="locations", 
-                        visible=False,
-                        center={"lat": 46.603354, "lon": 1.888334}, 
-                        projection_scale=3 
-                    )
-                    fig_map.update_layout(coloraxis_showscale=False) 
-                    
-                    st.plotly_chart(fig_map, use_container_width=True)
+                    with perf_recorder.span("affichage.carte_departements"):
+                        st.plotly_chart(fig_map, width="stretch")
+                    # Départements comptés mais non dessinés par le GeoJSON (outre-mer notamment)
+                    codes_carte = {f.get("properties", {}).get("code") for f in geojson_vue["features"]}
+                    hors_carte = geo_counts[~geo_counts['zone_clean'].isin(codes_carte)]
+                    if not hors_carte.empty:
+                        st.caption("Hors carte : " + ", ".join(f"{d} ({n} rappel(s))" for d, n in zip(hors_carte['Département'], hors_carte['Nombre_Rappels'])))
                 except Exception as e:
                     st.warning(f"⚠️ Impossible d'afficher la carte Choropleth (Erreur Plotly : {e}). Vérifiez la correspondance des codes dans le GeoJSON.")
                     
@@ -914,7 +663,7 @@ with tab2:
                         'zone_clean': 'Zone Géographique', 
                         'Nombre_Rappels': 'Nbre de Rappels'
                     }).sort_values(by='Nbre de Rappels', ascending=False), 
-                    hide_index=True, use_container_width=True)
+                    hide_index=True, width="stretch")
 
             else:
                 # Affichage du tableau de bord Traffic Light (par défaut si pas de GeoJSON)
@@ -926,10 +675,17 @@ with tab2:
                     'zone_clean': 'Zone Géographique', 
                     'Nombre_Rappels': 'Nbre de Rappels'
                 }).sort_values(by='Nbre de Rappels', ascending=False), 
-                hide_index=True, use_container_width=True)
+                hide_index=True, width="stretch")
                 
         else:
             st.info("Données de zone géographique de vente insuffisantes pour l'analyse Traffic Light.")
+
+        # Zones non résolues en départements : signalées plutôt qu'ignorées silencieusement
+        zones_non_reconnues = get_section("departement_unresolved", selection.key, analytics, selection)
+        if not zones_non_reconnues.empty:
+            with st.expander(f"⚠️ {len(zones_non_reconnues)} zone(s) de vente non reconnue(s) — {int(zones_non_reconnues['Nombre_Rappels'].sum())} mention(s) hors carte"):
+                st.dataframe(zones_non_reconnues.rename(columns={'zone': 'Zone de vente', 'Nombre_Rappels': 'Nbre de Rappels'}),
+                             hide_index=True, width="stretch")
     else:
         st.info("Colonne 'zone_geographique_de_vente' manquante pour l'analyse géospatiale.")
 
@@ -937,7 +693,7 @@ with tab2:
 # ----------------------------------------------------------------------
 # TAB 3: RISQUE & CONFORMITÉ (DÉRIVE DES CAUSES RACINES & PROFIL DE RISQUE)
 # ----------------------------------------------------------------------
-with tab3:
+def onglet_conformite():
     st.header("🔬 Évaluation de la Gravité et Tendance du Risque (Assurance & Conseil)")
     
     # --- FEUILLE DE ROUTE CONFORMITÉ ---
@@ -971,15 +727,14 @@ with tab3:
         st.metric("Total Rappels (Filtré)", total_rappels,
             help="Nombre total de fiches de rappel publiées, tenant compte de la période et des filtres sélectionnés. 📈 **Message :** Mesure la **pression volume** globale.")
     with col2:
-        st.metric("% Rappels Graves", pc_risques_graves_str,
+        st.metric("% Rappels Graves", kpi.pc_risques_graves_label,
             help="Proportion des rappels dont le risque est jugé grave. 🛑 **Gravité :** Un taux élevé justifie un renforcement immédiat des contrôles qualité critiques (CCP).")
     with col3:
-        st.metric("Taux de Récurrence des Causes Racines (TRCR)", f"{trcr_value:.1f}%",
+        st.metric("Taux de Récurrence des Causes Racines (TRCR)", f"{kpi.trcr:.1f}%",
             help="Pourcentage des rappels dont la cause racine a déjà été observée dans le passé. 🔁 **Audit :** Un TRCR élevé indique un **échec des actions correctives** et nécessite un audit du système qualité.")
     with col4:
-        if not df_risques_exploded.empty:
-            diversite_risques = df_risques_exploded['risques_encourus'].nunique()
-            st.metric("Diversité des Risques", diversite_risques, 
+        if kpi.diversite_risques is not None:
+            st.metric("Diversité des Risques", kpi.diversite_risques, 
                 help="Nombre de types de risques encourus différents identifiés. 🤯 **Systémique :** Une grande diversité signale des problèmes de maîtrise générale plutôt qu'un risque ponctuel.")
         else:
             st.metric("Diversité des Risques", "N/A", 
@@ -987,125 +742,117 @@ with tab3:
         
     # LIGNE 2 : PERFORMANCE & PROJECTION
     with col5:
-        st.metric("Volatilité IMR (IMR_STD)", f"{imr_std_value:.2f}",
+        st.metric("Volatilité IMR (IMR_STD)", f"{kpi.imr_std:.2f}",
             help="Écart-type (STD) des valeurs mensuelles de l'IMR sur 6 mois. 🎢 **Stabilité :** Une forte volatilité indique que le risque n'est pas maîtrisé et varie fortement d'un mois à l'autre (imprévisibilité).")
     with col6:
-        df_vol = df_filtered.groupby(df_filtered["date_publication"].dt.to_period("M")).size().reset_index(name="Rappels")
-        volatilite = df_vol["Rappels"].std() if not df_vol.empty and len(df_vol) > 1 else 0
-        st.metric("Volatilité Mensuelle Rappel", f"{volatilite:.1f}",
+        st.metric("Volatilité Mensuelle Rappel", f"{kpi.volatilite_mensuelle:.1f}",
             help="Écart-type (STD) du nombre de rappels publiés chaque mois sur la période filtrée. 🌪️ **Planification :** Une forte volatilité complique la planification des ressources de gestion de crise.")
     with col7:
-        if "motif_du_rappel" in df_filtered.columns and "risques_encourus" in df_filtered.columns and not df_filtered.empty:
-            df_temp_imr = df_filtered.copy()
-            df_temp_imr["is_risque_grave"] = df_temp_imr["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-            df_temp_imr['score_gravite'] = np.where(df_temp_imr['is_risque_grave'], 2, 1)
-
-            motif_graves = df_temp_imr.groupby('motif_du_rappel')['score_gravite'].mean().reset_index()
-            top_motifs_graves = motif_graves.sort_values(by='score_gravite', ascending=False).head(1)
-            
-            rmpc = top_motifs_graves['score_gravite'].mean() * 10 if not top_motifs_graves.empty else 0.0
-            st.metric("RMPC (Simulé)", f"{rmpc:.2f}", help="Risque Moyen Pondéré par Catégorie (RMPC). 💡 **Analyse :** Aide à identifier les motifs qui, bien que peu fréquents, portent la plus grande charge de risque (gravité élevée).")
+        if kpi.rmpc is not None:
+            st.metric("RMPC (Simulé)", f"{kpi.rmpc:.2f}", help="Risque Moyen Pondéré par Catégorie (RMPC). 💡 **Analyse :** Aide à identifier les motifs qui, bien que peu fréquents, portent la plus grande charge de risque (gravité élevée).")
         else:
             st.metric("RMPC (Simulé)", "N/A", help="Risque Moyen Pondéré par Catégorie (RMPC). 💡 **Analyse :** Aide à identifier les motifs qui, bien que peu fréquents, portent la plus grande charge de risque (gravité élevée).")
     with col8:
-        st.metric("Ratio Risque/Opportunité (RRO)", f"{rro_value:.2f}",
+        st.metric("Ratio Risque/Opportunité (RRO)", f"{kpi.rro:.2f}",
             help="Simule si le niveau de risque (IMR) est justifié par l'activité dans la catégorie. 🚀 **R&D :** Un score élevé (mauvais) suggère que l'entreprise prend des risques disproportionnés par rapport à l'activité concurrentielle du secteur.")
 
 
     st.markdown("### 1. Tendance : Dérive des Causes Racines (DCR) - Taux d'Émergence des Motifs")
     st.markdown("---") # Séparation visuelle
     
-    if "date_publication" in df_filtered.columns and "motif_du_rappel" in df_filtered.columns:
+    if "date_publication" in colonnes and "motif_du_rappel" in colonnes:
         
-        df_trend = df_filtered.copy()
+        with perf_recorder.span("onglet3.derive_motifs.cube", rows=len(selection)):
+            df_rank = get_section("motif_drift", selection.key, analytics, selection)
         
-        if df_trend.empty:
-            st.info("⚠️ Les données filtrées sont vides pour l'analyse des tendances.")
-        else:
-            df_trend["Mois"] = df_trend["date_publication"].dt.to_period("M")
-            
-            df_motifs = explode_column(df_trend, "motif_du_rappel")
-            
-            if not df_motifs.empty:
-                df_motifs = df_motifs.reset_index().rename(columns={'index': 'original_index'})
-                df_motifs_merged = pd.merge(df_motifs, df_trend[['Mois']].reset_index().rename(columns={'index': 'original_index'}), on='original_index', how='left')
-                
-                motif_counts = df_motifs_merged.groupby(['Mois', 'motif_du_rappel']).size().reset_index(name='Rappels')
-                motif_counts['Rang'] = motif_counts.groupby('Mois')['Rappels'].rank(method='first', ascending=False)
-                
-                top_motifs_global = motif_counts['motif_du_rappel'].value_counts().head(5).index
-                df_rank = motif_counts[motif_counts['motif_du_rappel'].isin(top_motifs_global)].copy()
-                
-                df_rank['Mois'] = df_rank['Mois'].dt.to_timestamp()
+        if not df_rank.empty:
+            with perf_recorder.span("figure.derive_motifs"):
+                fig_bump = figure_cache.get("derive_motifs", df_rank, (), lambda: figures.figure_derive_motifs(df_rank))
                 
-                if not df_rank.empty:
-                    fig_bump = px.line(df_rank, 
-                                       x="Mois", 
-                                       y="Rang", 
-                                       color="motif_du_rappel", 
-                                       line_shape='spline',
-                                       markers=True,
-                                       title="Évolution du Classement (Rang) des 5 Principaux Motifs de Rappel",
-                                       labels={"Rang": "Classement (1 = Plus Fréquent)", "Mois": "Mois"},
-                                       color_discrete_sequence=px.colors.qualitative.Dark24)
-                    
-                    fig_bump.update_yaxes(autorange="reversed", tickvals=[1, 2, 3, 4, 5], title="Classement (1 = le plus fréquent)")
-                    fig_bump.update_traces(marker=dict(size=10))
-                    
-                    st.plotly_chart(fig_bump, use_container_width=True)
-                else:
-                    st.info("Données insuffisantes pour la Dérive des Causes Racines.")
-            else:
-                 st.info("Données de motif de rappel insuffisantes après nettoyage.")
+            with perf_recorder.span("affichage.derive_motifs"):
+                st.plotly_chart(fig_bump, width="stretch")
+        else:
+            st.info("Données insuffisantes pour la Dérive des Causes Racines.")
     else:
         st.info("Colonnes manquantes pour l'analyse des motifs.")
 
     st.markdown("---") # Séparation visuelle
     st.subheader("2. Profil de Risque (Radar Chart RMPC)")
     
-    if "categorie_de_produit" in df_filtered.columns and "risques_encourus" in df_filtered.columns:
-        df_radar = df_filtered.copy()
+    if "categorie_de_produit" in colonnes and "risques_encourus" in colonnes:
+        with perf_recorder.span("onglet3.profil_risque.agregation", rows=len(selection)):
+            top_cats = get_section("risk_profile", selection.key, analytics, selection)
         
-        if df_radar.empty:
-            st.info("⚠️ Les données filtrées sont vides. Ajustez les filtres pour générer le Profil de Risque (Radar Chart).")
+        if not top_cats.empty:
+            with perf_recorder.span("figure.profil_risque"):
+                fig_radar = figure_cache.get("profil_risque", top_cats, (), lambda: figures.figure_profil_risque(top_cats))
+            with perf_recorder.span("affichage.profil_risque"):
+                st.plotly_chart(fig_radar, width="stretch")
         else:
-            df_radar['is_risque_grave'] = df_radar["risques_encourus"].str.contains(risques_graves_keywords, case=False, na=False)
-            df_radar['score_gravite'] = np.where(df_radar['is_risque_grave'], 2, 1)
-
-            cat_scores = df_radar.groupby('categorie_de_produit').agg(
-                RMPC=('score_gravite', 'mean'),
-                Frequence=('categorie_de_produit', 'count')
-            ).reset_index()
-            
-            cat_scores['RMPC'] = cat_scores['RMPC'] * 10 
-            
-            top_cats = cat_scores.sort_values(by='Frequence', ascending=False).head(5)
-            
-            if not top_cats.empty:
-                fig_radar = px.line_polar(top_cats, r='RMPC', theta='categorie_de_produit', line_close=True,
-                                          title="Profil de Risque Moyen Pondéré par Catégorie (RMPC)",
-                                          color_discrete_sequence=['#E67E22'])
-                fig_radar.update_traces(fill='toself')
-                fig_radar.update_layout(polar=dict(
-                    radialaxis=dict(visible=True, range=[0, 20])
-                ))
-                st.plotly_chart(fig_radar, use_container_width=True)
-            else:
-                st.info("Données insuffisantes pour le Profil de Risque (Radar Chart) : aucune catégorie fréquente identifiée.")
+            st.info("Données insuffisantes pour le Profil de Risque (Radar Chart) : aucune catégorie fréquente identifiée.")
     else:
          st.info("Données de risque et/ou de catégorie manquantes.")
 
 
-st.markdown("---")
 
-# --- 6. TABLEAU DE DONNÉES DÉTAILLÉ ---
-with st.expander("🔍 Registre Détaillé des Rappels (Filtré)"):
-    display_cols = [c for c in ["reference_fiche", "date_publication", "date_debut_commercialisation", "categorie_de_produit", "nom_marque_du_produit", "motif_du_rappel", "risques_encourus", "distributeurs", "zone_geographique_de_vente", "liens_vers_la_fiche_rappel"] if c in df_filtered.columns]
-    
-    st.dataframe(df_filtered[display_cols].sort_values(by="date_publication", ascending=False).reset_index(drop=True), use_container_width=True)
+# Onglets à état : changer d'onglet relance le script et seul l'onglet ouvert est calculé
+tab1, tab2, tab3 = st.tabs(["🏭 Fabricants & Marques", "🛒 Distributeurs & Retailers", "🔬 Risque & Conformité"], key="onglet", on_change="rerun")
+for onglet, nom_span, rendu in ((tab1, "onglet1", onglet_fabricants), (tab2, "onglet2", onglet_distributeurs), (tab3, "onglet3", onglet_conformite)):
+    with onglet:
+        if onglet.open:
+            with perf_recorder.span(nom_span):
+                rendu()
 
-    csv = df_filtered[display_cols].to_csv(index=False).encode('utf-8')
-    st.download_button(label="💾 Télécharger les Données Filtrées (CSV)", data=csv, file_name="recall_analytics_export_filtered.csv", mime="text/csv")
+st.markdown("---")
 
+# --- 7. TABLEAU DE DONNÉES DÉTAILLÉ ---
+# Expander à état : le registre n'est calculé que lorsqu'il est déplié ; le fichier d'export n'est généré
+# qu'au clic sur le bouton (hors rerun), puis mémorisé par format et sélection dans le moteur
+registre = st.expander("🔍 Registre Détaillé des Rappels (Filtré)", key="registre_ouvert", on_change="rerun")
+with registre:
+    if registre.open:
+        with perf_recorder.span("registre"):
+            col_tri, col_ordre, col_taille, col_page = st.columns(4)
+            # Le tri par pertinence n'est proposé que pendant une recherche
+            tris = list(REGISTRE_TRIS) if recherche else [t for t in REGISTRE_TRIS if t != engine.TRI_PERTINENCE]
+            tri = col_tri.selectbox("Trier par", tris, format_func=REGISTRE_TRIS.get, key="registre_tri")
+            ordre = col_ordre.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True, key="registre_ordre")
+            taille_page = col_taille.selectbox("Rappels par page", REGISTRE_TAILLES_PAGE, key="registre_taille")
+            n_pages = max(1, -(-len(selection) // taille_page))
+            # Sans clé : le numéro de page revient à 1 quand le nombre de pages change
+            page = col_page.number_input("Page", min_value=1, max_value=n_pages, value=1, step=1)
+            colonnes_registre = st.multiselect("Colonnes affichées", analytics.registry_columns(), default=analytics.registry_columns(),
+                                               key="registre_colonnes")
+
+            # Seule la page affichée est triée, matérialisée et envoyée au navigateur
+            with perf_recorder.span("registre.tableau", rows=len(selection)):
+                page_registre, n_lignes = analytics.registry_page(selection, tri, ordre == "Décroissant", page, taille_page,
+                                                                  colonnes_registre or None)
+            st.caption(f"{n_lignes} rappels — page {page}/{n_pages}")
+            st.dataframe(page_registre, width="stretch")
+
+            formats_export = exports.available_formats(len(selection))
+            format_export = st.radio("Format d'export", formats_export, horizontal=True, key="format_export",
+                                     format_func=lambda f: exports.EXPORT_FORMATS[f].label)
+            fichier = exports.EXPORT_FORMATS[format_export]
+            st.download_button(label=f"💾 Télécharger les Données Filtrées ({fichier.label})",
+                               data=partial(analytics.export, selection, format_export),
+                               file_name=f"recall_analytics_export_filtered.{fichier.extension}", mime=fichier.mime, on_click="ignore")
+
+
+# --- 8. PANNEAU PERFORMANCE (OPT-IN) ---
+with st.sidebar.expander("⏱️ Performance", expanded=perf_recorder.enabled):
+    st.checkbox("Chronométrer les étapes", key="perf_actif", help="Durée, lignes traitées et pic d'allocation de chaque étape, cumulés sur la session.")
+    st.checkbox("Mesurer les pics d'allocation (plus lent)", key="perf_memoire", disabled=not perf_recorder.enabled)
+    if perf_recorder.enabled:
+        st.caption(f"Dernier rerun ({perf_recorder.runs} chronométré(s) sur la session) :")
+        st.dataframe(perf_recorder.last_run_frame(), hide_index=True, width="stretch")
+        st.caption(f"Cache des figures : {len(figure_cache)} figure(s), {figure_cache.size / 1024 ** 2:.1f} Mo, "
+                   f"{figure_cache.hits} réutilisation(s) / {figure_cache.misses} construction(s).")
+        st.caption("Cumul de la session :")
+        st.dataframe(perf_recorder.totals_frame(), width="stretch")
+        st.download_button("📥 Exporter les mesures (JSON)", data=perf_recorder.to_json(), file_name="recall_analytics_performance.json", mime="application/json")
+        if st.button("Réinitialiser le cumul"):
+            perf_recorder.reset()
 
 st.caption("Prototype Recall Analytics — Données publiques (c) RappelConso.gouv.fr / Ministère de l'Économie")
@@ -0,0 +1,36 @@
+"""
+Moteur d'analyse des rappels RappelConso, importable sans Streamlit (dashboard, rapports par lots, benchmark).
+
+    df, rapport_memoire, _ = recall_analytics.load_csv("rappelconso_export.csv")
+    engine = recall_analytics.AnalyticsEngine(df)
+    selection = engine.select(recall_analytics.FilterState("12 derniers mois", marque="..."))
+    kpi = engine.kpis(selection)
+
+Les noms publics sont chargés à la première utilisation : importer le paquet (ou lancer un de ses modules
+en ligne de commande, `python -m recall_analytics.reports`) n'importe pas tout le moteur.
+"""
+import importlib
+
+# Nom public -> module qui le définit
+_EXPORTS = {
+    "AnalyticsEngine": "engine",
+    "FilterState": "engine",
+    "Selection": "engine",
+    "MissingColumnsError": "dataset",
+    "load_csv": "dataset",
+    "load_store": "dataset",
+    "PERIODE_OPTIONS": "filters",
+    "TOUTES": "filters",
+    "RowSelection": "filters",
+    "KpiBundle": "kpis",
+    "compute_kpis": "kpis",
+    "league_table": "kpis",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
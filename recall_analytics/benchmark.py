@@ -0,0 +1,275 @@
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import dataset
+from . import engine
+from . import exports
+from . import figures
+from . import filters
+from . import geo
+from . import kpis
+from . import loader
+
+
+# --- BENCHMARK REPRODUCTIBLE SUR EXPORTS RAPPELCONSO SYNTHÉTIQUES ---
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+BENCH_DIR = "benchmarks"
+RESULTS_FILE = "resultats.jsonl" # Une ligne JSON par (exécution, taille) : historique comparable entre versions
+
+CATEGORIES = ["Alimentation", "Hygiène-Beauté", "Jouets", "Automobiles et moyens de déplacement", "Appareils électriques",
+              "Vêtements, mode, EPI", "Maison-Habitat", "Sports-loisirs", "Bébés-Enfants (hors alimentaire)", "Animaux"]
+SOUS_CATEGORIES = ["Viandes", "Fromages", "Produits laitiers", "Biscuits", "Plats préparés", "Fruits et légumes",
+                   "Cosmétiques", "Peluches", "Petit électroménager", "Aliments pour animaux"]
+MOTIFS = ["Présence de listeria monocytogenes", "Allergène non déclaré", "Corps étranger", "Rupture de la chaîne du froid",
+          "Etiquetage non conforme", "Défaut de fabrication", "Présence de salmonelles", "Contamination fournisseur",
+          "Problème de transport", "Teneur en oxyde d'éthylène"]
+RISQUES = ["Listeria monocytogenes (agent responsable de la listériose)", "Salmonella spp (agent responsable de la salmonellose)",
+           "Escherichia coli", "Allergènes", "Blessures", "Corps étranger", "Autres contaminants chimiques", "Intoxication",
+           "Brûlure", "Risque d'étouffement"]
+ENSEIGNES = ["Leclerc", "Carrefour", "Intermarché", "Auchan", "Super U", "Lidl", "Casino", "Monoprix", "Franprix",
+             "Picard", "Aldi", "Cora", "Netto", "Biocoop", "Grand Frais", "Amazon", "Cdiscount", "Action"]
+ZONES_VENTE = ["France entière", "Paris (75)", "Nord (59)", "Rhône (69)", "Gironde (33)", "Bouches-du-Rhône (13)",
+               "Haute-Garonne (31)", "Corse-du-Sud (2A)", "La Réunion (974)", "Bretagne", "Île-de-France",
+               "Auvergne-Rhône-Alpes", "Hauts-de-France", "Occitanie", "Grand Est", "Outre-mer"]
+ETATS = ["Rappel en cours", "Rappel terminé"]
+
+
+def _zipf(n, s=1.1):
+    """Poids décroissants en 1/rang^s : quelques marques et enseignes concentrent l'essentiel des rappels."""
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+
+def _multi_pool(rng, vocab, n_values, max_tokens, skew=1.1):
+    """Valeurs multi-valeurs distinctes ('a|b|c'), tokens tirés selon une distribution biaisée."""
+    p = _zipf(len(vocab), skew)
+    pool = []
+    for _ in range(n_values):
+        k = int(rng.integers(1, max_tokens + 1))
+        pool.append("|".join(rng.choice(vocab, size=min(k, len(vocab)), replace=False, p=p)))
+    return np.array(pool, dtype=object)
+
+
+def generate_export(path, n_rows, seed=0, now=None):
+    """
+    Écrit un export CSV RappelConso synthétique (noms de colonnes de l'export source, séparateur ';') :
+    marques et distributeurs en distribution de Zipf, champs multi-valeurs séparés par '|',
+    trois ans de publications, dates de commercialisation et risques parfois manquants.
+    """
+    rng = np.random.default_rng(seed)
+    now = now if now is not None else pd.Timestamp.now(tz="UTC").floor("D")
+
+    marques = np.array([f"Marque {i}" for i in range(max(50, n_rows // 20))], dtype=object)
+    distributeurs = ENSEIGNES + [f"Distributeur {i}" for i in range(max(20, n_rows // 200))]
+    # Un nombre borné de combinaisons distinctes par champ multi-valeurs, comme dans l'export réel
+    pools = {
+        "motif_rappel": _multi_pool(rng, MOTIFS, 200, 2),
+        "risques_encourus": _multi_pool(rng, RISQUES, 300, 3),
+        "distributeurs": _multi_pool(rng, distributeurs, min(20_000, max(200, n_rows // 10)), 4),
+        "zone_geographique_de_vente": _multi_pool(rng, ZONES_VENTE, 400, 3),
+    }
+
+    publication = now - pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 3600, n_rows), unit="s")
+    debut = publication.floor("D") - pd.to_timedelta(rng.integers(-3, 240, n_rows), unit="D")
+    debut_txt = np.where(rng.random(n_rows) < 0.1, "", debut.strftime("%Y-%m-%d"))
+
+    columns = {
+        "numero_fiche": [f"{y}-{i:07d}" for y, i in zip(publication.year, range(n_rows))],
+        "categorie_produit": rng.choice(CATEGORIES, n_rows, p=_zipf(len(CATEGORIES), 0.8)),
+        "sous_categorie_produit": rng.choice(SOUS_CATEGORIES, n_rows),
+        "marque_produit": marques[rng.choice(len(marques), n_rows, p=_zipf(len(marques)))],
+    }
+    for col, pool in pools.items():
+        columns[col] = pool[rng.choice(len(pool), n_rows, p=_zipf(len(pool), 0.9))]
+    columns["risques_encourus"] = np.where(rng.random(n_rows) < 0.02, "", columns["risques_encourus"])
+    columns.update({
+        "etat_fiche": rng.choice(ETATS, n_rows, p=[0.3, 0.7]),
+        "denomination_vente": [f"Produit {i}" for i in rng.integers(0, max(100, n_rows // 3), n_rows)],
+        "date_publication": publication.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+        "date_debut_commercialisation": debut_txt,
+        "lien_vers_la_fiche_rappel": [f"https://rappel.conso.gouv.fr/fiche-rappel/{i}" for i in range(n_rows)],
+        "identifiant_de_l_etablissement_d_ou_provient_le_produit": np.where(rng.random(n_rows) < 0.5, "", "FR 01.001.001 CE"),
+    })
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    pd.DataFrame(columns).to_csv(path, sep=";", index=False)
+    return path
+
+
+def _remove_frame_cache(file_path):
+    """Supprime le cache Arrow d'un export : le chargement suivant repart du CSV."""
+    _, arrow_path, manifest_path = loader._cache_paths(file_path)
+    for path in (arrow_path, manifest_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class StageTimer:
+    """Chronomètre des étapes : première exécution (caches froids), minimum et médiane sur `repeat` exécutions."""
+
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.stages = {}
+
+    def run(self, stage, fn, repeat=None):
+        durees, result = [], None
+        for i in range(repeat or self.repeat):
+            debut = time.perf_counter()
+            result = fn(i)
+            durees.append(time.perf_counter() - debut)
+        self.stages[stage] = {"premier_s": durees[0], "min_s": min(durees), "median_s": statistics.median(durees), "runs": len(durees)}
+        return result
+
+
+def run_stages(csv_path, repeat=3, now=None, geojson_path=geo.GEOJSON_PATH):
+    """
+    Chronomètre les étapes du dashboard (sans rendu Streamlit) sur un export : chargement, précalculs,
+    options de la sidebar, filtrage global, bloc KPI, agrégations de chaque onglet, page du registre et exports,
+    mesurés sur les méthodes d'engine.AnalyticsEngine appelées par le dashboard. Les figures des bulles et de la
+    carte (si le GeoJSON est présent) sont mesurées construites puis servies par figures.FigureCache,
+    affichage compris (figures.chart_spec).
+    Les étapes de requête sont mesurées pour deux états des filtres : marché entier et marque la plus rappelée.
+    """
+    timer = StageTimer(repeat)
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    periode = "12 derniers mois"
+
+    _remove_frame_cache(csv_path)
+    timer.run("chargement_csv", lambda i: dataset.load_csv(csv_path), repeat=1)
+    df, _, _ = timer.run("chargement_cache_arrow", lambda i: dataset.load_csv(csv_path))
+
+    geojson_variants = geo.build_variants(geojson_path) if geojson_path and os.path.exists(geojson_path) else None
+    # Structures construites au premier accès : chaque précalcul est mesuré une fois, sur un moteur neuf
+    analytics = engine.AnalyticsEngine(df, geojson_variants)
+    figure_cache = figures.FigureCache()
+    timer.run("precalcul_index_tokens", lambda i: analytics.token_indexes, repeat=1)
+    timer.run("precalcul_ponts_tokens", lambda i: analytics.token_bridges, repeat=1)
+    timer.run("precalcul_cube_mensuel", lambda i: analytics.cube, repeat=1)
+    timer.run("precalcul_references_marche", lambda i: analytics.market_baselines(now), repeat=1)
+    timer.run("precalcul_pont_departements", lambda i: analytics.departement_bridge, repeat=1)
+
+    top_marque = str(analytics.period(periode, now).frame["nom_marque_du_produit"].value_counts().index[0])
+    etats = {"marche": filters.TOUTES, "marque": top_marque}
+
+    for etat, marque in etats.items():
+        prefix = f"{etat}."
+        state = engine.FilterState(periode, marque=marque)
+        selection = timer.run(prefix + "filtrage_global", lambda i: analytics.select(state, now))
+        # Contexte de facettes distinct à chaque exécution : mesure du calcul et non du cache
+        timer.run(prefix + "options_sidebar", lambda i: (
+            analytics.facets(selection.periode, ["categorie_de_produit"], (etat, "periode", i)),
+            analytics.facets(selection.coherence, analytics.filter_columns, (etat, "coherence", i)),
+        ))
+        # Sélection neuve à chaque exécution : la matérialisation n'est pas servie par le DataFrame déjà construit
+        frame = timer.run(prefix + "materialisation", lambda i: filters.RowSelection(df, selection.filtree.mask, selection.filtree.stop).frame)
+
+        def fresh(i):
+            # Version propre à l'exécution : les agrégats mémorisés par clé de sélection (départements, exports) sont recalculés
+            return dataclasses.replace(selection, version=f"{selection.version}#bench{i}")
+
+        timer.run(prefix + "calculate_imr", lambda i: kpis.calculate_imr(frame))
+        timer.run(prefix + "bloc_kpis", lambda i: analytics.kpis(selection))
+
+        timer.run(prefix + "onglet1_part_marques", lambda i: analytics.share_of_recalls(selection))
+        if marque != filters.TOUTES:
+            timer.run(prefix + "onglet1_tendance_imr", lambda i: analytics.imr_trend(selection))
+        timer.run(prefix + "onglet1_matrice_motifs_risques", lambda i: analytics.motif_risk_matrix(selection))
+        timer.run(prefix + "onglet1_classement_marques", lambda i: analytics.league_table(selection))
+
+        avg_distrib = timer.run(prefix + "onglet2_bulles_distributeurs", lambda i: analytics.distributor_risk(selection))
+        geo_counts = timer.run(prefix + "onglet2_carte_departements", lambda i: analytics.departement_risk(fresh(i)))
+
+        graphiques = {"bulles_distributeurs": (avg_distrib, lambda: figures.figure_bulles_distributeurs(avg_distrib))}
+        if geojson_variants and not geo_counts.empty:
+            _, geojson_vue = geo.view(geojson_variants, tuple(sorted(geo_counts["zone_clean"].unique())))
+            graphiques["carte_departements"] = (geo_counts, lambda: figures.figure_carte_departements(geo_counts, geojson_vue))
+        for nom, (agregat, build) in graphiques.items():
+            # Cache vide à chaque exécution (construction), puis cache rempli (succès) : affichage compris dans les deux cas
+            timer.run(prefix + f"figure_{nom}_construction", lambda i: figures.chart_spec(figures.FigureCache().get(nom, agregat, (), build)))
+            timer.run(prefix + f"figure_{nom}_cache", lambda i: figures.chart_spec(figure_cache.get(nom, agregat, (), build)))
+
+        timer.run(prefix + "onglet3_derive_motifs", lambda i: analytics.motif_drift(selection))
+        timer.run(prefix + "onglet3_profil_risque", lambda i: analytics.risk_profile(selection))
+
+        # Première exécution : rangs du tri calculés sur tout le jeu ; les suivantes ne trient que la page
+        for tri in engine.REGISTRE_TRIS:
+            timer.run(prefix + f"registre_page_{tri}", lambda i: analytics.registry_page(selection, tri, page=3, page_size=100))
+        # Export écrit par blocs depuis les positions de la sélection (hors cache des fichiers d'export)
+        for fmt in exports.available_formats(len(selection)):
+            timer.run(prefix + f"export_{fmt}", lambda i: analytics.export(fresh(i), fmt))
+    return {"n_lignes": len(df), "marque": top_marque, "periode": periode, "etapes": timer.stages}
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous_run(results_path, taille):
+    """Dernier résultat enregistré pour une taille (comparaison avec la version précédente)."""
+    previous = None
+    if os.path.exists(results_path):
+        with open(results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("taille") == taille:
+                    previous = record
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du dashboard sur des exports RappelConso synthétiques.")
+    parser.add_argument("--taille", action="append", choices=list(SIZES), help="Taille(s) d'export (répétable ; 10k et 100k par défaut)")
+    parser.add_argument("--repeat", type=int, default=3, help="Exécutions par étape de requête")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur (exports reproductibles)")
+    parser.add_argument("--dir", default=BENCH_DIR, help="Dossier des exports générés et des résultats")
+    parser.add_argument("--regenerate", action="store_true", help="Régénère les exports même s'ils existent")
+    args = parser.parse_args(argv)
+
+    results_path = os.path.join(args.dir, RESULTS_FILE)
+    for taille in args.taille or ["10k", "100k"]:
+        csv_path = os.path.join(args.dir, f"rappelconso_synthetique_{taille}_seed{args.seed}.csv")
+        if args.regenerate or not os.path.exists(csv_path):
+            print(f"Génération de {csv_path}...")
+            generate_export(csv_path, SIZES[taille], seed=args.seed)
+
+        previous = _previous_run(results_path, taille)
+        record = {
+            "horodatage": pd.Timestamp.now(tz="UTC").isoformat(),
+            "revision": _git_revision(),
+            "taille": taille,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            **run_stages(csv_path, repeat=args.repeat),
+        }
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        print(f"\n{taille} ({record['n_lignes']} lignes), révision {record['revision']}")
+        for stage, mesure in record["etapes"].items():
+            ligne = f"  {stage:<45} {mesure['median_s'] * 1000:>10.1f} ms"
+            if previous and stage in previous.get("etapes", {}) and previous["etapes"][stage]["median_s"] > 0:
+                ratio = mesure["median_s"] / previous["etapes"][stage]["median_s"]
+                ligne += f"   x{ratio:.2f} vs {previous.get('revision')}"
+            print(ligne)
+    print(f"\nRésultats ajoutés à {results_path}")
+
+
+if __name__ == "__main__":
+    main()
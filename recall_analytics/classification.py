@@ -0,0 +1,82 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# --- TAXONOMIE DE CLASSIFICATION (GRAVITÉ & CAUSES RACINES SIMULÉES) ---
+# Colonne de sortie -> (colonne texte analysée, mots-clés recherchés en sous-chaîne, insensible à la casse)
+TAXONOMY = {
+    "is_risque_grave": ("risques_encourus", ["listeriose", "salmonellose", "e.coli", "blessures", "allergene non declare", "corps étranger"]),
+    # Keywords pour les indicateurs de cause racine (simulés)
+    "is_cause_fournisseur": ("motif_du_rappel", ["allergene non declare", "composition", "etiquetage non conforme", "matiere premiere"]),
+    "is_cause_logistique": ("motif_du_rappel", ["temperature", "rupture de la chaine du froid", "probleme de distribution", "conditionnement"]),
+    "is_recurrence": ("risques_encourus", ["salmonelle", "listeria", "e.coli"]), # Pour la simulation du TRCR
+}
+
+# Score de gravité dérivé du drapeau grave : risque grave = poids 2, mineur = poids 1
+SCORE_COLUMN = "score_gravite"
+
+
+class KeywordMatcher:
+    """
+    Automate multi-motifs : tous les mots-clés d'une colonne sont compilés dans une seule expression
+    régulière à lookahead, qui rapporte chaque mot-clé trouvé (même chevauchant) en un seul passage.
+    """
+
+    def __init__(self, keywords_by_class):
+        self.classes = list(keywords_by_class)
+        self._bits = {}
+        for bit, name in enumerate(self.classes):
+            for keyword in keywords_by_class[name]:
+                keyword = keyword.lower()
+                self._bits[keyword] = self._bits.get(keyword, 0) | (1 << bit)
+
+        # Un mot-clé qui en contient un autre implique aussi les classes de ce dernier
+        # (le lookahead ne rapporte que le mot-clé le plus long à une position donnée)
+        for keyword in self._bits:
+            for other, bits in list(self._bits.items()):
+                if other != keyword and other in keyword:
+                    self._bits[keyword] |= bits
+
+        alternatives = "|".join(re.escape(k) for k in sorted(self._bits, key=len, reverse=True))
+        self._regex = re.compile(f"(?=({alternatives}))") if alternatives else None
+
+    def match(self, text):
+        """Retourne le masque de bits des classes dont un mot-clé apparaît dans le texte."""
+        if self._regex is None or not isinstance(text, str):
+            return 0
+        bits = 0
+        for m in self._regex.finditer(text.lower()):
+            bits |= self._bits[m.group(1)]
+        return bits
+
+
+def classify(df, taxonomy=TAXONOMY):
+    """
+    Étape de classification exécutée une seule fois au chargement : ajoute une colonne booléenne
+    par classe de la taxonomie et la colonne score_gravite (int8). Le texte n'est analysé que sur
+    les valeurs distinctes de chaque colonne, puis propagé aux lignes via les codes.
+    """
+    classes_by_column = {}
+    for flag_col, (text_col, keywords) in taxonomy.items():
+        classes_by_column.setdefault(text_col, {})[flag_col] = keywords
+
+    flags = {}
+    for text_col, keywords_by_class in classes_by_column.items():
+        if text_col not in df.columns:
+            for flag_col in keywords_by_class:
+                flags[flag_col] = np.zeros(len(df), dtype=bool)
+            continue
+
+        matcher = KeywordMatcher(keywords_by_class)
+        codes, uniques = pd.factorize(df[text_col])
+        bits_per_value = np.array([matcher.match(value) for value in uniques] + [0], dtype=np.int64)
+        bits = bits_per_value[codes] # Le code -1 (valeur manquante) pointe sur le 0 final
+        for bit, flag_col in enumerate(matcher.classes):
+            flags[flag_col] = (bits & (1 << bit)) != 0
+
+    df = df.assign(**flags)
+    if "is_risque_grave" in df.columns:
+        df[SCORE_COLUMN] = np.where(df["is_risque_grave"], 2, 1).astype(np.int8)
+    return df
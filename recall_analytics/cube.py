@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from . import filters
+from . import indexes
+
+
+# --- CUBE MENSUEL PRÉ-AGRÉGÉ (MOIS x CATÉGORIE x MARQUE x GRAVITÉ x MOTIF) ---
+# Dimensions du cube pouvant servir de filtre : les autres filtres de la sidebar imposent un retour aux lignes
+DIMENSIONS = ["categorie_de_produit", "nom_marque_du_produit", "motif_du_rappel"]
+NAT_MONTH = np.iinfo(np.int32).min # Mois des fiches sans date de publication (reste négatif une fois opposé)
+
+
+def _codes(s):
+    """Codes entiers (-1 = manquant) et libellés d'une colonne."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy().astype(np.int64), [str(v) for v in s.cat.categories]
+    codes, uniques = pd.factorize(s)
+    return codes.astype(np.int64), [str(v) for v in uniques]
+
+
+class MonthlyCube:
+    """
+    Agrégats (nombre de rappels, somme des scores de gravité) par cellule mois x catégorie x marque x gravité x motif,
+    calculés une seule fois par version du jeu. Les vues mensuelles (tendance IMR, marché, volatilité, rang des motifs)
+    sont calculées sur les cellules et non plus sur les lignes.
+    Les motifs sont stockés par valeur distincte et ventilés par token à la requête (comme les facettes).
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        dates = df["date_publication"]
+        # Ordinal de période mensuelle (mois depuis 1970-01), identique à dt.to_period("M")
+        month = (dates.dt.year.to_numpy(dtype=float) - 1970) * 12 + dates.dt.month.to_numpy(dtype=float) - 1
+        self._row_month = np.where(np.isnan(month), NAT_MONTH, np.nan_to_num(month)).astype(np.int64)
+
+        self._labels = {}
+        dims = [self._row_month]
+        for col in DIMENSIONS:
+            codes, labels = _codes(df[col]) if col in df.columns else (np.full(self.n_rows, -1, dtype=np.int64), [])
+            self._labels[col] = labels
+            dims.append(codes)
+        grave = df["is_risque_grave"].to_numpy(dtype=bool) if "is_risque_grave" in df.columns else np.zeros(self.n_rows, dtype=bool)
+        dims.append(grave.astype(np.int64))
+
+        # Cellules = combinaisons présentes des dimensions ; chaque ligne pointe sur sa cellule
+        cells, self._row_cell = np.unique(np.column_stack(dims), axis=0, return_inverse=True)
+        self._row_cell = self._row_cell.ravel()
+        self.n_cells = len(cells)
+        self.cell_month = cells[:, 0]
+        self._cell_codes = dict(zip(DIMENSIONS, (cells[:, i + 1] for i in range(len(DIMENSIONS)))))
+        self.cell_grave = cells[:, -1].astype(bool)
+        self.rappels = np.bincount(self._row_cell, minlength=self.n_cells)
+        self.score = self.rappels * (1 + self.cell_grave) # Score de gravité : 2 si grave, 1 sinon
+
+        # Ventilation valeur de motif -> tokens (CSR)
+        flat_values, flat_tokens, self._motif_tokens = [], [], []
+        token_ids = {}
+        for value_code, value in enumerate(self._labels["motif_du_rappel"]):
+            for token in indexes.split_tokens(value):
+                if token not in token_ids:
+                    token_ids[token] = len(self._motif_tokens)
+                    self._motif_tokens.append(token)
+                flat_values.append(value_code)
+                flat_tokens.append(token_ids[token])
+        self._motif_map = (np.array(flat_values, dtype=np.int64), np.array(flat_tokens, dtype=np.int64))
+        self._motif_token_ids = token_ids
+
+        # Le jeu trié par date décroissante permet de borner le mois partiel d'une fenêtre de période par recherche dichotomique
+        self._sorted = bool(np.all(np.diff(self._row_month) <= 0))
+
+    def covers(self, criteria):
+        """Vrai si tous les critères actifs {colonne: valeur} portent sur des dimensions du cube."""
+        return all(value == filters.TOUTES or col in DIMENSIONS for col, value in criteria.items())
+
+    def _cell_totals(self, selection=None):
+        """Rappels et scores par cellule pour une sélection de période (None = tout le jeu)."""
+        if selection is None or (selection.mask is None and selection.stop == self.n_rows):
+            return self.rappels, self.score
+        if selection.mask is not None or not self._sorted:
+            cells = self._row_cell[selection.positions]
+        else:
+            # Fenêtre = préfixe : les mois entièrement couverts viennent du cube, seul le mois le plus ancien
+            # (partiellement couvert) est ré-agrégé à partir de ses lignes
+            stop = selection.stop
+            if stop == 0:
+                return np.zeros(self.n_cells, dtype=np.int64), np.zeros(self.n_cells, dtype=np.int64)
+            oldest = self._row_month[stop - 1]
+            start = int(np.searchsorted(-self._row_month, -oldest, side="left"))
+            full = self.cell_month > oldest
+            rappels = np.where(full, self.rappels, 0) + np.bincount(self._row_cell[start:stop], minlength=self.n_cells)
+            return rappels, rappels * (1 + self.cell_grave)
+        rappels = np.bincount(cells, minlength=self.n_cells)
+        return rappels, rappels * (1 + self.cell_grave)
+
+    def _cell_mask(self, criteria=None):
+        keep = np.ones(self.n_cells, dtype=bool)
+        for col, value in (criteria or {}).items():
+            if value == filters.TOUTES:
+                continue
+            if col == "motif_du_rappel":
+                token = self._motif_token_ids.get(value)
+                has_token = np.zeros(len(self._labels[col]) + 1, dtype=bool)
+                if token is not None:
+                    flat_values, flat_tokens = self._motif_map
+                    has_token[flat_values[flat_tokens == token] + 1] = True
+                keep &= has_token[self._cell_codes[col] + 1]
+            else:
+                labels = self._labels[col]
+                code = labels.index(value) if value in labels else -2
+                keep &= self._cell_codes[col] == code
+        return keep
+
+    def monthly(self, selection=None, criteria=None):
+        """Rappels et score total par mois (index Mois en périodes mensuelles), mois sans rappel exclus."""
+        rappels, score = self._cell_totals(selection)
+        keep = self._cell_mask(criteria) & (rappels > 0) & (self.cell_month != NAT_MONTH)
+        months, inverse = np.unique(self.cell_month[keep], return_inverse=True)
+        index = pd.PeriodIndex.from_ordinals(months, freq="M", name="Mois")
+        return pd.DataFrame({
+            "Rappels": np.bincount(inverse, weights=rappels[keep], minlength=len(months)).astype(np.int64),
+            "Total_Score": np.bincount(inverse, weights=score[keep], minlength=len(months)).astype(np.int64),
+        }, index=index)
+
+    def monthly_imr(self, selection=None, criteria=None):
+        """Série IMR mensuelle (score moyen x 10)."""
+        monthly = self.monthly(selection, criteria)
+        return (monthly["Total_Score"] / monthly["Rappels"] * 10).rename("IMR")
+
+    def totals_by(self, col, selection=None, criteria=None):
+        """Rappels et rappels graves par valeur d'une dimension pour une sélection de période (valeurs sans rappel exclues)."""
+        rappels, _ = self._cell_totals(selection)
+        if criteria:
+            rappels = np.where(self._cell_mask(criteria), rappels, 0)
+        labels = self._labels[col]
+        codes = self._cell_codes[col] + 1 # Le code -1 (manquant) est écarté
+        totals = pd.DataFrame({
+            "Rappels": np.bincount(codes, weights=rappels, minlength=len(labels) + 1)[1:].astype(np.int64),
+            "Graves": np.bincount(codes, weights=rappels * self.cell_grave, minlength=len(labels) + 1)[1:].astype(np.int64),
+        }, index=pd.Index(labels, name=col))
+        return totals[totals["Rappels"] > 0]
+
+    def totals(self, selection=None):
+        """Rappels et rappels graves de toute une sélection de période."""
+        rappels, _ = self._cell_totals(selection)
+        return int(rappels.sum()), int((rappels * self.cell_grave).sum())
+
+    def motif_monthly(self, selection=None, criteria=None):
+        """Nombre de rappels par mois et par motif (token), trié par mois puis motif."""
+        rappels, _ = self._cell_totals(selection)
+        keep = self._cell_mask(criteria) & (rappels > 0) & (self.cell_month != NAT_MONTH)
+        per_value = (pd.DataFrame({"Mois": self.cell_month[keep], "value": self._cell_codes["motif_du_rappel"][keep], "Rappels": rappels[keep]})
+                     .groupby(["Mois", "value"], sort=False)["Rappels"].sum().reset_index())
+        flat_values, flat_tokens = self._motif_map
+        mapping = pd.DataFrame({"value": flat_values, "motif_du_rappel": np.array(self._motif_tokens, dtype=object)[flat_tokens] if len(flat_tokens) else []})
+        per_token = (per_value.merge(mapping, on="value")
+                              .groupby(["Mois", "motif_du_rappel"])["Rappels"].sum().reset_index())
+        per_token["Mois"] = pd.PeriodIndex.from_ordinals(per_token["Mois"].to_numpy(dtype=np.int64), freq="M")
+        return per_token
+
+    def for_filters(self, selection_periode, criteria, selection_filtree):
+        """
+        (cube, sélection, critères) répondant à l'état complet des filtres : ce cube si les filtres actifs en sont
+        des dimensions, sinon un cube construit sur les seules lignes filtrées.
+        """
+        if self.covers(criteria):
+            return self, selection_periode, criteria
+        return MonthlyCube(selection_filtree.frame), None, {}
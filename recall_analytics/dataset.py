@@ -0,0 +1,60 @@
+from io import StringIO
+
+import pandas as pd
+
+from . import classification
+from . import ingestion
+from . import loader
+
+
+# --- CHARGEMENT DU JEU DE DONNÉES (SANS STREAMLIT : DASHBOARD, RAPPORTS PAR LOTS) ---
+class MissingColumnsError(ValueError):
+    """Export CSV sans certaines colonnes requises (liste dans `missing`)."""
+
+    def __init__(self, missing):
+        self.missing = list(missing)
+        super().__init__(f"Colonnes requises manquantes : {', '.join(self.missing)}")
+
+
+def load_csv(file_path):
+    """
+    Charge l'export CSV : cache Arrow s'il est à jour, sinon lecture par blocs (normalisés et compactés au fil
+    de l'eau), classification puis écriture du cache. Retourne (df, rapport_memoire, depuis_cache) ;
+    df.attrs["dataset_version"] identifie le contenu et la configuration du pipeline.
+    Lève MissingColumnsError si des colonnes requises manquent.
+    """
+    signature = loader.pipeline_signature(classification.TAXONOMY)
+    df, manifest = loader.read_frame_cache(file_path, signature)
+    if df is not None:
+        rapport_memoire = pd.read_json(StringIO(manifest["rapport_memoire"]), orient="split")
+        df.attrs["dataset_version"] = f"{manifest['content_hash']}-{signature}"
+        return df, rapport_memoire, True
+    source = manifest
+
+    # Lecture en flux : seul l'en-tête est lu avant de vérifier le schéma, puis l'export est chargé par blocs
+    sep = loader.sniff_separator(file_path)
+    columns = loader.export_columns(file_path, sep)
+    missing_cols = [c for c in loader.REQUIRED_COLUMNS if c not in columns.values()]
+    if missing_cols:
+        raise MissingColumnsError(missing_cols)
+
+    df, octets_bruts = loader.read_export_compact(file_path, sep, columns)
+    df = classification.classify(df)
+    rapport_memoire = loader.memory_report(octets_bruts, df)
+
+    manifest = loader.write_frame_cache(df, file_path, source, extra={"rapport_memoire": rapport_memoire.to_json(orient="split")})
+    # Clé des structures précalculées (index, agrégats) : change dès que le contenu de l'export change
+    content = manifest["content_hash"] if manifest else loader.content_hash(file_path)
+    df.attrs["dataset_version"] = f"{content}-{signature}"
+    return df, rapport_memoire, False
+
+
+def load_store(store_dir):
+    """Charge le jeu fusionné du magasin d'ingestion incrémentale (déjà renommé et normalisé à l'ingestion)."""
+    df = ingestion.load_store(store_dir)
+    df_brut = df
+    df = loader.compact_dataframe(df)
+    df = classification.classify(df)
+    rapport_memoire = loader.memory_report(df_brut, df)
+    df.attrs["dataset_version"] = f"store-{ingestion.store_revision(store_dir)}-{loader.pipeline_signature(classification.TAXONOMY)}"
+    return df, rapport_memoire
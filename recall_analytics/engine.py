@@ -0,0 +1,421 @@
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import cube
+from . import exports
+from . import facets
+from . import filters
+from . import geo
+from . import indexes
+from . import kpis
+from . import search
+from . import zones
+
+
+# --- MOTEUR ANALYTIQUE (SANS STREAMLIT) : FILTRES, KPIs ET AGRÉGATS DES ONGLETS ---
+# Colonnes du registre détaillé et de l'export CSV
+REGISTRE_COLONNES = ["reference_fiche", "date_publication", "date_debut_commercialisation", "categorie_de_produit", "nom_marque_du_produit",
+                     "motif_du_rappel", "risques_encourus", "distributeurs", "zone_geographique_de_vente", "liens_vers_la_fiche_rappel"]
+# Tris du registre (ordres précalculés sur tout le jeu) et taille maximale d'une page
+REGISTRE_TRIS = ["date_publication", "nom_marque_du_produit", "categorie_de_produit"]
+REGISTRE_PAGE_MAX = 500
+TRI_PERTINENCE = "pertinence" # Tri du registre par score BM25, proposé quand une recherche est active
+CRITERE_RECHERCHE = "recherche_plein_texte" # Clé de la recherche dans Selection.criteres (pas une colonne du jeu)
+TOP_MARQUES = 10 # Barres du graphique de part de rappel
+TOP_MOTIFS = 5   # Motifs (et risques) de la matrice de corrélation et de la dérive des causes
+TOP_CATEGORIES = 5
+
+
+@dataclass(frozen=True)
+class FilterState:
+    """État des filtres de la sidebar (valeur filters.TOUTES = pas de filtre ; recherche vide = pas de recherche)."""
+    periode: str
+    cat: str = filters.TOUTES
+    marque: str = filters.TOUTES
+    nature: str = filters.TOUTES
+    distrib: str = filters.TOUTES
+    motif: str = filters.TOUTES
+    zone: str = filters.TOUTES
+    statut: str = filters.TOUTES
+    recherche: str = "" # Recherche plein texte (search.SearchIndex), appliquée avec la catégorie
+
+
+@dataclass(frozen=True)
+class Selection:
+    """
+    Sélections de lignes d'un état des filtres : fenêtre de période, période x catégorie (options de la sidebar)
+    et état complet. Les clés de contexte identifient chaque niveau pour les caches (facettes, KPIs, départements).
+    """
+    state: FilterState
+    now: pd.Timestamp
+    version: str
+    criteres: dict # Critères des filtres, catégorie comprise (dimensions du cube et masques)
+    periode: filters.RowSelection
+    coherence: filters.RowSelection
+    filtree: filters.RowSelection
+
+    @property
+    def contexte_periode(self):
+        # La période et le nombre de lignes qu'elle couvre (change si de nouvelles fiches entrent)
+        return (self.version, self.state.periode, len(self.periode))
+
+    @property
+    def contexte_coherence(self):
+        return self.contexte_periode + (self.state.cat, self.state.recherche)
+
+    @property
+    def key(self):
+        s = self.state
+        return self.contexte_coherence + (s.marque, s.nature, s.distrib, s.motif, s.zone, s.statut)
+
+    @property
+    def key_hors_marque(self):
+        s = self.state
+        return self.contexte_coherence + (s.nature, s.distrib, s.motif, s.zone, s.statut)
+
+    @property
+    def frame(self):
+        return self.filtree.frame
+
+    def __len__(self):
+        return len(self.filtree)
+
+
+class AnalyticsEngine:
+    """
+    Point d'entrée du moteur pour une version du jeu de données (compacté, partagé, lecture seule) :
+    index, ponts, cube mensuel et références marché sont construits à la première utilisation puis réutilisés.
+    Les méthodes de calcul prennent une Selection et renvoient des DataFrames ou un kpis.KpiBundle.
+    """
+
+    def __init__(self, df, geojson_variants=None):
+        self.df = df
+        self.version = df.attrs.get("dataset_version", "")
+        self.col_nature = "sous_categorie_produit" if "sous_categorie_produit" in df.columns else "denomination_vente"
+        # Filtres de la sidebar dont les options dépendent du contexte période x catégorie
+        self.filter_columns = ["nom_marque_du_produit", self.col_nature, "distributeurs", "motif_du_rappel", "zone_geographique_de_vente", "etat_fiche"]
+        self._geojson_variants = geojson_variants
+        self._built = {}
+        self._baselines = (None, None)
+        self._lock = threading.RLock()
+
+    def _get(self, name, build):
+        with self._lock:
+            if name not in self._built:
+                self._built[name] = build()
+            return self._built[name]
+
+    # --- STRUCTURES PRÉCALCULÉES (UNE FOIS PAR VERSION DU JEU) ---
+    @property
+    def token_indexes(self):
+        """Index bitmap des colonnes multi-valeurs."""
+        return self._get("token_indexes", lambda: indexes.build_token_indexes(self.df))
+
+    @property
+    def token_bridges(self):
+        """Ponts ligne -> token (dictionnaires entiers) des colonnes multi-valeurs : vues « explosées » sans découpage de chaînes."""
+        return self._get("token_bridges", lambda: indexes.build_token_bridges(self.df))
+
+    @property
+    def filter_engine(self):
+        return self._get("filter_engine", lambda: filters.FilterEngine(self.df, self.token_indexes))
+
+    @property
+    def facet_engine(self):
+        """Facettes de la sidebar (options + effectifs), mémorisées par contexte période x catégorie."""
+        return self._get("facet_engine", lambda: facets.FacetEngine(self.df))
+
+    @property
+    def cube(self):
+        """Cube mensuel pré-agrégé (mois x catégorie x marque x gravité x motif)."""
+        return self._get("cube", lambda: cube.MonthlyCube(self.df))
+
+    @property
+    def departement_bridge(self):
+        """Pont rappel x département : chaque zone de vente distincte est résolue une seule fois."""
+        def build():
+            if self._geojson_variants:
+                resolver = zones.ZoneResolver.from_geojson(self._geojson_variants[geo.DEFAULT_RESOLUTION])
+            else:
+                resolver = zones.ZoneResolver.from_regions()
+            return zones.DepartementBridge(self.df, resolver)
+        return self._get("departement_bridge", build)
+
+    @property
+    def motif_court(self):
+        """Libellé court (avant le premier séparateur) de chaque motif distinct."""
+        return self._get("motif_court", lambda: pd.Series(self.token_bridges["motif_du_rappel"].values, dtype=object)
+                         .str.split(r'[;.,]').str[0].str.strip().to_numpy(dtype=object))
+
+    @property
+    def search_index(self):
+        """Index plein texte BM25 (motif, risques, dénomination, marque), construit à la première recherche."""
+        return self._get("search_index", lambda: search.SearchIndex(self.df))
+
+    def market_baselines(self, now=None):
+        """
+        Références marché (IMR, gravité moyenne, effectifs, coût implicite) pour chaque période x catégorie.
+        Reconstruites quand une fenêtre glissante gagne ou perd des fiches.
+        """
+        now = now if now is not None else pd.Timestamp.now(tz='UTC')
+        selections = {p: self.filter_engine.period(p, now) for p in filters.PERIODE_OPTIONS}
+        fenetres = tuple(len(s) for s in selections.values())
+        with self._lock:
+            if self._baselines[0] != fenetres:
+                self._baselines = (fenetres, kpis.market_baselines(self.cube, selections))
+            return self._baselines[1]
+
+    # --- SÉLECTIONS ---
+    def period(self, periode, now=None):
+        return self.filter_engine.period(periode, now)
+
+    def select(self, state, now=None, base=None):
+        """
+        Sélections d'un état des filtres. `base` (Selection d'un état partiel déjà calculé, ex. pour la sidebar)
+        évite de recalculer la fenêtre de période et le filtre catégorie quand ils sont inchangés.
+        """
+        now = now if now is not None else pd.Timestamp.now(tz='UTC')
+        if base is not None and base.state.periode == state.periode and base.now == now:
+            selection_periode = base.periode
+            same_cat = base.state.cat == state.cat and base.state.recherche == state.recherche
+        else:
+            selection_periode = self.filter_engine.period(state.periode, now)
+            same_cat = False
+        if same_cat:
+            selection_coherence = base.coherence
+        else:
+            selection_coherence = selection_periode.refine(self.filter_engine.mask("categorie_de_produit", state.cat))
+            if state.recherche:
+                # La recherche restreint le contexte comme la catégorie : les options de la sidebar la suivent
+                selection_coherence = selection_coherence.refine(self.search_index.mask(state.recherche))
+
+        criteres = {
+            "nom_marque_du_produit": state.marque,
+            self.col_nature: state.nature,
+            "distributeurs": state.distrib,
+            "motif_du_rappel": state.motif,
+            "zone_geographique_de_vente": state.zone,
+            "etat_fiche": state.statut,
+        }
+        # Un seul masque combiné (égalité sur codes category + intersection des bitmaps multi-valeurs)
+        selection_filtree = selection_coherence.refine(self.filter_engine.combined_mask(criteres))
+        criteres["categorie_de_produit"] = state.cat
+        if state.recherche:
+            # Critère hors dimensions du cube : les agrégats sont alors recalculés sur les lignes filtrées
+            criteres[CRITERE_RECHERCHE] = state.recherche
+        return Selection(state, now, self.version, criteres, selection_periode, selection_coherence, selection_filtree)
+
+    def facets(self, selection, columns, context_key):
+        return self.facet_engine.facets(selection, columns, context_key)
+
+    # --- KPIs ---
+    def kpis(self, selection):
+        """
+        Tous les KPIs d'un état des filtres. Les séries mensuelles (volatilités) sont lues dans le cube,
+        les références marché (IPC, RRO) dans la table des baselines.
+        """
+        state = selection.state
+        baselines = self.market_baselines(selection.now)
+        cube_filtre, selection_cube, criteres_cube = self.cube.for_filters(selection.periode, selection.criteres, selection.filtree)
+        imr_mensuel_marque = self.cube.monthly_imr(selection.periode, {"nom_marque_du_produit": state.marque}) if state.marque != filters.TOUTES else None
+        bridges = self.token_bridges
+        return kpis.compute_kpis(selection.frame,
+                                 kpis.lookup_baseline(baselines, state.periode),
+                                 kpis.lookup_baseline(baselines, state.periode, state.cat),
+                                 marque=state.marque, cat=state.cat,
+                                 rappels_mensuels=cube_filtre.monthly(selection_cube, criteres_cube)["Rappels"],
+                                 imr_mensuel_marque=imr_mensuel_marque,
+                                 token_counts={col: bridges[col].counts(selection.filtree) for col in ("risques_encourus", "distributeurs") if col in bridges})
+
+    def league_table(self, selection):
+        """
+        Classement de toutes les marques pour l'état des filtres hors marque (kpis.league_table).
+        Effectifs par marque lus dans le cube en une passe ; recalculés sur les lignes si un filtre actif n'est pas une dimension du cube.
+        """
+        criteres = dict(selection.criteres, nom_marque_du_produit=filters.TOUTES)
+        if self.cube.covers(criteres):
+            totals = self.cube.totals_by("nom_marque_du_produit", selection.periode, criteres)
+        else:
+            selection_classement = selection.coherence.refine(self.filter_engine.combined_mask(criteres))
+            totals = kpis.totals_by_rows(selection_classement.frame, "nom_marque_du_produit")
+        return kpis.league_table(totals, kpis.lookup_baseline(self.market_baselines(selection.now), selection.state.periode))
+
+    # --- ONGLET 1 : FABRICANTS & MARQUES ---
+    def share_of_recalls(self, selection, top=TOP_MARQUES):
+        """Part (%) des rappels filtrés par marque, `top` premières (colonnes Marque, Part_de_Rappel_pourcent)."""
+        # value_counts sur une colonne category inclut les modalités absentes du filtre : on les écarte
+        parts = selection.frame["nom_marque_du_produit"].value_counts(normalize=True).loc[lambda s: s > 0].mul(100)
+        return parts.reset_index().rename(columns={
+            "nom_marque_du_produit": "Marque",
+            "proportion": "Part_de_Rappel_pourcent"
+        }).head(top)
+
+    def imr_trend(self, selection):
+        """
+        IMR mensuel de la marque sélectionnée et du marché sur la période (colonnes Mois, IMR_<Marque>, IMR_Marché),
+        lus dans le cube (mois partiel de début de fenêtre ré-agrégé). Vide si aucun mois.
+        """
+        marque = selection.state.marque
+        df_imr_marque = self.cube.monthly_imr(selection.periode, {"nom_marque_du_produit": marque}).reset_index()
+        df_imr_marche = self.cube.monthly_imr(selection.periode).reset_index()
+        if df_imr_marque.empty and df_imr_marche.empty:
+            return pd.DataFrame(columns=["Mois", f"IMR_{marque.title()}", "IMR_Marché"])
+        df_imr_marque["Mois"] = df_imr_marque["Mois"].dt.to_timestamp()
+        df_imr_marche["Mois"] = df_imr_marche["Mois"].dt.to_timestamp()
+        df_imr_marche = df_imr_marche.rename(columns={'IMR': 'IMR_Marché'})
+        return pd.merge(df_imr_marque.rename(columns={'IMR': f'IMR_{marque.title()}'}), df_imr_marche, on='Mois', how='outer').fillna(0)
+
+    def motif_risk_matrix(self, selection, top=TOP_MOTIFS):
+        """
+        Co-occurrences (Motif_court, risques_encourus, Nombre) des `top` motifs courts et risques les plus associés.
+        Risques « explosés » par jointure de la sélection sur le pont ligne -> token ; motif court calculé par valeur distincte.
+        """
+        bridges = self.token_bridges
+        df_exploded = bridges["risques_encourus"].explode(selection.filtree, "risques_encourus")
+        motif_codes = bridges["motif_du_rappel"].value_codes(df_exploded["position"].to_numpy())
+        df_exploded["Motif_court"] = np.where(motif_codes >= 0, self.motif_court[motif_codes], None)
+        df_exploded["risques_encourus"] = df_exploded["risques_encourus"].astype(object)
+
+        cooccurrence = df_exploded.groupby(['Motif_court', 'risques_encourus']).size().reset_index(name='Nombre')
+        cooccurrence = cooccurrence[cooccurrence['Nombre'] > 0]
+        top_motifs_list = cooccurrence['Motif_court'].value_counts().head(top).index
+        top_risques_list = cooccurrence['risques_encourus'].value_counts().head(top).index
+        return cooccurrence[
+            cooccurrence['Motif_court'].isin(top_motifs_list) &
+            cooccurrence['risques_encourus'].isin(top_risques_list)
+        ]
+
+    # --- ONGLET 2 : DISTRIBUTEURS & RETAILERS ---
+    def distributor_risk(self, selection):
+        """
+        Par distributeur : délai moyen avant rappel (jours), nombre de rappels, gravité moyenne et coût d'exposition
+        simulé (k€). Vue (rappel, distributeur) obtenue par jointure de la sélection sur le pont ligne -> token.
+        """
+        df = self.df
+        df_reponse = self.token_bridges["distributeurs"].explode(selection.filtree, "distributeurs")
+        positions = df_reponse["position"].to_numpy()
+        df_reponse["Délai_Jours"] = (df["date_publication"].take(positions) - df["date_debut_commercialisation"].take(positions)).dt.days.to_numpy()
+        df_reponse = df_reponse[df_reponse["Délai_Jours"] >= 0]
+        df_reponse = df_reponse.assign(distributeurs=df_reponse["distributeurs"].astype(object))
+
+        if 'risques_encourus' in df.columns:
+            df_reponse['Score_Gravite'] = df["score_gravite"].to_numpy()[df_reponse["position"].to_numpy()]
+        else:
+            df_reponse['Score_Gravite'] = 1
+
+        avg_distrib = df_reponse.groupby("distributeurs").agg(
+            Délai_Moyen_Jours=('Délai_Jours', 'mean'),
+            Nb_Rappels=('Délai_Jours', 'count'),
+            Gravite_Moyenne=('Score_Gravite', 'mean')
+        ).reset_index()
+        avg_distrib['Coût_Risque_Simulé'] = avg_distrib['Délai_Moyen_Jours'] * avg_distrib['Nb_Rappels'] * avg_distrib['Gravite_Moyenne'] * kpis.COUT_LOGISTIQUE_JOUR_SUPP / 1000
+        return avg_distrib
+
+    def departement_risk(self, selection):
+        """
+        Nombre de rappels par département (zone_clean = code, Département, Nombre_Rappels) avec son niveau
+        et sa couleur de traffic light : simple comptage sur le pont rappel x département, mémorisé par état des filtres.
+        """
+        bridge = self.departement_bridge
+        geo_counts = bridge.counts(selection.filtree, selection.key).rename_axis('zone_clean').reset_index()
+        geo_counts['Département'] = [bridge.resolver.names.get(code) or code for code in geo_counts['zone_clean']]
+        geo_counts['Niveau_Risque'] = geo_counts['Nombre_Rappels'].map(kpis.traffic_light)
+        geo_counts['Couleur_Hex'] = geo_counts['Nombre_Rappels'].map(kpis.traffic_light_color)
+        return geo_counts
+
+    def departement_unresolved(self, selection):
+        """Zones de vente non reconnues (colonnes zone, Nombre_Rappels) : rappels absents de la carte des départements."""
+        return self.departement_bridge.unresolved_counts(selection.filtree).reset_index()
+
+    # --- ONGLET 3 : RISQUE & CONFORMITÉ ---
+    def motif_drift(self, selection, top=TOP_MOTIFS):
+        """Rang mensuel (1 = plus fréquent) des `top` principaux motifs, lu dans le cube (colonnes Mois, motif_du_rappel, Rappels, Rang)."""
+        cube_filtre, selection_cube, criteres_cube = self.cube.for_filters(selection.periode, selection.criteres, selection.filtree)
+        motif_counts = cube_filtre.motif_monthly(selection_cube, criteres_cube)
+        if motif_counts.empty:
+            return motif_counts
+        motif_counts['Rang'] = motif_counts.groupby('Mois')['Rappels'].rank(method='first', ascending=False)
+        top_motifs_global = motif_counts['motif_du_rappel'].value_counts().head(top).index
+        df_rank = motif_counts[motif_counts['motif_du_rappel'].isin(top_motifs_global)].copy()
+        df_rank['Mois'] = df_rank['Mois'].dt.to_timestamp()
+        return df_rank
+
+    def risk_profile(self, selection, top=TOP_CATEGORIES):
+        """RMPC (gravité moyenne x 10) et fréquence des `top` catégories les plus rappelées."""
+        cat_scores = selection.frame.groupby('categorie_de_produit', observed=True).agg(
+            RMPC=('score_gravite', 'mean'),
+            Frequence=('categorie_de_produit', 'count')
+        ).reset_index()
+        cat_scores['RMPC'] = cat_scores['RMPC'] * 10
+        return cat_scores.sort_values(by='Frequence', ascending=False).head(top)
+
+    # --- REGISTRE ET EXPORT ---
+    def registry_columns(self):
+        return [c for c in REGISTRE_COLONNES if c in self.df.columns]
+
+    def registry_rank(self, column, descending=False):
+        """
+        Rang de chaque ligne du jeu dans l'ordre de tri du registre sur `column` (valeurs manquantes en dernier,
+        ex aequo dans l'ordre du jeu, c.-à-d. du plus récent au plus ancien). Calculé une fois par (colonne, sens).
+        """
+        def build():
+            codes, uniques = pd.factorize(self.df[column], sort=True)
+            n_values = len(uniques)
+            keys = np.where(codes < 0, n_values, (n_values - 1 - codes) if descending else codes)
+            rank = np.empty(len(keys), dtype=np.int32)
+            rank[np.argsort(keys, kind="stable")] = np.arange(len(keys), dtype=np.int32)
+            return rank
+        return self._get(("registry_rank", column, descending), build)
+
+    def registry_page(self, selection, sort="date_publication", descending=True, page=1, page_size=50, columns=None):
+        """
+        Page `page` (à partir de 1) du registre filtré, triée sur `sort` (REGISTRE_TRIS, ou TRI_PERTINENCE si une
+        recherche est active : colonne `pertinence` ajoutée) et projetée sur `columns` (colonnes du registre par
+        défaut) : seules les lignes de la page sont matérialisées.
+        Retourne (page, nombre de lignes de la sélection).
+        """
+        page_size = max(1, min(page_size, REGISTRE_PAGE_MAX))
+        positions = selection.filtree.positions
+        start = (page - 1) * page_size
+        stop = min(start + page_size, len(positions))
+
+        page_scores = None
+        if start >= stop:
+            page_positions = positions[:0]
+        elif sort == TRI_PERTINENCE:
+            scores = self.search_index.scores(selection.state.recherche, positions)
+            keys = -scores if descending else scores
+            # Sélection partielle : seules les lignes jusqu'au score de la dernière ligne de la page (ex aequo compris)
+            # sont triées, ex aequo dans l'ordre du jeu
+            candidates = np.flatnonzero(keys <= np.partition(keys, stop - 1)[stop - 1])
+            order = candidates[np.lexsort((candidates, keys[candidates]))][start:stop]
+            page_positions, page_scores = positions[order], scores[order]
+        elif sort == "date_publication" and descending and self.filter_engine.dates_sorted:
+            # Jeu trié par date de publication décroissante (loader) : l'ordre des positions est déjà celui du tri
+            page_positions = positions[start:stop]
+        else:
+            # Sélection partielle des rangs de la page (linéaire), seule la page est triée
+            rank = self.registry_rank(sort, descending)[positions]
+            window = np.argpartition(rank, [start, stop - 1])[start:stop]
+            page_positions = positions[window[np.argsort(rank[window])]]
+
+        columns = [c for c in (columns or REGISTRE_COLONNES) if c in self.registry_columns()]
+        frame = self.df.iloc[page_positions, [self.df.columns.get_loc(c) for c in columns]]
+        if page_scores is not None:
+            frame.insert(0, TRI_PERTINENCE, page_scores.round(2))
+        return frame.set_axis(pd.RangeIndex(start, start + len(frame))), len(positions)
+
+    @property
+    def export_cache(self):
+        return self._get("export_cache", exports.ExportCache)
+
+    def export(self, selection, fmt="csv"):
+        """
+        Fichier d'export (bytes) du registre filtré au format `fmt` (exports.EXPORT_FORMATS), écrit par blocs
+        depuis les positions de la sélection et mémorisé par (format, clé de la sélection).
+        """
+        return self.export_cache.get((fmt, selection.key), lambda: exports.write_export(
+            self.df, selection.filtree.positions, self.registry_columns(), fmt))
@@ -0,0 +1,145 @@
+import importlib.util
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pa_parquet
+except ImportError: # pyarrow absent : exports CSV (et Excel si un moteur est installé) seulement
+    pa = None
+    pa_parquet = None
+
+
+# --- EXPORT DU REGISTRE FILTRÉ (GÉNÉRÉ À LA DEMANDE, ÉCRIT PAR BLOCS) ---
+EXPORT_CHUNK_ROWS = 50_000         # Lignes matérialisées puis écrites à la fois
+EXPORT_SPOOL_BYTES = 32 * 1024 ** 2 # Au-delà, le fichier en cours d'écriture bascule de la mémoire vers le disque
+EXPORT_CACHE_BYTES = 256 * 1024 ** 2 # Taille cumulée maximale des fichiers d'export conservés
+EXCEL_MAX_ROWS = 1_048_575         # Lignes de données d'une feuille Excel (hors en-tête)
+
+# Premier moteur Excel installé (xlsxwriter, sinon openpyxl) ; None : pas d'export xlsx
+EXCEL_ENGINE = next((name for name in ("xlsxwriter", "openpyxl") if importlib.util.find_spec(name)), None)
+
+
+def iter_chunks(df, positions, columns, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Blocs successifs des lignes `positions` de df, limités à `columns` : la sélection n'est jamais copiée en entier."""
+    col_idx = [df.columns.get_loc(c) for c in columns]
+    for start in range(0, len(positions), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows], col_idx]
+
+
+def _write_csv(chunks, template, sink):
+    sink.write(template.to_csv(index=False).encode("utf-8"))
+    for chunk in chunks:
+        sink.write(chunk.to_csv(index=False, header=False).encode("utf-8"))
+
+
+def _arrow_schema(template):
+    return pa.Schema.from_pandas(template, preserve_index=False)
+
+
+def _write_parquet(chunks, template, sink):
+    schema = _arrow_schema(template)
+    with pa_parquet.ParquetWriter(sink, schema) as writer:
+        writer.write_table(pa.Table.from_pandas(template, schema=schema, preserve_index=False))
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_arrow(chunks, template, sink):
+    schema = _arrow_schema(template)
+    with pa.ipc.new_file(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _excel_frame(frame):
+    # Excel ne stocke pas de fuseau horaire : dates UTC écrites sans fuseau
+    dates = {c: frame[c].dt.tz_localize(None) for c in frame.columns if isinstance(frame[c].dtype, pd.DatetimeTZDtype)}
+    return frame.assign(**dates)
+
+
+def _write_xlsx(chunks, template, sink):
+    with pd.ExcelWriter(sink, engine=EXCEL_ENGINE) as writer:
+        _excel_frame(template).to_excel(writer, sheet_name="Rappels", index=False)
+        row = 1
+        for chunk in chunks:
+            _excel_frame(chunk).to_excel(writer, sheet_name="Rappels", index=False, header=False, startrow=row)
+            row += len(chunk)
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    label: str
+    extension: str
+    mime: str
+    writer: object
+    available: bool = True
+    max_rows: int = None # Limite de lignes du format (None : illimité)
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("CSV", "csv", "text/csv", _write_csv),
+    "xlsx": ExportFormat("Excel", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _write_xlsx,
+                         available=EXCEL_ENGINE is not None, max_rows=EXCEL_MAX_ROWS),
+    "parquet": ExportFormat("Parquet", "parquet", "application/vnd.apache.parquet", _write_parquet, available=pa is not None),
+    "arrow": ExportFormat("Arrow", "arrow", "application/vnd.apache.arrow.file", _write_arrow, available=pa is not None),
+}
+
+
+def available_formats(n_rows=0):
+    """Formats utilisables ici (dépendances installées) pour une sélection de `n_rows` lignes."""
+    return [name for name, fmt in EXPORT_FORMATS.items() if fmt.available and (fmt.max_rows is None or n_rows <= fmt.max_rows)]
+
+
+def write_export(df, positions, columns, fmt="csv", chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Fichier d'export (bytes) des lignes `positions` de df au format `fmt` (clé de EXPORT_FORMATS). Les lignes sont
+    matérialisées et écrites par blocs dans un fichier temporaire, gardé en mémoire tant qu'il reste petit.
+    """
+    export_format = EXPORT_FORMATS[fmt]
+    if not export_format.available:
+        raise ValueError(f"Format d'export indisponible (dépendance manquante) : {fmt}")
+    if export_format.max_rows is not None and len(positions) > export_format.max_rows:
+        raise ValueError(f"Trop de lignes pour le format {export_format.label} : {len(positions)} > {export_format.max_rows}")
+
+    template = df[columns].iloc[:0]
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as sink:
+        export_format.writer(iter_chunks(df, positions, columns, chunk_rows), template, sink)
+        sink.seek(0)
+        return sink.read()
+
+
+class ExportCache:
+    """
+    Fichiers d'export par (format, clé de la sélection filtrée), en LRU borné par la taille cumulée :
+    retélécharger la même sélection dans le même format ne régénère pas le fichier.
+    """
+
+    def __init__(self, max_bytes=EXPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = build()
+        with self._lock:
+            if key not in self._cache and len(data) <= self.max_bytes:
+                self._cache[key] = data
+                self.size += len(data)
+                while self.size > self.max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+    def __len__(self):
+        return len(self._cache)
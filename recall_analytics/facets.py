@@ -0,0 +1,133 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import indexes
+
+
+# --- FACETTES DES FILTRES DE LA SIDEBAR (OPTIONS + NOMBRE DE RAPPELS) ---
+FACET_CACHE_SIZE = 32 # Contextes (période, catégorie...) mémorisés
+
+
+class Facet:
+    """Options d'un filtre présentes dans une sélection, triées alphabétiquement, avec leur nombre de rappels."""
+
+    def __init__(self, labels, counts):
+        self.labels = list(labels)
+        self.counts = dict(zip(self.labels, (int(c) for c in counts)))
+        self._index = pd.Index(self.labels, dtype=object)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.counts
+
+    def count(self, label):
+        return self.counts.get(label, 0)
+
+    def top(self, limit):
+        """Les `limit` options les plus fréquentes (ordre alphabétique conservé pour l'affichage)."""
+        if len(self.labels) <= limit:
+            return list(self.labels)
+        keep = set(sorted(self.labels, key=lambda l: -self.counts[l])[:limit])
+        return [l for l in self.labels if l in keep]
+
+    def search(self, query, limit=200):
+        """
+        Recherche (typeahead) sur la liste complète : d'abord les options commençant par la saisie
+        (recherche dichotomique dans la liste triée), puis celles qui la contiennent, par fréquence décroissante.
+        """
+        query = query.strip().lower()
+        if not query:
+            return self.top(limit)
+        start = self._index.searchsorted(query, side="left")
+        stop = self._index.searchsorted(query + "\uffff", side="left")
+        prefix = self.labels[start:stop]
+        contains = [l for l in self._index[self._index.str.contains(query, regex=False)] if not l.startswith(query)]
+        prefix.sort(key=lambda l: -self.counts[l])
+        contains.sort(key=lambda l: -self.counts[l])
+        return (prefix + contains)[:limit]
+
+
+class FacetEngine:
+    """
+    Calcule en un passage vectorisé par colonne (np.bincount sur les codes précalculés) les options
+    et effectifs de tous les filtres pour une sélection de lignes, et mémorise le résultat par contexte.
+    Les colonnes multi-valeurs sont comptées par token : effectifs des valeurs distinctes redistribués
+    sur leurs tokens, sans exploser les lignes.
+    """
+
+    def __init__(self, df, multi_valued_columns=indexes.MULTI_VALUED_COLUMNS, cache_size=FACET_CACHE_SIZE):
+        self.df = df
+        self.multi_valued_columns = set(multi_valued_columns)
+        self.cache_size = cache_size
+        self._columns = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _column(self, col):
+        """Codes (int) par ligne et libellés triés pour une colonne, calculés une seule fois."""
+        if col in self._columns:
+            return self._columns[col]
+        s = self.df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes, values = s.cat.codes.to_numpy(), [str(v) for v in s.cat.categories]
+        else:
+            codes, uniques = pd.factorize(s)
+            values = [str(v) for v in uniques]
+
+        if col in self.multi_valued_columns:
+            # CSR valeur distincte -> tokens : les tokens deviennent les libellés de la facette
+            token_ids, labels, flat_values, flat_tokens = {}, [], [], []
+            for value_code, value in enumerate(values):
+                for token in indexes.split_tokens(value):
+                    if token not in token_ids:
+                        token_ids[token] = len(labels)
+                        labels.append(token)
+                    flat_values.append(value_code)
+                    flat_tokens.append(token_ids[token])
+            mapping = (np.array(flat_values, dtype=np.int64), np.array(flat_tokens, dtype=np.int64))
+        else:
+            labels = [v.strip() for v in values]
+            mapping = None
+
+        order = np.array(sorted(range(len(labels)), key=labels.__getitem__), dtype=np.int64)
+        entry = (np.asarray(codes, dtype=np.int32), len(values), labels, order, mapping)
+        self._columns[col] = entry
+        return entry
+
+    def _facet(self, col, selection):
+        codes, n_values, labels, order, mapping = self._column(col)
+        if selection.mask is None:
+            selected = codes[:selection.stop]
+        else:
+            selected = codes[selection.positions]
+        value_counts = np.bincount(selected + 1, minlength=n_values + 1)[1:] # Le code -1 (manquant) est écarté
+        if mapping is not None:
+            flat_values, flat_tokens = mapping
+            counts = np.bincount(flat_tokens, weights=value_counts[flat_values], minlength=len(labels))
+        else:
+            counts = value_counts
+        counts = counts[order]
+        keep = counts > 0
+        sorted_labels = [labels[i] for i in order[keep]]
+        return Facet(sorted_labels, counts[keep])
+
+    def facets(self, selection, columns, context_key):
+        """Facettes des `columns` pour la sélection ; `context_key` identifie la sélection (période, catégorie...)."""
+        key = (context_key, tuple(columns))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        result = {col: self._facet(col, selection) if col in self.df.columns else Facet([], []) for col in columns}
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io
+import plotly.tools
+
+from . import kpis
+
+
+# --- CACHE DES FIGURES PLOTLY SÉRIALISÉES (EMPREINTE DES DONNÉES D'ENTRÉE) ---
+FIGURE_CACHE_BYTES = 64 * 1024 ** 2 # Taille cumulée maximale des figures sérialisées conservées
+
+
+def fingerprint(frame):
+    """Empreinte du contenu d'un DataFrame (valeurs, index, colonnes et types), indépendante de son identité."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((list(frame.columns), [str(t) for t in frame.dtypes], frame.index.names)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class SerializedFigure(go.Figure):
+    """
+    Figure validée une seule fois, figée sur sa spécification JSON : to_dict() renvoie le dictionnaire relu du JSON
+    sans copie ni revalidation. st.plotly_chart (comme plotly.io.to_json) passe par to_dict() pour toute go.Figure :
+    l'affichage d'une figure du cache se réduit à l'encodage orjson de ce dictionnaire. À ne pas modifier.
+    """
+
+    def __init__(self, spec):
+        self._spec_dict = json.loads(spec)
+        super().__init__(json.loads(spec))
+
+    def to_dict(self):
+        return self._spec_dict
+
+
+class FigureCache:
+    """
+    Figures Plotly figées (SerializedFigure) par (nom du graphique, empreinte de l'agrégat, paramètres), en LRU
+    borné par la taille cumulée du JSON. Une figure dont l'agrégat n'a pas changé n'est ni reconstruite (px, mise
+    en forme) ni resérialisée ou revalidée par st.plotly_chart (étapes figure_* du benchmark).
+    """
+
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, frame, params, build):
+        """
+        Figure (SerializedFigure) du graphique `name` pour l'agrégat `frame` ; `params` (hachable) regroupe les autres
+        entrées de la figure (libellés, seuils, version des géométries). `build()` construit la figure en cas d'absence.
+        """
+        key = (name, fingerprint(frame), params)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key][0]
+
+        spec = build().to_json()
+        figure = SerializedFigure(spec)
+        with self._lock:
+            self.misses += 1
+            if key not in self._cache and len(spec) <= self.max_bytes:
+                self._cache[key] = (figure, len(spec))
+                self.size += len(spec)
+                while self.size > self.max_bytes:
+                    _, (_, evicted) = self._cache.popitem(last=False)
+                    self.size -= evicted
+        return figure
+
+    def __len__(self):
+        return len(self._cache)
+
+
+def chart_spec(figure):
+    """
+    JSON envoyé au navigateur par st.plotly_chart pour une figure (dict ou go.Figure) : validation d'un dict, copie
+    d'une go.Figure, puis sérialisation, comme le fait Streamlit. Une SerializedFigure n'est ni validée ni copiée.
+    """
+    return plotly.io.to_json(plotly.tools.return_figure_from_figure_or_data(figure, validate_figure=True), validate=False)
+
+
+# --- FIGURES DES ONGLETS DU DASHBOARD (CONSTRUITES EN CAS D'ABSENCE DU CACHE) ---
+def figure_part_marques(top_marques):
+    """Barres horizontales : part des rappels des 10 premières marques."""
+    fig_sor = px.bar(top_marques, y="Marque", x="Part_de_Rappel_pourcent", orientation='h', title="Top 10 : Contribution (%) aux rappels du marché",
+                     color='Part_de_Rappel_pourcent', color_continuous_scale=px.colors.sequential.Plotly3)
+    fig_sor.update_layout(yaxis={'categoryorder':'total ascending'}, xaxis_title="Part (%) des Rappels Filtrés")
+    return fig_sor
+
+
+def figure_tendance_imr(df_comp, marque):
+    """Courbe de contrôle : IMR mensuel de la marque et du marché, seuil d'alerte."""
+    fig_trend = px.line(df_comp, x="Mois", y=[f"IMR_{marque.title()}", "IMR_Marché"], 
+                        title=f"Évolution Mensuelle de l'IMR : {marque.title()} vs. Marché (Seuil Alerte {kpis.SEUIL_IMR_ALERTE})",
+                        labels={"value": "IMR (Score Pondéré)", "Mois": "Mois"},
+                        color_discrete_map={f'IMR_{marque.title()}': '#2C3E50', 'IMR_Marché': '#BDC3C7'},
+                        line_shape='spline', markers=True)
+
+    fig_trend.add_hline(y=kpis.SEUIL_IMR_ALERTE, line_dash="dot", line_color="red", 
+                        annotation_text="Seuil Alerte IMR", 
+                        annotation_position="top right")
+    return fig_trend
+
+
+def figure_ncf_fournisseurs(df_ncf, total_fournisseurs_t1):
+    """Donut des fournisseurs T1 impactés (simulé)."""
+    fig_donut = px.pie(df_ncf, values='Count', names='Type', hole=.5, 
+                       title=f"Taux de Non-Conformité (NCF) des {total_fournisseurs_t1} Fournisseurs T1 (Simulé)",
+                       color_discrete_sequence=['#E74C3C', '#2ECC71'])
+    return fig_donut
+
+
+def figure_matrice_motifs_risques(cooccurrence_filtered):
+    """Heatmap des co-occurrences motifs x risques."""
+    fig_heatmap = px.density_heatmap(cooccurrence_filtered, x="Motif_court", y="risques_encourus", z="Nombre", 
+                                     title="Fréquence d'association des Top 5 Motifs et Top 5 Risques",
+                                     text_auto=True, color_continuous_scale="Plasma")
+    return fig_heatmap
+
+
+def figure_bulles_distributeurs(avg_distrib):
+    """Bulles délai x fréquence x coût par distributeur, médianes en repères."""
+    fig_bubble = px.scatter(avg_distrib, 
+                            x="Délai_Moyen_Jours", 
+                            y="Nb_Rappels", 
+                            size="Coût_Risque_Simulé", 
+                            color="Gravite_Moyenne",
+                            hover_name="distributeurs",
+                            size_max=40,
+                            title="Matrice de Priorisation du Risque Distributeur (Coût Logistique/Jours Simulé)",
+                            labels={
+                                "Délai_Moyen_Jours": "Axe X: Délai Moyen avant Rappel (Jours) ➡ Risque de Durée",
+                                "Nb_Rappels": "Axe Y: Fréquence des Rappels ➡ Risque de Volume",
+                                "Gravite_Moyenne": "Gravité Moyenne (Couleur)",
+                                "Coût_Risque_Simulé": "Coût d'Exposition au Risque Simulé (k€)"
+                            },
+                            color_continuous_scale=px.colors.sequential.YlOrRd)
+
+    if not avg_distrib.empty:
+        fig_bubble.add_vline(x=avg_distrib['Délai_Moyen_Jours'].median(), line_dash="dash", line_color="#34495E")
+        fig_bubble.add_hline(y=avg_distrib['Nb_Rappels'].median(), line_dash="dash", line_color="#34495E")
+
+    fig_bubble.update_layout(xaxis_range=[0, avg_distrib['Délai_Moyen_Jours'].max() * 1.1])
+    return fig_bubble
+
+
+def figure_carte_departements(geo_counts, geojson_vue):
+    """Choroplèthe des rappels par département (géométries de la vue)."""
+    fig_map = px.choropleth(geo_counts,
+                            geojson=geojson_vue,
+                            locations='zone_clean',
+                            featureidkey="properties.code", 
+                            color='Nombre_Rappels', 
+                            hover_name='Département',
+                            color_continuous_scale=["#2ECC71", "#F39C12", "#E74C3C"], 
+                            range_color=[0, kpis.SEUIL_ORANGE_MAX + 1], 
+                            title="Répartition Géospatiale du Risque (Traffic Light)",
+                            height=1000) 
+
+    fig_map.update_geos(
+        fitbounds="locations", 
+        visible=False,
+        center={"lat": 46.603354, "lon": 1.888334}, 
+        projection_scale=3 
+    )
+    fig_map.update_layout(coloraxis_showscale=False) 
+    return fig_map
+
+
+def figure_derive_motifs(df_rank):
+    """Bump chart du rang mensuel des principaux motifs."""
+    fig_bump = px.line(df_rank, 
+                       x="Mois", 
+                       y="Rang", 
+                       color="motif_du_rappel", 
+                       line_shape='spline',
+                       markers=True,
+                       title="Évolution du Classement (Rang) des 5 Principaux Motifs de Rappel",
+                       labels={"Rang": "Classement (1 = Plus Fréquent)", "Mois": "Mois"},
+                       color_discrete_sequence=px.colors.qualitative.Dark24)
+
+    fig_bump.update_yaxes(autorange="reversed", tickvals=[1, 2, 3, 4, 5], title="Classement (1 = le plus fréquent)")
+    fig_bump.update_traces(marker=dict(size=10))
+    return fig_bump
+
+
+def figure_profil_risque(top_cats):
+    """Radar RMPC des catégories les plus rappelées."""
+    fig_radar = px.line_polar(top_cats, r='RMPC', theta='categorie_de_produit', line_close=True,
+                              title="Profil de Risque Moyen Pondéré par Catégorie (RMPC)",
+                              color_discrete_sequence=['#E67E22'])
+    fig_radar.update_traces(fill='toself')
+    fig_radar.update_layout(polar=dict(
+        radialaxis=dict(visible=True, range=[0, 20])
+    ))
+    return fig_radar
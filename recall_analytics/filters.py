@@ -0,0 +1,166 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import indexes
+
+
+# --- MOTEUR DE FILTRES PAR MASQUES ---
+TOUTES = "Toutes"
+
+# Fenêtres de la "Période d'Analyse" (en mois ; None = toute la période)
+PERIODE_OPTIONS = {
+    "12 derniers mois": 12,
+    "6 derniers mois": 6,
+    "3 derniers mois": 3,
+    "Toute la période": None
+}
+
+MASK_CACHE_SIZE = 64 # Masques par (colonne, valeur) conservés entre les reruns (n octets chacun)
+
+
+def period_start(periode, now=None):
+    """Date de début de la fenêtre d'analyse (None pour toute la période)."""
+    months = PERIODE_OPTIONS.get(periode)
+    if months is None:
+        return None
+    now = now if now is not None else pd.Timestamp.now(tz='UTC')
+    return now - pd.DateOffset(months=months)
+
+
+class RowSelection:
+    """
+    Sélection de lignes du jeu de données, décrite par un préfixe (`stop`) et/ou un masque booléen.
+    Le DataFrame correspondant n'est matérialisé qu'au premier accès à `.frame`, puis réutilisé ;
+    une sélection par préfixe est une simple vue (df.iloc[:stop]) sans copie.
+    """
+
+    def __init__(self, df, mask=None, stop=None):
+        self._df = df
+        self.stop = len(df) if stop is None else stop
+        self.mask = mask # Masque de longueur len(df), ou None si seul le préfixe s'applique
+        self._frame = None
+        self._positions = None
+
+    @classmethod
+    def from_positions(cls, df, positions):
+        """Sélection de positions triées déjà connues (groupes d'un groupby), sans recalcul du masque."""
+        mask = np.zeros(len(df), dtype=bool)
+        mask[positions] = True
+        selection = cls(df, mask=mask)
+        selection._positions = np.asarray(positions)
+        return selection
+
+    def refine(self, mask):
+        """Nouvelle sélection restreinte par un masque supplémentaire (None = inchangée)."""
+        if mask is None:
+            return self
+        if self.mask is not None:
+            mask = self.mask & mask
+        else:
+            mask = mask.copy()
+            mask[self.stop:] = False
+        return RowSelection(self._df, mask=mask, stop=self.stop)
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            if self.mask is None:
+                self._positions = np.arange(self.stop)
+            else:
+                self._positions = np.flatnonzero(self.mask[:self.stop])
+        return self._positions
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            if self.mask is None:
+                self._frame = self._df.iloc[:self.stop]
+            else:
+                self._frame = self._df.take(self.positions)
+        return self._frame
+
+    def __len__(self):
+        if self.mask is None:
+            return self.stop
+        return len(self.positions)
+
+
+class FilterEngine:
+    """
+    Construit les masques des filtres de la sidebar sur le jeu de données compacté (partagé, lecture seule).
+    Égalité sur les codes des colonnes category, correspondance exacte de token via les index bitmap
+    pour les colonnes multi-valeurs ; les masques par (colonne, valeur) sont conservés dans un cache LRU.
+    """
+
+    def __init__(self, df, token_indexes=None):
+        self.df = df
+        self.n_rows = len(df)
+        self.token_indexes = token_indexes if token_indexes is not None else indexes.build_token_indexes(df)
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+        dates = df["date_publication"] if "date_publication" in df.columns else pd.Series(dtype="datetime64[ns, UTC]")
+        self._dates = dates
+        # Le loader trie par date décroissante (NaT en fin) : la fenêtre de période est alors un préfixe
+        self._dates_sorted = dates.dropna().is_monotonic_decreasing and dates.isna().iloc[dates.notna().sum():].all()
+
+    @property
+    def dates_sorted(self):
+        """Vrai si le jeu est trié par date de publication décroissante (NaT en fin), comme le produit le loader."""
+        return self._dates_sorted
+
+    def period(self, periode, now=None):
+        """Sélection de la fenêtre de période (préfixe du jeu trié, donc sans copie)."""
+        start = period_start(periode, now)
+        if start is None or self._dates.empty:
+            return RowSelection(self.df)
+        in_period = (self._dates >= start).to_numpy(dtype=bool)
+        if self._dates_sorted:
+            return RowSelection(self.df, stop=int(in_period.sum()))
+        return RowSelection(self.df, mask=in_period)
+
+    def mask(self, col, value):
+        """Masque des lignes où `col` vaut `value` (ou contient le token `value`) ; None si pas de filtre."""
+        if value == TOUTES or col not in self.df.columns:
+            return None
+        key = (col, value)
+        with self._lock:
+            if key in self._masks:
+                self._masks.move_to_end(key)
+                return self._masks[key]
+
+        if col in self.token_indexes:
+            mask = self.token_indexes[col].mask(value)
+        else:
+            s = self.df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                code = s.cat.categories.get_indexer([value])[0]
+                mask = s.cat.codes.to_numpy() == code if code >= 0 else np.zeros(self.n_rows, dtype=bool)
+            else:
+                mask = (s == value).fillna(False).to_numpy(dtype=bool)
+
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return mask
+
+    def combined_mask(self, criteria):
+        """Combine en un seul masque les critères {colonne: valeur} actifs (None si aucun)."""
+        token_bitmaps = []
+        combined = None
+        for col, value in criteria.items():
+            if value == TOUTES or col not in self.df.columns:
+                continue
+            if col in self.token_indexes:
+                token_bitmaps.append(self.token_indexes[col].bitmap(value))
+                continue
+            mask = self.mask(col, value)
+            combined = mask.copy() if combined is None else np.logical_and(combined, mask, out=combined)
+        if token_bitmaps:
+            mask = indexes.intersect_bitmaps(token_bitmaps, self.n_rows)
+            combined = mask if combined is None else np.logical_and(combined, mask, out=combined)
+        return combined
@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from . import loader
+
+
+# --- GÉOMÉTRIES SIMPLIFIÉES MULTI-RÉSOLUTION (CARTE DES DÉPARTEMENTS) ---
+GEOJSON_PATH = "departements.geojson"
+
+# Niveau -> (tolérance Douglas-Peucker en degrés, décimales conservées après quantification)
+# À la hauteur de carte du dashboard (1000 px pour la France métropolitaine), 0.01° représente environ un pixel
+RESOLUTIONS = {
+    "fine": (0.002, 3),
+    "moyenne": (0.008, 3),
+    "grossiere": (0.02, 2),
+}
+
+# Choix du niveau selon la vue : peu de départements affichés = carte zoomée (fitbounds) = géométrie plus fine
+VIEW_MAX_FEATURES = [(6, "fine"), (30, "moyenne")]
+DEFAULT_RESOLUTION = "grossiere"
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    return []
+
+
+def _quantize_ring(ring, decimals):
+    """Arrondit les coordonnées d'un anneau et retire les points consécutifs dupliqués (anneau ouvert)."""
+    points = []
+    for x, y in ((round(p[0], decimals), round(p[1], decimals)) for p in ring):
+        if not points or points[-1] != (x, y):
+            points.append((x, y))
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def _douglas_peucker(points, tolerance):
+    """Indices des points conservés par Douglas-Peucker (extrémités toujours conservées)."""
+    coords = np.asarray(points, dtype=float)
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = coords[start], coords[end]
+        segment = coords[start + 1:end]
+        ab = b - a
+        norm = np.hypot(ab[0], ab[1])
+        if norm == 0:
+            dist = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (segment[:, 1] - a[1]) - ab[1] * (segment[:, 0] - a[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify_geojson(geojson, tolerance, decimals):
+    """
+    Simplification préservant la topologie : les anneaux sont découpés en arcs aux points où change
+    l'ensemble des anneaux partageant l'arête (frontières communes entre départements), chaque arc est
+    simplifié une seule fois puis réutilisé par tous les anneaux qui le partagent : pas de trou ni de
+    chevauchement entre voisins. Les coordonnées sont quantifiées à `decimals` décimales.
+    """
+    rings = []
+    for feature in geojson["features"]:
+        for polygon in _polygons(feature["geometry"]):
+            for ring in polygon:
+                rings.append(_quantize_ring(ring, decimals))
+
+    # Arête non orientée -> anneaux qui la contiennent
+    edge_owners = {}
+    for ring_id, ring in enumerate(rings):
+        for i in range(len(ring)):
+            u, v = ring[i], ring[(i + 1) % len(ring)]
+            edge_owners.setdefault((min(u, v), max(u, v)), set()).add(ring_id)
+
+    def owners(ring, i):
+        u, v = ring[i], ring[(i + 1) % len(ring)]
+        return edge_owners[(min(u, v), max(u, v))]
+
+    simplified_arcs = {}
+
+    def simplify_arc(arc):
+        # Orientation canonique : un arc partagé est parcouru en sens inverse par le voisin
+        reverse = arc[::-1] < arc
+        key = tuple(arc[::-1] if reverse else arc)
+        if key not in simplified_arcs:
+            keep = _douglas_peucker(key, tolerance)
+            simplified_arcs[key] = [p for p, k in zip(key, keep) if k]
+        result = simplified_arcs[key]
+        return result[::-1] if reverse else result
+
+    simplified_rings = []
+    for ring in rings:
+        n = len(ring)
+        if n < 3:
+            simplified_rings.append(ring + ring[:1])
+            continue
+        cuts = [i for i in range(n) if owners(ring, i - 1) != owners(ring, i)]
+        if not cuts:
+            # Anneau sans changement de voisinage : un seul arc fermé, démarré au plus petit point
+            start = ring.index(min(ring))
+            rotated = ring[start:] + ring[:start]
+            points = simplify_arc(rotated + rotated[:1])
+        else:
+            points = []
+            for k, cut in enumerate(cuts):
+                nxt = cuts[(k + 1) % len(cuts)]
+                arc = ring[cut:nxt + 1] if nxt > cut else ring[cut:] + ring[:nxt + 1]
+                part = simplify_arc(arc)
+                points.extend(part if not points else part[1:])
+        if len(points) < 4:
+            # Anneau dégénéré par la simplification (petite île) : géométrie quantifiée conservée
+            points = ring + ring[:1]
+        simplified_rings.append(points)
+
+    features, next_ring = [], 0
+    for feature in geojson["features"]:
+        polygons = []
+        for polygon in _polygons(feature["geometry"]):
+            polygons.append([[list(p) for p in simplified_rings[next_ring + i]] for i in range(len(polygon))])
+            next_ring += len(polygon)
+        geometry = {"type": "Polygon", "coordinates": polygons[0]} if feature["geometry"]["type"] == "Polygon" else {"type": "MultiPolygon", "coordinates": polygons}
+        features.append({"type": "Feature", "properties": feature.get("properties", {}), "geometry": geometry})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def serialized_size(geojson):
+    """Taille (octets) du GeoJSON sérialisé de façon compacte, telle qu'envoyée au navigateur."""
+    return len(json.dumps(geojson, separators=(",", ":")))
+
+
+def _variant_path(geojson_path, niveau):
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(geojson_path)), loader.CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"{os.path.basename(geojson_path)}.{niveau}.json")
+
+
+def build_variants(geojson_path=GEOJSON_PATH, resolutions=RESOLUTIONS):
+    """
+    Construit (ou relit depuis le cache disque) les variantes simplifiées du GeoJSON source.
+    Une variante en cache est réutilisée tant que la source et les paramètres de simplification sont inchangés.
+    """
+    stamp = loader.source_stamp(geojson_path)
+    source = None
+    variants = {}
+    for niveau, (tolerance, decimals) in resolutions.items():
+        path = _variant_path(geojson_path, niveau)
+        signature = [stamp, tolerance, decimals]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("signature") == signature:
+                variants[niveau] = cached["geojson"]
+                continue
+        except (OSError, ValueError):
+            pass
+
+        if source is None:
+            with open(geojson_path, "r", encoding="utf-8") as f:
+                source = json.load(f)
+        variants[niveau] = simplify_geojson(source, tolerance, decimals)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            loader._write_json_atomic(path, {"signature": signature, "geojson": variants[niveau]})
+        except OSError:
+            # Dossier en lecture seule : variantes recalculées au prochain démarrage
+            pass
+    return variants
+
+
+def choose_resolution(n_features):
+    """Niveau de simplification adapté au nombre de départements affichés."""
+    for max_features, niveau in VIEW_MAX_FEATURES:
+        if n_features <= max_features:
+            return niveau
+    return DEFAULT_RESOLUTION
+
+
+def subset(geojson, codes, key="code"):
+    """Ne conserve que les départements affichés (seules leurs géométries sont envoyées au navigateur)."""
+    codes = set(codes)
+    return {"type": "FeatureCollection", "features": [f for f in geojson["features"] if f.get("properties", {}).get(key) in codes]}
+
+
+def view(variants, codes, key="code"):
+    """(niveau, GeoJSON) pour les départements affichés : géométries restreintes à la vue, résolution choisie selon leur nombre."""
+    n_features = len(subset(variants[DEFAULT_RESOLUTION], codes, key)["features"])
+    niveau = choose_resolution(n_features)
+    return niveau, subset(variants[niveau], codes, key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-calcul des variantes simplifiées du GeoJSON des départements.")
+    parser.add_argument("geojson", nargs="?", default=GEOJSON_PATH, help="GeoJSON source (propriété 'code' par département)")
+    args = parser.parse_args(argv)
+
+    with open(args.geojson, "r", encoding="utf-8") as f:
+        original = serialized_size(json.load(f))
+    for niveau, variant in build_variants(args.geojson).items():
+        size = serialized_size(variant)
+        print(f"{niveau}: {size / 1024:.0f} Ko ({original / size:.1f}x plus léger)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+
+# Colonnes multi-valeurs (valeurs séparées par ";" après normalisation du loader)
+MULTI_VALUED_COLUMNS = ["distributeurs", "zone_geographique_de_vente", "motif_du_rappel", "risques_encourus"]
+
+
+def split_tokens(value):
+    """Découpe une valeur multi-valeurs normalisée en tokens distincts (sans vides)."""
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return []
+    tokens = []
+    for token in str(value).split(";"):
+        token = token.strip()
+        if token and token != "nan" and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+class TokenBitmapIndex:
+    """
+    Index inversé token -> positions de lignes pour une colonne multi-valeurs.
+    Les tokens fréquents sont stockés en bitmap compressé (np.packbits), les tokens rares
+    en tableau trié de positions : la mémoire reste bornée même avec des milliers de distributeurs.
+    """
+
+    def __init__(self, n_rows, postings):
+        self.n_rows = n_rows
+        self._dense_threshold = max(1, n_rows // 32) # Au-delà, le bitmap (n/8 octets) est plus petit que les positions (4 octets/ligne)
+        self._bitmaps = {}
+        self._positions = {}
+        self._counts = {}
+        for token, positions in postings.items():
+            self._counts[token] = len(positions)
+            if len(positions) > self._dense_threshold:
+                mask = np.zeros(n_rows, dtype=bool)
+                mask[positions] = True
+                self._bitmaps[token] = np.packbits(mask)
+            else:
+                self._positions[token] = positions.astype(np.int32)
+
+    @classmethod
+    def from_series(cls, s):
+        """Construit l'index en ne découpant que les valeurs distinctes de la colonne (pas chaque ligne)."""
+        codes, uniques = pd.factorize(s)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+        rows_by_token = {}
+        for code, value in enumerate(uniques):
+            rows = order[bounds[code]:bounds[code + 1]]
+            for token in split_tokens(value):
+                rows_by_token.setdefault(token, []).append(rows)
+
+        postings = {token: np.sort(np.concatenate(chunks)) for token, chunks in rows_by_token.items()}
+        return cls(len(s), postings)
+
+    def tokens(self):
+        return sorted(self._counts)
+
+    def count(self, token):
+        return self._counts.get(token, 0)
+
+    def bitmap(self, token):
+        """Bitmap compressé (uint8) des lignes contenant le token."""
+        if token in self._bitmaps:
+            return self._bitmaps[token]
+        return np.packbits(self.mask(token))
+
+    def mask(self, token):
+        """Masque booléen (longueur n_rows) des lignes contenant exactement ce token."""
+        if token in self._bitmaps:
+            return np.unpackbits(self._bitmaps[token], count=self.n_rows).view(bool)
+        mask = np.zeros(self.n_rows, dtype=bool)
+        positions = self._positions.get(token)
+        if positions is not None:
+            mask[positions] = True
+        return mask
+
+    def positions(self, token):
+        if token in self._positions:
+            return self._positions[token]
+        return np.flatnonzero(self.mask(token))
+
+
+def intersect_bitmaps(bitmaps, n_rows):
+    """Intersection (ET logique) de bitmaps compressés, retournée sous forme de masque booléen."""
+    result = None
+    for bitmap in bitmaps:
+        result = bitmap if result is None else np.bitwise_and(result, bitmap)
+    if result is None:
+        return np.ones(n_rows, dtype=bool)
+    return np.unpackbits(result, count=n_rows).view(bool)
+
+
+def build_token_indexes(df, columns=MULTI_VALUED_COLUMNS):
+    """Construit un TokenBitmapIndex par colonne multi-valeurs présente dans le DataFrame."""
+    return {col: TokenBitmapIndex.from_series(df[col]) for col in columns if col in df.columns}
+
+
+class TokenBridge:
+    """
+    Table pont (ligne -> token) d'une colonne multi-valeurs, construite une fois par version du jeu :
+    code de valeur distincte par ligne, et CSR valeur -> identifiants entiers de tokens (dictionnaire `tokens`).
+    La vue « explosée » d'une sélection est une jointure vectorisée sur ce pont, sans découpage de chaînes.
+    """
+
+    def __init__(self, row_values, values):
+        self._row_values = np.asarray(row_values, dtype=np.int32) # -1 = valeur manquante
+        self.values = list(values)
+        self.tokens = []
+        token_ids = {}
+        ptr, flat_tokens = [0], []
+        for value in values:
+            for token in split_tokens(value):
+                if token not in token_ids:
+                    token_ids[token] = len(self.tokens)
+                    self.tokens.append(token)
+                flat_tokens.append(token_ids[token])
+            ptr.append(len(flat_tokens))
+        self.token_ids = token_ids
+        self._ptr = np.array(ptr, dtype=np.int64)
+        self._value_tokens = np.array(flat_tokens, dtype=np.int32)
+
+    @classmethod
+    def from_series(cls, s):
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            return cls(s.cat.codes.to_numpy(), list(s.cat.categories))
+        codes, uniques = pd.factorize(s)
+        return cls(codes, list(uniques))
+
+    def value_codes(self, positions):
+        """Code de la valeur distincte (index dans `values`, -1 si manquante) des lignes aux positions données."""
+        return self._row_values[positions]
+
+    def _join(self, selection=None):
+        """(positions de lignes, identifiants de tokens) de la sélection, dans l'ordre des lignes."""
+        positions = np.arange(len(self._row_values)) if selection is None else selection.positions
+        row_values = self._row_values[positions]
+        present = row_values >= 0
+        first = np.where(present, self._ptr[np.maximum(row_values, 0)], 0)
+        lengths = np.where(present, self._ptr[np.maximum(row_values, 0) + 1] - first, 0)
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(positions, lengths), self._value_tokens[np.repeat(first, lengths) + within]
+
+    def explode(self, selection=None, name="token"):
+        """Vue longue (position, token) d'une sélection ; les tokens sont une colonne category (codes = identifiants)."""
+        positions, token_ids = self._join(selection)
+        return pd.DataFrame({
+            "position": positions,
+            name: pd.Categorical.from_codes(token_ids, categories=pd.Index(self.tokens, dtype=object)) if self.tokens else pd.Categorical([]),
+        })
+
+    def counts(self, selection=None):
+        """
+        Nombre de lignes par token, trié par effectif décroissant puis par première apparition dans la sélection
+        (mêmes effectifs que explode().value_counts(), dont l'ordre des ex aequo n'est pas garanti).
+        """
+        positions, token_ids = self._join(selection)
+        counts = np.bincount(token_ids, minlength=len(self.tokens))
+        first_seen = np.full(len(self.tokens), len(token_ids), dtype=np.int64)
+        np.minimum.at(first_seen, token_ids, np.arange(len(token_ids)))
+        present = np.flatnonzero(counts)
+        order = present[np.lexsort((first_seen[present], -counts[present]))]
+        return pd.Series(counts[order], index=pd.Index([self.tokens[i] for i in order], dtype=object), dtype="int64")
+
+    def counts_by(self, row_groups, selection=None, groups=None):
+        """
+        Nombre de lignes par (groupe, token) en une passe : `row_groups` donne le code de groupe de chaque ligne de la
+        sélection (dans l'ordre des lignes, -1 = hors groupe), `groups` le libellé de chaque code (le code lui-même
+        sinon). Série indexée par (groupe, token), triée par code de groupe puis dans l'ordre de counts() restreint
+        au groupe (effectif décroissant, puis première apparition).
+        """
+        positions, token_ids = self._join(selection)
+        selected = np.arange(len(self._row_values)) if selection is None else selection.positions
+        group_of = np.full(len(self._row_values), -1, dtype=np.int64)
+        group_of[selected] = row_groups
+        joined_groups = group_of[positions]
+        keep = joined_groups >= 0
+        n_tokens = max(len(self.tokens), 1)
+        # Première occurrence de chaque paire : l'ordre des lignes d'un groupe est celui de la sélection entière
+        keys, first_seen, counts = np.unique(joined_groups[keep] * n_tokens + token_ids[keep], return_index=True, return_counts=True)
+        order = np.lexsort((first_seen, -counts, keys // n_tokens))
+        keys, counts = keys[order], counts[order]
+        tokens = np.array(self.tokens + [None], dtype=object)[keys % n_tokens]
+        group_codes = keys // n_tokens
+        labels = group_codes if groups is None else np.asarray(groups, dtype=object)[group_codes]
+        index = pd.MultiIndex.from_arrays([labels, tokens], names=["groupe", "token"])
+        return pd.Series(counts, index=index, dtype="int64")
+
+
+def build_token_bridges(df, columns=MULTI_VALUED_COLUMNS):
+    """Construit un TokenBridge par colonne multi-valeurs présente dans le DataFrame."""
+    return {col: TokenBridge.from_series(df[col]) for col in columns if col in df.columns}
+
+
+def token_value_counts(s):
+    """
+    Nombre de lignes par token d'une colonne multi-valeurs, trié par effectif décroissant
+    (équivalent de explode().value_counts(), calculé sur les valeurs distinctes sans exploser les lignes).
+    """
+    codes, uniques = pd.factorize(s)
+    value_counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    counts = {}
+    for value, n in zip(uniques, value_counts):
+        for token in split_tokens(value):
+            counts[token] = counts.get(token, 0) + int(n)
+    return pd.Series(counts, dtype="int64").sort_values(ascending=False)
@@ -0,0 +1,247 @@
+import argparse
+import glob
+import json
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import requests
+
+from . import loader
+
+try:
+    import pyarrow.feather as pa_feather
+except ImportError: # pyarrow est requis pour le magasin local (fichiers Arrow)
+    pa_feather = None
+
+
+# --- INGESTION INCRÉMENTALE RAPPELCONSO (API OPEN DATA) ---
+# Endpoint "records" de l'API Explore v2.1 (Opendatasoft) ; surchargeable pour pointer vers un serveur de test
+API_URL = os.environ.get(
+    "RAPPELCONSO_API_URL",
+    "https://data.economie.gouv.fr/api/explore/v2.1/catalog/datasets/rappelconso-v2-gtin-espaces/records",
+)
+# Curseur de synchronisation : date de dernière modification de la fiche (égale à la date de publication tant
+# qu'elle n'a pas été modifiée), départagée par le numéro de fiche ; surchargeable si l'endpoint la nomme autrement
+SYNC_DATE_FIELD = os.environ.get("RAPPELCONSO_MODIFIED_FIELD", "date_modification")
+SYNC_KEY_FIELD = "numero_fiche"      # Numéro de fiche côté API (départage des fiches de même date)
+PAGE_SIZE = 100                      # Maximum autorisé par l'API pour "limit"
+MAX_OFFSET = 10000                   # offset + limit ne peut pas dépasser cette borne côté API
+KEY_COLUMN = "reference_fiche"       # Clé d'upsert (numero_fiche renommé par loader.COLUMN_MAPPING)
+COMPACT_AFTER_PARTS = 20             # Fusion des fichiers de delta au-delà de ce nombre
+REQUEST_TIMEOUT = 30
+
+
+def _quote(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _since_clause(cursor, cursor_key=None):
+    """
+    Borne de synchronisation : fiches modifiées après (cursor, cursor_key) dans l'ordre (date, numéro de fiche).
+    Sans numéro de fiche, la borne est ">=" sur la date : les fiches de la date du curseur sont relues, l'upsert dédoublonne.
+    """
+    if cursor_key is None:
+        return f"{SYNC_DATE_FIELD} >= date{_quote(cursor)}"
+    return (f"{SYNC_DATE_FIELD} > date{_quote(cursor)} OR "
+            f"({SYNC_DATE_FIELD} = date{_quote(cursor)} AND {SYNC_KEY_FIELD} > {_quote(cursor_key)})")
+
+
+def record_cursor(record):
+    """Position (date de modification, numéro de fiche) d'un record de l'API dans l'ordre de synchronisation."""
+    return record.get(SYNC_DATE_FIELD) or record.get("date_publication"), record.get(SYNC_KEY_FIELD)
+
+
+def fetch_pages(since=None, since_key=None, base_url=API_URL, page_size=PAGE_SIZE, session=None):
+    """
+    Itère sur les pages de records publiés ou modifiés après (since, since_key), triés par (date de modification,
+    numéro de fiche) croissants. Pagination par offset, puis par curseur (keyset) sur ce couple quand la borne
+    MAX_OFFSET est atteinte : le numéro de fiche départage les fiches de même date, aucune n'est perdue.
+    """
+    session = session or requests.Session()
+    cursor, cursor_key, offset = since, since_key, 0
+    while True:
+        params = {"order_by": f"{SYNC_DATE_FIELD}, {SYNC_KEY_FIELD}", "limit": page_size, "offset": offset}
+        if cursor:
+            params["where"] = _since_clause(cursor, cursor_key)
+        response = session.get(base_url, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        results = response.json().get("results", [])
+        if not results:
+            return
+        yield results
+
+        if len(results) < page_size:
+            return
+        offset += page_size
+        if offset + page_size > MAX_OFFSET:
+            last, last_key = record_cursor(results[-1])
+            if not last or last_key is None:
+                raise ValueError("Record sans date de modification ni numéro de fiche : pagination par curseur impossible.")
+            cursor, cursor_key, offset = last, last_key, 0
+
+
+def normalize_records(records):
+    """Applique aux records de l'API le même mapping de colonnes et la même normalisation que l'export CSV."""
+    df = pd.DataFrame.from_records(records)
+    if df.empty:
+        return df
+    for col in df.columns:
+        # Certains champs de l'API sont des listes : on les ramène au format multi-valeurs de l'export
+        if df[col].map(lambda v: isinstance(v, list)).any():
+            df[col] = df[col].map(lambda v: "|".join(map(str, v)) if isinstance(v, list) else v)
+    df = loader.rename_columns(df)
+    df = loader.parse_dates(df)
+    df = loader.normalize_text_columns(df)
+    return df[[c for c in loader.USED_COLUMNS if c in df.columns]].reset_index(drop=True)
+
+
+# --- MAGASIN LOCAL (FICHIERS ARROW EN AJOUT SEUL + ÉTAT DE SYNCHRONISATION) ---
+
+def _state_path(store_dir):
+    return os.path.join(store_dir, "state.json")
+
+
+def _parts(store_dir):
+    return sorted(glob.glob(os.path.join(store_dir, "parts", "part-*.arrow")))
+
+
+def read_state(store_dir):
+    try:
+        with open(_state_path(store_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"cursor": None, "cursor_key": None, "revision": 0, "last_sync": None}
+
+
+def _write_state(store_dir, state):
+    tmp_path = _state_path(store_dir) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(store_dir))
+
+
+def store_exists(store_dir):
+    return bool(_parts(store_dir))
+
+
+def store_revision(store_dir):
+    """Révision du magasin : incrémentée à chaque écriture, sert de clé de cache au dashboard."""
+    return read_state(store_dir).get("revision", 0)
+
+
+def _require_pyarrow():
+    if pa_feather is None:
+        raise ImportError("pyarrow est nécessaire pour le magasin d'ingestion RappelConso.")
+
+
+def append_part(store_dir, df):
+    """Ajoute un delta normalisé au magasin (nouveau fichier, jamais de réécriture des précédents)."""
+    _require_pyarrow()
+    parts_dir = os.path.join(store_dir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    existing = _parts(store_dir)
+    number = int(os.path.basename(existing[-1])[5:11]) + 1 if existing else 0
+    path = os.path.join(parts_dir, f"part-{number:06d}.arrow")
+    pa_feather.write_feather(df.reset_index(drop=True), path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_store(store_dir):
+    """Fusionne les deltas : une seule ligne par reference_fiche, la plus récemment ingérée l'emporte."""
+    _require_pyarrow()
+    frames = [pa_feather.read_table(path).to_pandas() for path in _parts(store_dir)]
+    if not frames:
+        return pd.DataFrame(columns=list(loader.USED_COLUMNS))
+    merged = pd.concat(frames, keys=range(len(frames)), names=["_part", None]).reset_index(level="_part")
+    if KEY_COLUMN in merged.columns:
+        merged = (merged.sort_values(["_part", "date_publication"], kind="stable")
+                        .drop_duplicates(subset=KEY_COLUMN, keep="last"))
+    merged = merged.drop(columns="_part").sort_values(by="date_publication", ascending=False)
+    return merged.reset_index(drop=True)
+
+
+def compact_store(store_dir):
+    """Réécrit les deltas en un seul fichier quand leur nombre dépasse COMPACT_AFTER_PARTS."""
+    parts = _parts(store_dir)
+    if len(parts) <= COMPACT_AFTER_PARTS:
+        return False
+    merged = load_store(store_dir)
+    new_part = append_part(store_dir, merged)
+    for path in parts:
+        if path != new_part:
+            os.remove(path)
+    return True
+
+
+def _csv_cursor(raw):
+    """Curseur de départ d'un magasin initialisé depuis l'export : dernière date de modification (à défaut, de publication)."""
+    for field in (SYNC_DATE_FIELD, "date_publication"):
+        if field in raw.columns:
+            dates = pd.to_datetime(raw[field], errors="coerce", utc=True)
+            if dates.notna().any():
+                return dates.max().isoformat()
+    return None
+
+
+def seed_from_csv(store_dir, csv_path):
+    """Initialise le magasin à partir de l'export CSV complet : la synchronisation ne tire ensuite que le delta."""
+    raw = loader.read_export_csv(csv_path)
+    df = loader.rename_columns(raw)
+    df = loader.parse_dates(df)
+    df = loader.normalize_text_columns(df)
+    df = df[[c for c in loader.USED_COLUMNS if c in df.columns]]
+    append_part(store_dir, df)
+    # Pas de numéro de fiche : la première synchronisation relit les fiches de la date du curseur (borne ">=")
+    state = dict(read_state(store_dir), cursor=_csv_cursor(raw), cursor_key=None)
+    state["revision"] = state.get("revision", 0) + 1
+    _write_state(store_dir, state)
+    return len(df)
+
+
+def sync(store_dir, base_url=API_URL, page_size=PAGE_SIZE, seed_csv=None, session=None):
+    """
+    Synchronisation delta : ne récupère que les fiches publiées ou modifiées depuis le dernier curseur, les normalise
+    et les ajoute au magasin (une fiche modifiée remplace sa version précédente, par reference_fiche).
+    La révision n'est incrémentée que si des fiches ont été reçues. Retourne un résumé de la synchronisation.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    seeded = 0
+    if seed_csv and not store_exists(store_dir):
+        seeded = seed_from_csv(store_dir, seed_csv)
+
+    state = read_state(store_dir)
+    records = []
+    pages = fetch_pages(since=state.get("cursor"), since_key=state.get("cursor_key"),
+                        base_url=base_url, page_size=page_size, session=session)
+    for page in pages:
+        records.extend(page)
+
+    delta = normalize_records(records)
+    if not delta.empty:
+        append_part(store_dir, delta)
+        compact_store(store_dir)
+        # Les records arrivent dans l'ordre du curseur : le dernier reçu devient le nouveau curseur
+        cursor, cursor_key = record_cursor(records[-1])
+        state = dict(state, cursor=cursor, cursor_key=cursor_key)
+        state["revision"] = state.get("revision", 0) + 1
+
+    state["last_sync"] = datetime.now(timezone.utc).isoformat()
+    _write_state(store_dir, state)
+    return {"recus": len(records), "initialises_depuis_csv": seeded, "curseur": state.get("cursor"), "revision": state.get("revision", 0)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synchronisation incrémentale des fiches RappelConso.")
+    parser.add_argument("--store", default="rappelconso_store", help="Dossier du magasin local")
+    parser.add_argument("--url", default=API_URL, help="Endpoint records de l'API RappelConso")
+    parser.add_argument("--seed-csv", default=None, help="Export CSV servant à initialiser un magasin vide")
+    args = parser.parse_args(argv)
+
+    resume = sync(args.store, base_url=args.url, seed_csv=args.seed_csv)
+    print(json.dumps(resume, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import filters
+from . import indexes
+
+
+# --- COÛTS UNITAIRES SIMULÉS (EN DUR) ---
+COUT_RAPPEl_GRAVE_UNITAIRE = 50000.0
+COUT_RAPPEl_MINEUR_UNITAIRE = 5000.0
+
+DAP_MAX_JOURS = 7          # Délai de commercialisation "très court" pour le DAP
+TRCR_SEUIL_RECURRENCE = 2  # Nombre de cas de risque haut à partir duquel la récurrence est simulée
+COUT_LOGISTIQUE_JOUR_SUPP = 500.0 # Coût simulé d'un jour d'exposition au risque logistique par rappel
+
+# --- SEUILS D'ALERTE (TRAFFIC LIGHT) ---
+SEUIL_IMR_ALERTE = 10.0
+SEUIL_VERT_MAX = 5
+SEUIL_ORANGE_MAX = 15
+# Seuils pour l'IPC (Indice de Pression Concurrentielle : IMR Marque / IMR Marché)
+SEUIL_IPC_BON = 0.95   # Marque fait mieux que le marché
+SEUIL_IPC_MOYEN = 1.05 # Marque fait légèrement moins bien que le marché
+
+# Colonnes lues par compute_kpis (les colonnes multi-valeurs ne sont lues que sans `token_counts`)
+KPI_COLUMNS = ["date_publication", "date_debut_commercialisation", "categorie_de_produit", "motif_du_rappel",
+               "risques_encourus", "distributeurs", "score_gravite", "is_risque_grave", "is_cause_fournisseur",
+               "is_cause_logistique", "is_recurrence"]
+
+
+def calculate_imr(df_calc):
+    """IMR (gravité moyenne x 10), coût implicite total et gravité moyenne (1 à 2) d'une sélection."""
+    if df_calc.empty or 'risques_encourus' not in df_calc.columns:
+        return 0.0, 0.0, 0.0
+
+    # Gravité précalculée au chargement (risque grave = poids 2, mineur = poids 1)
+    is_risque_grave = df_calc["is_risque_grave"].to_numpy(dtype=bool)
+    total_rappels_period = len(df_calc)
+    total_score = int(df_calc["score_gravite"].sum())
+
+    imr = (total_score / total_rappels_period) * 10
+    avg_gravite = total_score / total_rappels_period # Gravité Moyenne
+    total_cout = np.where(is_risque_grave, COUT_RAPPEl_GRAVE_UNITAIRE, COUT_RAPPEl_MINEUR_UNITAIRE).sum()
+    return imr, total_cout, avg_gravite
+
+
+def traffic_light(count):
+    """Niveau de risque d'un nombre de rappels (libellé affiché)."""
+    if count <= SEUIL_VERT_MAX:
+        return "🟢 Faible (Green)"
+    elif count <= SEUIL_ORANGE_MAX:
+        return "🟠 Modéré (Amber)"
+    else:
+        return "🔴 Critique (Red)"
+
+
+def traffic_light_color(count):
+    """Couleur hexadécimale du niveau de risque (carte)."""
+    if count <= SEUIL_VERT_MAX:
+        return '#2ECC71' # Green
+    elif count <= SEUIL_ORANGE_MAX:
+        return '#F39C12' # Orange
+    else:
+        return '#E74C3C' # Red
+
+
+def baseline_row(rappels, graves):
+    """Référence marché à partir des effectifs : IMR, gravité moyenne et coût implicite."""
+    total_score = rappels + graves # Score de gravité : 2 si grave, 1 sinon
+    return {
+        "Rappels": rappels,
+        "Graves": graves,
+        "IMR": total_score / rappels * 10 if rappels else 0.0,
+        "Gravite_Moyenne": total_score / rappels if rappels else 0.0,
+        "Cout_Implicite": graves * COUT_RAPPEl_GRAVE_UNITAIRE + (rappels - graves) * COUT_RAPPEl_MINEUR_UNITAIRE,
+    }
+
+
+def market_baseline(df_calc):
+    """Référence marché calculée directement sur les lignes d'une sélection."""
+    if df_calc.empty or "is_risque_grave" not in df_calc.columns:
+        return baseline_row(0, 0)
+    return baseline_row(len(df_calc), int(df_calc["is_risque_grave"].sum()))
+
+
+def market_baselines(monthly_cube, selections_by_period):
+    """
+    Table des références marché par (période, catégorie), catégorie filters.TOUTES pour le marché entier :
+    rappels, graves, IMR, gravité moyenne et coût implicite. Calculée sur les cellules du cube mensuel.
+    """
+    rows = {}
+    for periode, selection in selections_by_period.items():
+        rows[(periode, filters.TOUTES)] = baseline_row(*monthly_cube.totals(selection))
+        by_cat = monthly_cube.totals_by("categorie_de_produit", selection)
+        for categorie, rappels, graves in zip(by_cat.index, by_cat["Rappels"], by_cat["Graves"]):
+            rows[(periode, categorie)] = baseline_row(int(rappels), int(graves))
+    table = pd.DataFrame.from_dict(rows, orient="index")
+    table.index = pd.MultiIndex.from_tuples(table.index, names=["periode", "categorie_de_produit"])
+    return table
+
+
+def lookup_baseline(baselines, periode, categorie=filters.TOUTES):
+    """Ligne de référence (dict) d'une période x catégorie ; effectifs nuls si la catégorie est absente de la période."""
+    if (periode, categorie) in baselines.index:
+        return baselines.loc[(periode, categorie)].to_dict()
+    return baseline_row(0, 0)
+
+
+def totals_by_rows(df_calc, col):
+    """Rappels et rappels graves par valeur de `col`, calculés sur les lignes (filtres hors dimensions du cube)."""
+    if df_calc.empty or col not in df_calc.columns:
+        return pd.DataFrame({"Rappels": pd.Series(dtype="int64"), "Graves": pd.Series(dtype="int64")})
+    totals = df_calc["is_risque_grave"].groupby(df_calc[col], observed=True).agg(["size", "sum"])
+    return totals.rename(columns={"size": "Rappels", "sum": "Graves"}).astype("int64")
+
+
+def league_table(totals, marche):
+    """
+    Classement de toutes les valeurs (marques) à partir de leurs effectifs (Rappels, Graves), en une passe vectorisée :
+    part des rappels, IMR, gravité moyenne, coût implicite et IPC face à la référence marché `marche` de la période.
+    """
+    rappels = totals["Rappels"].to_numpy(dtype=np.int64)
+    graves = totals["Graves"].to_numpy(dtype=np.int64)
+    score = rappels + graves # Score de gravité : 2 si grave, 1 sinon
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gravite = np.where(rappels > 0, score / rappels, 0.0)
+    imr = gravite * 10
+    imr_marche = marche["IMR"]
+    return pd.DataFrame({
+        "Rappels": rappels,
+        "Part_pourcent": rappels / rappels.sum() * 100 if rappels.sum() else np.zeros(len(rappels)),
+        "Graves": graves,
+        "IMR": imr,
+        "Gravite_Moyenne": gravite,
+        "Cout_Implicite": graves * COUT_RAPPEl_GRAVE_UNITAIRE + (rappels - graves) * COUT_RAPPEl_MINEUR_UNITAIRE,
+        "IPC": imr / imr_marche if imr_marche > 0 else np.zeros(len(rappels)),
+    }, index=totals.index)
+
+
+def imr_per_month(df_input):
+    """Série IMR mensuelle (gravité moyenne x 10) indexée par mois de publication."""
+    if 'risques_encourus' not in df_input.columns or df_input.empty:
+        return pd.Series(dtype='float64')
+    mois = df_input["date_publication"].dt.to_period("M")
+    return df_input["score_gravite"].groupby(mois).mean() * 10
+
+
+@dataclass(frozen=True)
+class KpiBundle:
+    """Indicateurs du tableau de bord pour un état des filtres (valeurs brutes, mises en forme par l'affichage)."""
+    total_rappels: int
+    imr_marque: float
+    cout_marque: float
+    imr_marche: float
+    ipc: float
+    pc_risques_graves: object      # None si la colonne risques_encourus est absente
+    tifc: float
+    isr: float
+    dm_jours: object        # None si aucune date de début de commercialisation exploitable
+    dap: float
+    tal: float
+    imr_std: float
+    trcr: float
+    rro: float
+    risque_principal: str
+    densite_distributeurs: object  # None si la colonne distributeurs est absente
+    diversite_risques: object      # None si aucun risque renseigné
+    volatilite_mensuelle: float
+    rmpc: object                   # None si motifs ou risques absents
+
+    @property
+    def dm_label(self):
+        return "N/A" if self.dm_jours is None else f"{self.dm_jours:.1f} jours"
+
+    @property
+    def pc_risques_graves_label(self):
+        return "N/A" if self.pc_risques_graves is None else f"{self.pc_risques_graves:.1f}%"
+
+
+def compute_kpis(df_filtered, marche, marche_categorie=None, marque=filters.TOUTES, cat=filters.TOUTES,
+                 rappels_mensuels=None, imr_mensuel_marque=None, token_counts=None):
+    """
+    Calcule en une passe tous les KPIs pour une sélection.
+    `df_filtered` : sélection complète (période + filtres) ; `marche` / `marche_categorie` : références marché
+    de la période, entière et restreinte à la catégorie `cat` (voir market_baselines / market_baseline).
+    `rappels_mensuels` : rappels par mois de la sélection, recalculés depuis les lignes si absents ;
+    `imr_mensuel_marque` : IMR mensuel de la marque sur le marché de la période (volatilité IMR).
+    `token_counts` : {colonne multi-valeurs: effectifs par token} déjà calculés (ponts indexes.TokenBridge).
+    Fonction pure (sans Streamlit) : le résultat peut être mis en cache par état des filtres.
+    """
+    total_rappels = len(df_filtered)
+    if total_rappels == 0:
+        raise ValueError("Aucun rappel dans la sélection.")
+
+    token_counts = dict(token_counts or {})
+    for col in ("risques_encourus", "distributeurs"):
+        if col not in token_counts and col in df_filtered.columns:
+            token_counts[col] = indexes.token_value_counts(df_filtered[col])
+
+    # Risque principal
+    risque_principal = "N/A"
+    risque_counts = token_counts.get("risques_encourus", pd.Series(dtype="int64"))
+    if not risque_counts.empty:
+        risque_major = risque_counts.index[0]
+        # Tronque le texte si "Listeria Monocytogenes" est présent
+        risque_principal = "Listeria Monocytogenes" if "listeria monocytogenes" in risque_major.lower() else risque_major.title()
+
+    # Délai Moyen (DM) entre début de commercialisation et publication, et Délai d'Alerte Précoce (DAP)
+    dm_jours, dap = None, 0.0
+    if "date_debut_commercialisation" in df_filtered.columns:
+        duree = (df_filtered["date_publication"] - df_filtered["date_debut_commercialisation"]).dt.days.dropna()
+        duree = duree[duree >= 0]
+        if not duree.empty:
+            dm_jours = float(duree.mean())
+            dap = (duree <= DAP_MAX_JOURS).sum() / total_rappels * 100
+
+    # IMR de la marque filtrée et du marché de la période, IPC
+    imr_marque, cout_marque, avg_gravite = calculate_imr(df_filtered)
+    imr_marche = marche["IMR"]
+    ipc = imr_marque / imr_marche if imr_marche > 0 else 0.0
+
+    has_risques = "risques_encourus" in df_filtered.columns
+    has_motifs = "motif_du_rappel" in df_filtered.columns
+    pc_risques_graves = float(df_filtered["is_risque_grave"].sum() / total_rappels * 100) if has_risques else None
+    tifc = df_filtered["is_cause_fournisseur"].sum() / total_rappels * 100 if has_motifs else 0.0
+    tal = df_filtered["is_cause_logistique"].sum() / total_rappels * 100 if has_motifs else 0.0
+
+    # Indice de Sévérité du Risque (ISR) : gravité moyenne pondérée par la part de la catégorie sélectionnée
+    isr = 0.0
+    if "categorie_de_produit" in df_filtered.columns:
+        count_cat = (df_filtered["categorie_de_produit"] == cat).sum() if cat != filters.TOUTES else total_rappels
+        isr = avg_gravite * (count_cat / total_rappels) * 10
+
+    # Volatilité IMR (écart-type de l'IMR mensuel de la marque sur la période)
+    imr_std = 0.0
+    if marque != filters.TOUTES and imr_mensuel_marque is not None and len(imr_mensuel_marque) > 1:
+        imr_std = imr_mensuel_marque.std()
+
+    # Taux de Récurrence des Causes Racines (TRCR) - Simulé : 15% dès 2 cas de Listeria, Salmonella ou E.Coli
+    trcr = 0.0
+    if has_risques:
+        trcr = 15.0 if df_filtered["is_recurrence"].sum() >= TRCR_SEUIL_RECURRENCE else 2.0
+
+    # Ratio Risque/Opportunité (RRO) : IMR marque / IMR de la catégorie sur le marché de la période
+    rro = 0.0
+    if "categorie_de_produit" in df_filtered.columns:
+        marche_categorie = marche_categorie if marche_categorie is not None else baseline_row(0, 0)
+        imr_cat_marche = marche_categorie["IMR"] if cat != filters.TOUTES else imr_marche
+        if imr_cat_marche > 0 and cat != filters.TOUTES and marche_categorie["Rappels"] > 0:
+            rro = imr_marque / imr_cat_marche
+        else:
+            rro = imr_marque * 0.5 / 10
+
+    densite_distributeurs = None
+    if "distributeurs" in token_counts:
+        distrib_counts = token_counts["distributeurs"]
+        densite_distributeurs = distrib_counts.mean() if not distrib_counts.empty else 0.0
+
+    diversite_risques = int(len(risque_counts)) if not risque_counts.empty else None
+
+    rappels_par_mois = rappels_mensuels if rappels_mensuels is not None else df_filtered.groupby(df_filtered["date_publication"].dt.to_period("M")).size()
+    volatilite_mensuelle = rappels_par_mois.std() if len(rappels_par_mois) > 1 else 0.0
+
+    # RMPC (Simulé) : gravité moyenne du motif le plus grave
+    rmpc = None
+    if has_motifs and has_risques:
+        motif_graves = df_filtered["score_gravite"].groupby(df_filtered["motif_du_rappel"], observed=True).mean()
+        rmpc = motif_graves.max() * 10 if not motif_graves.empty else 0.0
+
+    return KpiBundle(
+        total_rappels=total_rappels,
+        imr_marque=float(imr_marque),
+        cout_marque=float(cout_marque),
+        imr_marche=float(imr_marche),
+        ipc=float(ipc),
+        pc_risques_graves=pc_risques_graves,
+        tifc=float(tifc),
+        isr=float(isr),
+        dm_jours=dm_jours,
+        dap=float(dap),
+        tal=float(tal),
+        imr_std=float(imr_std),
+        trcr=float(trcr),
+        rro=float(rro),
+        risque_principal=risque_principal,
+        densite_distributeurs=None if densite_distributeurs is None else float(densite_distributeurs),
+        diversite_risques=diversite_risques,
+        volatilite_mensuelle=float(volatilite_mensuelle),
+        rmpc=None if rmpc is None else float(rmpc),
+    )
+
+
+def kpi_table(df_calc, col, marche, marches_categorie=None, token_counts=None):
+    """
+    Champs de KpiBundle pour chaque valeur de `col` d'une sélection, en passes groupées plutôt qu'un compute_kpis
+    par valeur (mêmes résultats) : une marque est traitée comme compute_kpis(marque=valeur, imr_mensuel_marque=son
+    IMR mensuel), une catégorie comme compute_kpis(cat=valeur). Effectifs et sommes par valeur (bincount), IMR,
+    coût et IPC par league_table ; séries mensuelles et gravité par motif en un groupby chacune.
+    `marches_categorie` : références marché de la période indexées par catégorie (market_baselines) ;
+    `token_counts` : {colonne multi-valeurs: effectifs par (valeur, token)} (TokenBridge.counts_by), recalculés sinon.
+    Une ligne par valeur présente, dans l'ordre de première apparition.
+    """
+    codes, values = pd.factorize(df_calc[col])
+    present = codes >= 0
+    group_codes = codes[present]
+    n_values = len(values)
+
+    def per_value(weights):
+        return np.bincount(group_codes, weights=np.asarray(weights, dtype=np.float64)[present], minlength=n_values)
+
+    rappels = np.bincount(group_codes, minlength=n_values)
+    has_risques = "risques_encourus" in df_calc.columns
+    has_motifs = "motif_du_rappel" in df_calc.columns
+    has_categories = "categorie_de_produit" in df_calc.columns
+    zeros = np.zeros(n_values)
+    nones = np.full(n_values, None, dtype=object)
+
+    # IMR, coût et IPC : même calcul vectorisé que le classement des marques (score de gravité = 1 + grave)
+    graves = per_value(df_calc["is_risque_grave"]).astype(np.int64)
+    table = league_table(pd.DataFrame({"Rappels": rappels, "Graves": graves}), marche)
+    imr = table["IMR"].to_numpy() if has_risques else zeros
+    gravite = table["Gravite_Moyenne"].to_numpy() if has_risques else zeros
+    imr_marche = marche["IMR"]
+
+    dm_jours, dap = nones, zeros
+    if "date_debut_commercialisation" in df_calc.columns:
+        duree = (df_calc["date_publication"] - df_calc["date_debut_commercialisation"]).dt.days.to_numpy(dtype=np.float64, na_value=np.nan)
+        valide = duree >= 0 # Faux pour les durées manquantes
+        n_valides = per_value(valide)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dm_jours = np.where(n_valides > 0, per_value(np.where(valide, duree, 0.0)) / n_valides, np.nan)
+        dm_jours = np.array([None if np.isnan(d) else float(d) for d in dm_jours], dtype=object)
+        dap = per_value(valide & (duree <= DAP_MAX_JOURS)) / rappels * 100
+
+    # Rappels et IMR par mois de chaque valeur
+    groupe = pd.Series(codes, index=df_calc.index)
+    mois = df_calc["date_publication"].dt.tz_localize(None).dt.to_period("M")
+    mensuel = df_calc["score_gravite"].groupby([groupe, mois]).agg(["size", "mean"]).loc[lambda m: m.index.get_level_values(0) >= 0]
+    volatilite = mensuel["size"].groupby(level=0).std().reindex(range(n_values)).fillna(0.0).to_numpy()
+    imr_std = zeros
+    if col == "nom_marque_du_produit":
+        imr_std = (mensuel["mean"] * 10).groupby(level=0).std().reindex(range(n_values)).fillna(0.0).to_numpy()
+
+    # RRO : IMR de la catégorie face à la catégorie sur le marché de la période ; repli pour une marque
+    rro = zeros
+    if has_categories:
+        rro = imr * 0.5 / 10
+        if col == "categorie_de_produit" and marches_categorie is not None:
+            marche_cat = marches_categorie.reindex(values)
+            imr_cat = marche_cat["IMR"].to_numpy(dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rro = np.where((imr_cat > 0) & (marche_cat["Rappels"].to_numpy(dtype=np.float64) > 0), imr / imr_cat, rro)
+
+    rmpc = nones
+    if has_motifs and has_risques:
+        motif_graves = df_calc["score_gravite"].groupby([groupe, df_calc["motif_du_rappel"]], observed=True).mean()
+        rmpc_valeurs = motif_graves.groupby(level=0).max().reindex(range(n_values)).fillna(0.0) * 10
+        rmpc = rmpc_valeurs.to_numpy().astype(object)
+
+    # Indicateurs des colonnes multi-valeurs : effectifs par (valeur, token), dans l'ordre de TokenBridge.counts
+    token_counts = dict(token_counts or {})
+    for multi in ("risques_encourus", "distributeurs"):
+        if multi not in token_counts and multi in df_calc.columns:
+            token_counts[multi] = indexes.TokenBridge.from_series(df_calc[multi]).counts_by(codes, groups=values)
+
+    risque_principal = np.full(n_values, "N/A", dtype=object)
+    diversite_risques = nones
+    if "risques_encourus" in token_counts:
+        risques = token_counts["risques_encourus"]
+        par_valeur = risques.groupby(level=0, sort=False)
+        principal = par_valeur.head(1).reset_index(level=1)["token"]
+        principal = principal.map(lambda r: "Listeria Monocytogenes" if "listeria monocytogenes" in r.lower() else r.title())
+        risque_principal = principal.reindex(values).fillna("N/A").to_numpy(dtype=object)
+        diversite = par_valeur.size().reindex(values)
+        diversite_risques = np.array([None if pd.isna(n) else int(n) for n in diversite], dtype=object)
+
+    densite_distributeurs = nones
+    if "distributeurs" in token_counts:
+        densite = token_counts["distributeurs"].groupby(level=0, sort=False).mean().reindex(values).fillna(0.0)
+        densite_distributeurs = densite.to_numpy().astype(object)
+
+    return pd.DataFrame({
+        "total_rappels": rappels,
+        "imr_marque": imr,
+        "cout_marque": table["Cout_Implicite"].to_numpy(dtype=np.float64) if has_risques else zeros,
+        "imr_marche": float(imr_marche),
+        "ipc": imr / imr_marche if imr_marche > 0 else zeros,
+        "pc_risques_graves": (graves / rappels * 100).astype(object) if has_risques else nones,
+        "tifc": per_value(df_calc["is_cause_fournisseur"]) / rappels * 100 if has_motifs else zeros,
+        "isr": gravite * 10 if has_categories else zeros,
+        "dm_jours": dm_jours,
+        "dap": dap,
+        "tal": per_value(df_calc["is_cause_logistique"]) / rappels * 100 if has_motifs else zeros,
+        "imr_std": imr_std,
+        "trcr": np.where(per_value(df_calc["is_recurrence"]) >= TRCR_SEUIL_RECURRENCE, 15.0, 2.0) if has_risques else zeros,
+        "rro": rro,
+        "risque_principal": risque_principal,
+        "densite_distributeurs": densite_distributeurs,
+        "diversite_risques": diversite_risques,
+        "volatilite_mensuelle": volatilite,
+        "rmpc": rmpc,
+    }, index=pd.Index(np.asarray(values, dtype=object), name=col))
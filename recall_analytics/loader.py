@@ -0,0 +1,391 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as pa_feather
+except ImportError: # pyarrow absent : pas de cache disque, rechargement depuis le CSV
+    pa_feather = None
+
+
+# --- SCHÉMA DU JEU DE DONNÉES RAPPELCONSO ---
+# Correspondance entre les noms de colonnes de l'export (v1/v2) et les noms utilisés par le dashboard
+COLUMN_MAPPING = {
+    "categorie_produit": "categorie_de_produit",
+    "marque_produit": "nom_marque_du_produit",
+    "motif_rappel": "motif_du_rappel",
+    "numero_fiche": "reference_fiche",
+    "lien_vers_la_fiche_rappel": "liens_vers_la_fiche_rappel",
+    "date_debut_commercialisation_produit": "date_debut_commercialisation",
+    "nom_fabricant_ou_marque": "nom_marque_du_produit",
+    "denomination_sociale_du_producteur": "nom_marque_du_produit" # Ajout potentiel
+}
+
+REQUIRED_COLUMNS = ["categorie_de_produit", "nom_marque_du_produit", "motif_du_rappel", "distributeurs", "date_publication"]
+
+# Colonnes texte normalisées (minuscules, séparateur multi-valeurs unifié en ";")
+TEXT_COLUMNS = ["distributeurs", "zone_geographique_de_vente", "risques_encourus", "motif_du_rappel", "categorie_de_produit", "nom_marque_du_produit", "identifiant_de_l_etablissement_d_ou_provient_le_produit", "etat_fiche", "denomination_vente", "sous_categorie_produit"]
+
+DATE_COLUMNS = ["date_publication", "date_debut_commercialisation"]
+
+# Seules colonnes lues par le dashboard (filtres, KPIs, graphiques, registre) : les autres sont écartées au chargement
+USED_COLUMNS = ["reference_fiche", "liens_vers_la_fiche_rappel"] + DATE_COLUMNS + TEXT_COLUMNS
+
+# Une colonne texte est encodée en dictionnaire (category) si son nombre de valeurs distinctes
+# reste inférieur à cette fraction du nombre de lignes renseignées
+CATEGORY_MAX_RATIO = 0.5
+
+
+# --- LECTURE EN FLUX DE L'EXPORT (BLOCS DE LIGNES, COLONNES UTILES SEULEMENT) ---
+# Nombre de lignes lues par bloc : borne la mémoire de travail du chargement, quelle que soit la taille de l'export
+CHUNK_ROWS = 50_000
+
+
+def sniff_separator(file_path, sample_bytes=64 * 1024):
+    """Détermine le séparateur (';' ou ',') sur la ligne d'en-tête, sans lire le reste du fichier."""
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        header = f.readline(sample_bytes)
+    return ";" if ";" in header else ","
+
+
+def read_export_csv(file_path):
+    """Lit l'export CSV RappelConso en gérant les séparateurs ';' et ','."""
+    df = pd.read_csv(file_path, sep=sniff_separator(file_path), encoding='utf-8')
+    if df.empty or df.shape[1] <= 1:
+        raise ValueError("Le fichier ne contient pas de données.")
+    return df
+
+
+def export_columns(file_path, sep):
+    """
+    Colonnes de l'export à lire, associées à leur nom dans le schéma du dashboard (USED_COLUMNS) :
+    seul l'en-tête est lu. Comme rename_columns, la première colonne source d'une même cible est retenue.
+    """
+    header = pd.read_csv(file_path, sep=sep, encoding='utf-8', nrows=0).columns
+    if len(header) <= 1:
+        raise ValueError("Le fichier ne contient pas de données.")
+    columns = {}
+    for source in header:
+        target = COLUMN_MAPPING.get(source, source)
+        if target in USED_COLUMNS and target not in columns.values():
+            columns[source] = target
+    return columns
+
+
+def iter_export_chunks(file_path, sep, columns, chunk_rows=CHUNK_ROWS):
+    """
+    Lit l'export par blocs de `chunk_rows` lignes, limité aux colonnes `columns` (voir export_columns) et typé
+    en texte, puis renomme et convertit les dates de chaque bloc ; le texte reste brut (voir normalize_text_codes).
+    Produit (bloc, occupation mémoire brute du bloc par colonne, en octets).
+    """
+    reader = pd.read_csv(file_path, sep=sep, encoding='utf-8', usecols=list(columns),
+                         dtype={col: str for col in columns}, chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            chunk = chunk.rename(columns=columns)
+            raw_bytes = chunk.memory_usage(deep=True, index=False)
+            yield parse_dates(chunk, sort=False), raw_bytes
+
+
+class CompactColumn:
+    """
+    Colonne texte construite bloc par bloc. Tant que ses valeurs distinctes restent sous CATEGORY_MAX_RATIO
+    des lignes renseignées, seuls les codes entiers et le dictionnaire sont conservés ; au-delà (identifiants,
+    liens), les blocs texte sont gardés tels quels. Le typage final suit la même règle que compact_dataframe.
+    """
+
+    def __init__(self):
+        self.n_valides = 0
+        self._categories = None
+        self._codes = []
+        self._parts = None
+
+    def append(self, codes, values):
+        """Ajoute un bloc donné par ses codes (-1 : valeur manquante) et son dictionnaire `values` (Index)."""
+        self.n_valides += int((codes >= 0).sum())
+        if self._parts is not None:
+            self._parts.append(decode_text(codes, values))
+            return
+
+        if self._categories is None:
+            self._categories = values[:0]
+        positions = self._categories.get_indexer(values)
+        new = positions < 0
+        positions[new] = len(self._categories) + np.arange(int(new.sum()))
+        self._categories = self._categories.append(values[new])
+        # Le code -1 (valeur manquante) pointe sur le -1 final
+        self._codes.append(np.append(positions, -1).astype(np.int32)[codes])
+
+        if len(self._categories) > self.n_valides * CATEGORY_MAX_RATIO:
+            # Trop de valeurs distinctes pour un dictionnaire : retour aux blocs texte
+            self._parts = [decode_text(c, self._categories) for c in self._codes]
+            self._categories, self._codes = None, []
+
+    def to_series(self, order):
+        """Colonne finale dans l'ordre `order`, typée comme compact_dataframe (category ou string)."""
+        if self._parts is not None:
+            s = pd.concat(self._parts, ignore_index=True).take(order).reset_index(drop=True)
+            self._parts = None
+            if self.n_valides and s.nunique(dropna=True) <= self.n_valides * CATEGORY_MAX_RATIO:
+                return s.astype("category")
+            return s.astype("string")
+
+        codes = np.concatenate(self._codes)[order]
+        sorter = self._categories.argsort()
+        rank = np.empty(len(sorter) + 1, dtype=np.int32)
+        rank[sorter] = np.arange(len(sorter), dtype=np.int32)
+        rank[-1] = -1
+        s = pd.Series(pd.Categorical.from_codes(rank[codes], categories=self._categories.take(sorter)))
+        if self.n_valides and len(sorter) <= self.n_valides * CATEGORY_MAX_RATIO:
+            return s
+        return s.astype("string")
+
+
+def read_export_compact(file_path, sep, columns, chunk_rows=CHUNK_ROWS):
+    """
+    Chargement en flux de l'export : chaque bloc normalisé est ajouté aux colonnes compactes (codes + dictionnaire)
+    puis libéré, de sorte que seul un bloc brut est en mémoire à la fois. Résultat identique à
+    read_export_csv -> rename_columns -> parse_dates -> normalize_text_columns -> compact_dataframe.
+    Retourne (df, occupation mémoire brute estimée par colonne, en octets).
+    """
+    builders = {}
+    dates = {}
+    raw_bytes = None
+    n_rows = 0
+    for chunk, chunk_bytes in iter_export_chunks(file_path, sep, columns, chunk_rows):
+        n_rows += len(chunk)
+        raw_bytes = chunk_bytes if raw_bytes is None else raw_bytes.add(chunk_bytes, fill_value=0)
+        for col in chunk.columns:
+            if col in DATE_COLUMNS:
+                dates.setdefault(col, []).append(chunk[col])
+            elif col in TEXT_COLUMNS:
+                # Nettoyage sur le dictionnaire du bloc : les lignes ne sont manipulées que par leurs codes
+                builders.setdefault(col, CompactColumn()).append(*normalize_text_codes(chunk[col]))
+            else:
+                codes, values = pd.factorize(chunk[col])
+                builders.setdefault(col, CompactColumn()).append(codes, pd.Index(values))
+    if not n_rows:
+        raise ValueError("Le fichier ne contient pas de données.")
+
+    dates = {col: pd.concat(parts, ignore_index=True) for col, parts in dates.items()}
+    if "date_publication" in dates:
+        order = dates["date_publication"].sort_values(ascending=False).index.to_numpy()
+    else:
+        order = np.arange(n_rows)
+
+    compact = {}
+    for col in USED_COLUMNS:
+        if col in dates:
+            compact[col] = dates[col].take(order).reset_index(drop=True)
+        elif col in builders:
+            compact[col] = builders[col].to_series(order)
+    return pd.DataFrame(compact), raw_bytes
+
+
+def rename_columns(df):
+    """Renomme les colonnes de l'export vers le schéma du dashboard."""
+    rename_dict = {old_name: new_name for old_name, new_name in COLUMN_MAPPING.items() if old_name in df.columns and old_name != new_name}
+    df = df.rename(columns=rename_dict)
+    # Plusieurs colonnes sources peuvent pointer vers la même cible : on garde la première
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def normalize_text_values(values):
+    """Règles de nettoyage d'une colonne texte : minuscules, séparateur multi-valeurs ';', espaces, 'nan'/'' -> NA."""
+    return (pd.Series(values).astype(str)
+                             .str.lower()
+                             .str.replace("|", ";", regex=False)
+                             .str.replace(", ", ";", regex=False)
+                             .str.strip()
+                             .replace('nan', '', regex=False)
+                             .replace('', pd.NA)
+    )
+
+
+def normalize_text_codes(s):
+    """
+    Normalise une colonne texte sur ses seules valeurs distinctes : factorisation, nettoyage du dictionnaire, puis
+    refactorisation (deux valeurs brutes peuvent se confondre une fois nettoyées, ex : casse).
+    Retourne (codes int32 par ligne, -1 pour une valeur manquante ; dictionnaire des valeurs normalisées (Index)).
+    """
+    codes, uniques = pd.factorize(s)
+    clean_codes, values = pd.factorize(normalize_text_values(uniques))
+    # Le code -1 (valeur manquante) pointe sur le -1 final
+    mapping = np.append(clean_codes, -1).astype(np.int32)
+    return mapping[codes], pd.Index(values)
+
+
+def decode_text(codes, values, index=None):
+    """Reconstruit la colonne texte (même type que le dictionnaire) à partir des codes et du dictionnaire."""
+    return pd.Series(values.array.take(codes, allow_fill=True), index=index)
+
+
+def normalize_text_columns(df):
+    """
+    Met en minuscules les colonnes texte et unifie les séparateurs multi-valeurs en ';'. Le nettoyage porte sur
+    les valeurs distinctes (normalize_text_codes) : son coût suit la cardinalité des colonnes, pas leur longueur.
+    """
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            codes, values = normalize_text_codes(df[col])
+            df[col] = decode_text(codes, values, index=df.index)
+    return df
+
+
+def parse_dates(df, sort=True):
+    """Convertit les colonnes de dates en datetime UTC et trie (si `sort`) par date de publication décroissante."""
+    if "date_publication" in df.columns:
+        df["date_publication"] = pd.to_datetime(df["date_publication"], errors="coerce", utc=True)
+        if sort:
+            df = df.sort_values(by="date_publication", ascending=False)
+
+    if "date_debut_commercialisation" in df.columns:
+        df["date_debut_commercialisation"] = pd.to_datetime(df["date_debut_commercialisation"], errors="coerce", utc=True)
+    return df
+
+
+def compact_dataframe(df):
+    """
+    Réduit l'empreinte mémoire du jeu de données chargé :
+    projection sur USED_COLUMNS, encodage dictionnaire (category) des colonnes texte répétitives
+    et index positionnel (0..n-1) pour que les index/bitmaps puissent adresser les lignes par position.
+    """
+    df = df[[c for c in USED_COLUMNS if c in df.columns]]
+
+    compact = {}
+    for col in df.columns:
+        s = df[col]
+        if col in DATE_COLUMNS:
+            compact[col] = s
+            continue
+        n_valides = s.count()
+        if n_valides and s.nunique(dropna=True) <= n_valides * CATEGORY_MAX_RATIO:
+            compact[col] = s.astype("category")
+        else:
+            compact[col] = s.astype("string")
+
+    return pd.DataFrame(compact).reset_index(drop=True)
+
+
+def memory_report(before, df_after):
+    """
+    Compare l'occupation mémoire (Mo) par colonne avant/après compaction ; `before` est le DataFrame brut
+    ou, pour un chargement par blocs, l'occupation brute déjà mesurée par colonne (octets).
+    """
+    if isinstance(before, pd.DataFrame):
+        before = before.memory_usage(deep=True, index=False)
+    before = before / 1024 ** 2
+    after = df_after.memory_usage(deep=True, index=False) / 1024 ** 2
+    report = pd.DataFrame({
+        "Type": df_after.dtypes.astype(str),
+        "Avant_Mo": before.reindex(df_after.columns),
+        "Apres_Mo": after,
+    })
+    report.loc["TOTAL"] = ["", before.sum(), after.sum()]
+    return report.round(2)
+
+
+def source_stamp(file_path):
+    """Empreinte rapide du fichier source (taille + date de modification), sans lecture du contenu."""
+    stat = os.stat(file_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def content_hash(file_path, block_size=1024 * 1024):
+    """Hash du contenu du fichier source, lu par blocs."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# --- CACHE COLONNAIRE SUR DISQUE (ARROW IPC / FEATHER) ---
+# Le DataFrame nettoyé et typé est persisté à côté de l'export source. Incrémenter CACHE_FORMAT_VERSION
+# dès que la normalisation ou le schéma produit change pour invalider les caches existants.
+CACHE_DIR_NAME = ".recall_cache"
+CACHE_FORMAT_VERSION = 2
+
+
+def pipeline_signature(*parts):
+    """Signature du pipeline de nettoyage (version du format + configuration, ex : taxonomie)."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(repr((CACHE_FORMAT_VERSION,) + parts).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _cache_paths(file_path):
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    base = os.path.basename(file_path)
+    return cache_dir, os.path.join(cache_dir, base + ".arrow"), os.path.join(cache_dir, base + ".json")
+
+
+def read_frame_cache(file_path, signature):
+    """
+    Relit le DataFrame nettoyé depuis le cache Arrow (memory-map) s'il correspond encore au fichier source.
+    Taille + mtime identiques : cache valide sans relire la source. Sinon le contenu est haché, et un
+    fichier seulement « touché » (même contenu) réutilise le cache.
+    Retourne (df, manifest) ou (None, manifest_source) ; manifest_source porte le hash déjà calculé.
+    """
+    if pa_feather is None:
+        return None, None
+    _, arrow_path, manifest_path = _cache_paths(file_path)
+    stat = os.stat(file_path)
+    source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "signature": signature}
+
+    manifest = None
+    if os.path.exists(manifest_path) and os.path.exists(arrow_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = None
+
+    if manifest is None or manifest.get("signature") != signature:
+        return None, source
+
+    if manifest.get("size") != source["size"] or manifest.get("mtime_ns") != source["mtime_ns"]:
+        source["content_hash"] = content_hash(file_path)
+        if manifest.get("content_hash") != source["content_hash"]:
+            return None, source
+        # Même contenu, simple changement de mtime : on met à jour le manifeste
+        manifest.update(size=source["size"], mtime_ns=source["mtime_ns"])
+        _write_json_atomic(manifest_path, manifest)
+
+    try:
+        table = pa_feather.read_table(arrow_path, memory_map=True)
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+    except Exception:
+        return None, source
+    return df, manifest
+
+
+def write_frame_cache(df, file_path, source, extra=None):
+    """Écrit le DataFrame nettoyé dans le cache Arrow (non compressé pour permettre le memory-map)."""
+    if pa_feather is None or source is None:
+        return None
+    cache_dir, arrow_path, manifest_path = _cache_paths(file_path)
+    manifest = dict(source)
+    if "content_hash" not in manifest:
+        manifest["content_hash"] = content_hash(file_path)
+    manifest.update(extra or {})
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = arrow_path + ".tmp"
+        pa_feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, arrow_path)
+        _write_json_atomic(manifest_path, manifest)
+    except OSError:
+        # Dossier en lecture seule : le dashboard fonctionne sans cache disque
+        return None
+    return manifest
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,139 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+
+# --- INSTRUMENTATION DES ÉTAPES (SPANS DE CHRONOMÉTRAGE) ---
+class Span:
+    """Mesure en cours : `rows` peut être renseigné dans le bloc une fois le nombre de lignes traitées connu."""
+    __slots__ = ("name", "rows")
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+
+_NULL_SPAN = nullcontext(Span("")) # Partagé par tous les spans désactivés : aucun coût hormis l'appel
+
+
+class PerfRecorder:
+    """
+    Spans de chronométrage des étapes d'un rerun (durée, lignes traitées, pic d'allocation), cumulés par session.
+    Désactivé, `span()` renvoie un contexte vide partagé. Le suivi des allocations (tracemalloc) est optionnel :
+    il ralentit tout le processus et ses pics incluent les allocations des sessions concurrentes.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.last_run = []
+        self.totals = {}
+        self.runs = 0
+        self.fragment = None # Fragment (st.fragment) relancé seul par le dernier rerun, None pour un rerun complet
+        self._depth = 0
+        self._peaks = [] # Pic absolu observé par span ouvert (les spans imbriqués réinitialisent le pic du processus)
+        self._started_tracing = False
+
+    def start_run(self, enabled, trace_memory=False):
+        """Début d'un rerun complet : applique la configuration et vide les mesures du rerun précédent."""
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        elif not self.trace_memory and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._begin(None)
+
+    def start_fragment(self, name):
+        """
+        Entrée d'un fragment. Pendant un rerun complet, le fragment s'exécute dans le span de son onglet et ses
+        étapes appartiennent à ce rerun ; hors de tout span, c'est un rerun du fragment seul : ses étapes forment
+        un nouveau rerun (étiqueté `name`) au lieu de s'ajouter à celles du rerun complet précédent.
+        """
+        if self._depth == 0:
+            self._begin(name)
+
+    def _begin(self, fragment):
+        self.last_run = []
+        self.fragment = fragment
+        self._depth = 0
+        self._peaks = []
+        if self.enabled:
+            self.runs += 1
+
+    def span(self, name, rows=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._measure(name, rows)
+
+    @contextmanager
+    def _measure(self, name, rows):
+        span = Span(name, rows)
+        record = {"etape": name, "profondeur": self._depth, "rerun": self.runs, "fragment": self.fragment}
+        self.last_run.append(record) # Ordre d'ouverture : les étapes imbriquées suivent leur parent
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        self._depth += 1
+        debut = time.perf_counter()
+        try:
+            yield span
+        finally:
+            duree = time.perf_counter() - debut
+            self._depth -= 1
+            pic = None
+            if tracing:
+                pic = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1]) - base
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], pic + base)
+            record.update(duree_s=duree, lignes=span.rows, pic_octets=pic)
+            self._accumulate(name, duree, span.rows, pic)
+
+    def _accumulate(self, name, duree, rows, pic):
+        total = self.totals.setdefault(name, {"appels": 0, "total_s": 0.0, "max_s": 0.0, "lignes": 0, "pic_octets": None})
+        total["appels"] += 1
+        total["total_s"] += duree
+        total["max_s"] = max(total["max_s"], duree)
+        total["lignes"] += rows or 0
+        if pic is not None:
+            total["pic_octets"] = max(total["pic_octets"] or 0, pic)
+
+    def reset(self):
+        self.totals = {}
+        self.runs = 0
+
+    def last_run_frame(self):
+        """Étapes du dernier rerun (indentées selon l'imbrication), durées en ms."""
+        frame = pd.DataFrame(self.last_run, columns=["etape", "profondeur", "duree_s", "lignes", "pic_octets"])
+        return pd.DataFrame({
+            "Étape": ["· " * p + e for p, e in zip(frame["profondeur"], frame["etape"])],
+            "Durée (ms)": frame["duree_s"] * 1000,
+            "Lignes": frame["lignes"],
+            "Pic mémoire (Mo)": frame["pic_octets"] / 1024 ** 2,
+        })
+
+    def totals_frame(self):
+        """Cumul par étape sur la session, trié par temps total décroissant."""
+        frame = pd.DataFrame.from_dict(self.totals, orient="index", columns=["appels", "total_s", "max_s", "lignes", "pic_octets"])
+        frame = frame.sort_values("total_s", ascending=False)
+        return pd.DataFrame({
+            "Appels": frame["appels"],
+            "Total (ms)": frame["total_s"] * 1000,
+            "Moyenne (ms)": frame["total_s"] / frame["appels"] * 1000,
+            "Max (ms)": frame["max_s"] * 1000,
+            "Lignes": frame["lignes"],
+            "Pic mémoire (Mo)": frame["pic_octets"].astype(float) / 1024 ** 2,
+        }, index=pd.Index(frame.index, name="Étape"))
+
+    def to_json(self):
+        return json.dumps({"reruns": self.runs, "fragment": self.fragment, "dernier_rerun": self.last_run, "cumul": self.totals},
+                          ensure_ascii=False, indent=2)
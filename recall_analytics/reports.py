@@ -0,0 +1,170 @@
+import argparse
+import dataclasses
+import hashlib
+import html
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from . import dataset
+from . import engine
+from . import filters
+from . import kpis
+from . import zones
+
+
+# --- RAPPORTS PAR LOTS : FICHES KPI DE TOUTES LES MARQUES ET CATÉGORIES (SANS STREAMLIT) ---
+# Dimension -> (libellé, sous-dossier des pages HTML)
+DIMENSIONS = {
+    "nom_marque_du_produit": ("Marque", "marques"),
+    "categorie_de_produit": ("Catégorie", "categories"),
+}
+
+# État d'un processus de calcul : moteur sur le jeu chargé une fois (cache Arrow en mémoire partagée), références marché
+_WORKER = {}
+
+
+def load_source(csv_path=None, store_dir=None):
+    if store_dir:
+        df, _ = dataset.load_store(store_dir)
+    else:
+        df, _, _ = dataset.load_csv(csv_path)
+    return df
+
+
+def _set_worker(analytics, now, baselines):
+    _WORKER.clear()
+    _WORKER.update(analytics=analytics, now=now, baselines=baselines)
+
+
+def _init_worker(csv_path, store_dir, now, baselines):
+    _set_worker(engine.AnalyticsEngine(load_source(csv_path, store_dir)), now, baselines)
+
+
+def _scorecards(periode, col):
+    """
+    Fiches KPI (champs de kpis.KpiBundle, comme le dashboard) de toutes les valeurs de `col` sur une période,
+    en passes groupées (kpis.kpi_table) ; effectifs des tokens par valeur lus sur les ponts du moteur.
+    """
+    analytics, baselines = _WORKER["analytics"], _WORKER["baselines"]
+    selection = analytics.period(periode, _WORKER["now"])
+    frame = selection.frame
+    codes, values = pd.factorize(frame[col])
+    token_counts = {c: analytics.token_bridges[c].counts_by(codes, selection, groups=values)
+                    for c in ("risques_encourus", "distributeurs") if c in analytics.token_bridges}
+    marches_categorie = baselines.xs(periode, level="periode") if periode in baselines.index.get_level_values("periode") else None
+    table = kpis.kpi_table(frame, col, kpis.lookup_baseline(baselines, periode), marches_categorie, token_counts)
+    return table.reset_index(names="valeur").assign(periode=periode, dimension=col)
+
+
+def generate(csv_path=None, store_dir=None, periodes=None, dimensions=None, workers=None, now=None):
+    """
+    Fiches KPI de toutes les valeurs des dimensions demandées, pour chaque période : une ligne par
+    (période, dimension, valeur), colonnes = champs de kpis.KpiBundle. Chaque (période, dimension) est un
+    calcul groupé ; les calculs sont répartis entre `workers` processus (tous les cœurs par défaut, 1 = sans pool,
+    sur le jeu et le moteur déjà chargés).
+    """
+    periodes = list(periodes or filters.PERIODE_OPTIONS)
+    dimensions = list(dimensions or DIMENSIONS)
+    workers = workers or os.cpu_count() or 1
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+
+    # Le processus principal charge le jeu en premier : les processus de calcul relisent ensuite le cache Arrow
+    df = load_source(csv_path, store_dir)
+    analytics = engine.AnalyticsEngine(df)
+    baselines = analytics.market_baselines(now)
+    tasks = [(periode, col) for periode in periodes for col in dimensions
+             if col in df.columns and len(analytics.period(periode, now))]
+
+    if workers == 1 or len(tasks) <= 1:
+        _set_worker(analytics, now, baselines)
+        tables = [_scorecards(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                 initargs=(csv_path, store_dir, now, baselines)) as pool:
+            tables = list(pool.map(_scorecards, *zip(*tasks)))
+
+    if not tables:
+        return pd.DataFrame()
+    result = pd.concat(tables, ignore_index=True).infer_objects() # Indicateurs optionnels : None -> NaN, colonnes numériques
+    result = result[["periode", "dimension", "valeur"] + [f.name for f in dataclasses.fields(kpis.KpiBundle)]]
+    result["periode"] = pd.Categorical(result["periode"], categories=periodes)
+    result["dimension"] = pd.Categorical(result["dimension"], categories=dimensions)
+    return result.sort_values(["periode", "dimension", "total_rappels", "valeur"], ascending=[True, True, False, True], ignore_index=True)
+
+
+def write_columnar(scorecards, path):
+    """Écrit les fiches en Parquet (ou Feather si l'extension est .feather / .arrow)."""
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        raise ImportError("pyarrow est nécessaire pour écrire les rapports en format colonnaire.")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith((".feather", ".arrow")):
+        scorecards.to_feather(path)
+    else:
+        scorecards.to_parquet(path, index=False)
+
+
+def _slug(value):
+    """Nom de fichier stable pour une valeur (lisible, suffixe de hachage contre les collisions)."""
+    lisible = zones.normalize_name(value).replace(" ", "-")[:60] or "valeur"
+    return f"{lisible}-{hashlib.md5(str(value).encode('utf-8')).hexdigest()[:8]}"
+
+
+def _page(titre, corps):
+    return (f"<!DOCTYPE html><html lang=\"fr\"><head><meta charset=\"utf-8\"><title>{html.escape(titre)}</title>"
+            "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+            "td,th{border:1px solid #ccc;padding:4px 8px;text-align:right}th{background:#f4f4f4}</style></head>"
+            f"<body><h1>{html.escape(titre)}</h1>{corps}</body></html>")
+
+
+def write_html(scorecards, out_dir):
+    """Pages statiques : un index (classement par période et dimension) et une fiche par valeur, toutes périodes."""
+    colonnes = [c for c in scorecards.columns if c not in ("periode", "dimension", "valeur")]
+    index_corps = []
+    for col, (libelle, dossier) in DIMENSIONS.items():
+        lignes = scorecards[scorecards["dimension"] == col]
+        if lignes.empty:
+            continue
+        os.makedirs(os.path.join(out_dir, dossier), exist_ok=True)
+        liens = {}
+        for value, fiche in lignes.groupby("valeur", sort=False):
+            liens[value] = f"{dossier}/{_slug(value)}.html"
+            table = fiche.set_index("periode")[colonnes].T.to_html(float_format=lambda x: f"{x:.2f}", na_rep="N/A")
+            with open(os.path.join(out_dir, liens[value]), "w", encoding="utf-8") as f:
+                f.write(_page(f"{libelle} : {value}", table))
+        for periode, classement in lignes.groupby("periode", observed=True, sort=False):
+            classement = classement.assign(valeur=[f"<a href=\"{html.escape(liens[v])}\">{html.escape(str(v))}</a>" for v in classement["valeur"]])
+            table = classement.set_index("valeur")[colonnes].to_html(escape=False, float_format=lambda x: f"{x:.2f}", na_rep="N/A")
+            index_corps.append(f"<h2>{html.escape(libelle)} — {html.escape(str(periode))}</h2>{table}")
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(_page("Fiches KPI RappelConso", "".join(index_corps)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fiches KPI de toutes les marques et catégories (calcul parallèle).")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", default="rappelconso_export.csv", help="Export CSV RappelConso")
+    source.add_argument("--store", default=None, help="Magasin d'ingestion incrémentale (remplace --csv)")
+    parser.add_argument("--periode", action="append", choices=list(filters.PERIODE_OPTIONS), help="Période d'analyse (répétable ; toutes par défaut)")
+    parser.add_argument("--dimension", action="append", choices=list(DIMENSIONS), help="Dimension des fiches (répétable ; marques et catégories par défaut)")
+    parser.add_argument("--out", default="rapports/fiches_kpi.parquet", help="Fichier de sortie (.parquet, .feather ou .arrow)")
+    parser.add_argument("--html", default=None, help="Dossier des pages HTML statiques (optionnel)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (tous les cœurs par défaut)")
+    parser.add_argument("--date", default=None, help="Date de référence des fenêtres de période (ISO, maintenant par défaut)")
+    args = parser.parse_args(argv)
+
+    now = pd.Timestamp(args.date, tz="UTC") if args.date else None
+    debut = time.perf_counter()
+    scorecards = generate(args.csv, args.store, args.periode, args.dimension, args.workers, now)
+    write_columnar(scorecards, args.out)
+    if args.html:
+        write_html(scorecards, args.html)
+    print(f"{len(scorecards)} fiches écrites dans {args.out} en {time.perf_counter() - debut:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# --- RECHERCHE PLEIN TEXTE (INDEX INVERSÉ, BM25) ---
+# Colonnes indexées : chaque fiche est un document formé de ces champs
+SEARCH_COLUMNS = ["motif_du_rappel", "risques_encourus", "denomination_vente", "nom_marque_du_produit"]
+BM25_K1 = 1.2
+BM25_B = 0.75
+SEARCH_CACHE_ENTRIES = 32 # Requêtes récentes (positions et scores des fiches trouvées) conservées
+
+# Mots vides français (après suppression des accents) : ignorés à l'indexation comme dans les requêtes
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du en et il ils la le les leur lors mais ne ni non ou par pas pour qu que qui sa
+se ses son sont sur ta te tes un une vos votre est etre ete
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae", "ß": "ss"})
+
+
+def fold(text):
+    """Minuscules sans accents ni ligatures (« Œufs Pâtés » -> « oeufs pates »)."""
+    text = str(text).lower()
+    if text.isascii():
+        return text
+    # Décomposition NFKD puis abandon des signes diacritiques (et des autres caractères non ASCII, non indexés)
+    return unicodedata.normalize("NFKD", text.translate(_LIGATURES)).encode("ascii", "ignore").decode("ascii")
+
+
+def stem(word):
+    """
+    Racinisation légère du français (stemmer « minimal » de J. Savoy) : pluriels en -s/-x/-aux, finales -r/-e
+    et consonne doublée. Les mots de moins de 6 lettres sont laissés tels quels.
+    """
+    if len(word) < 6:
+        return word
+    if word[-1] == "x":
+        return word[:-2] + "l" if word.endswith("aux") else word[:-1]
+    for suffix in "sre":
+        if word[-1] == suffix:
+            word = word[:-1]
+    if word[-1] == word[-2] and word[-1].isalpha():
+        word = word[:-1]
+    return word
+
+
+def analyze(text):
+    """Termes indexés d'un texte : repli des accents, découpage alphanumérique, mots vides écartés, racinisation."""
+    return [stem(token) for token in TOKEN_RE.findall(fold(text)) if len(token) > 1 and token not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Index inversé terme -> valeurs distinctes de chaque colonne de SEARCH_COLUMNS. Le texte n'est analysé que sur
+    les valeurs distinctes ; une requête agrège les fréquences par valeur puis les propage aux lignes via les codes.
+    Classement BM25 ; chaque terme de la requête est aussi un préfixe (« listeri » trouve « listeria »), et une
+    fiche doit contenir tous les termes.
+    """
+
+    def __init__(self, df, columns=SEARCH_COLUMNS):
+        self.n_rows = len(df)
+        vocabulary = {}
+        fields = []
+        doc_len = np.zeros(self.n_rows, dtype=np.float32)
+        for col in columns:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            value_ids, term_ids, tfs = [], [], []
+            lengths = np.zeros(len(uniques) + 1, dtype=np.float32) # Le code -1 (valeur manquante) pointe sur le 0 final
+            for value_id, value in enumerate(uniques):
+                terms = analyze(value)
+                lengths[value_id] = len(terms)
+                for term, tf in Counter(terms).items():
+                    value_ids.append(value_id)
+                    term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                    tfs.append(tf)
+            doc_len += lengths[codes]
+
+            fields.append({
+                "codes": codes.astype(np.int32),
+                "n_values": len(uniques),
+                "term_ids": np.asarray(term_ids, dtype=np.int64),
+                "value_ids": np.asarray(value_ids, dtype=np.int32),
+                "tfs": np.asarray(tfs, dtype=np.float32),
+            })
+
+        # Termes renumérotés dans l'ordre alphabétique : les termes d'un préfixe forment une plage contiguë d'identifiants
+        self._terms = np.array(sorted(vocabulary), dtype=object)
+        renumber = np.empty(len(vocabulary), dtype=np.int64)
+        renumber[[vocabulary[t] for t in self._terms]] = np.arange(len(vocabulary))
+        for field in fields:
+            # Postings au format CSR : valeurs (et fréquences) des termes [a, b) dans [indptr[a], indptr[b])
+            term_ids = renumber[field.pop("term_ids")]
+            order = np.argsort(term_ids, kind="stable")
+            field["value_ids"] = field["value_ids"][order]
+            field["tfs"] = field["tfs"][order]
+            field["indptr"] = np.searchsorted(term_ids[order], np.arange(len(vocabulary) + 1))
+
+        self._fields = fields
+        # Normalisation BM25 de la longueur de chaque fiche, calculée une fois
+        avg_len = float(doc_len.mean()) if self.n_rows and doc_len.any() else 1.0
+        self._norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avg_len)).astype(np.float32)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prefix_range(self, term):
+        """Identifiants [start, stop) des termes du vocabulaire commençant par `term` (recherche dichotomique)."""
+        start = np.searchsorted(self._terms, term, side="left")
+        stop = np.searchsorted(self._terms, term + "\uffff", side="left")
+        return start, stop
+
+    def _term_frequencies(self, start, stop):
+        """Fréquence par ligne des termes [start, stop) (somme sur les champs)."""
+        tf = np.zeros(self.n_rows, dtype=np.float32)
+        for field in self._fields:
+            lo, hi = field["indptr"][start], field["indptr"][stop]
+            if lo == hi:
+                continue
+            weights = np.bincount(field["value_ids"][lo:hi], weights=field["tfs"][lo:hi], minlength=field["n_values"] + 1)
+            tf += weights.astype(np.float32)[field["codes"]]
+        return tf
+
+    def query(self, text):
+        """
+        Fiches contenant tous les termes de `text` : (positions croissantes, scores BM25), ou None si la requête
+        ne contient aucun terme indexable (vide, mots vides seuls).
+        """
+        terms = list(dict.fromkeys(analyze(text)))
+        if not terms:
+            return None
+        key = tuple(terms)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        matched = np.ones(self.n_rows, dtype=bool)
+        score = np.zeros(self.n_rows, dtype=np.float32)
+        for term in terms:
+            tf = self._term_frequencies(*self._prefix_range(term))
+            present = tf > 0
+            n_docs = int(np.count_nonzero(present))
+            matched &= present
+            idf = np.float32(np.log1p((self.n_rows - n_docs + 0.5) / (n_docs + 0.5)) * (BM25_K1 + 1))
+            score += idf * tf / (tf + self._norm) # Nul pour les fiches sans le terme
+        positions = np.flatnonzero(matched)
+        result = (positions.astype(np.int32), score[positions])
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > SEARCH_CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return result
+
+    def mask(self, text):
+        """Masque booléen des fiches trouvées (longueur n_rows), ou None si la requête ne filtre rien."""
+        result = self.query(text)
+        if result is None:
+            return None
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[result[0]] = True
+        return mask
+
+    def scores(self, text, positions):
+        """Scores BM25 des lignes `positions` (0 pour celles qui ne correspondent pas)."""
+        result = self.query(text)
+        if result is None:
+            return np.zeros(len(positions), dtype=np.float32)
+        dense = np.zeros(self.n_rows, dtype=np.float32)
+        dense[result[0]] = result[1]
+        return dense[positions]
+
+    def search(self, text, limit=20):
+        """Meilleures fiches pour `text` : (positions, scores) par score décroissant (ex aequo : ordre du jeu)."""
+        result = self.query(text)
+        if result is None:
+            return np.array([], dtype=np.int32), np.array([], dtype=np.float32)
+        positions, scores = result
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return positions[order], scores[order]
@@ -0,0 +1,270 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import indexes
+
+
+# --- RÉSOLUTION ZONE DE VENTE -> DÉPARTEMENTS ---
+# Départements de métropole (Corse : 2A, 2B) et d'outre-mer (DROM), connus même si le GeoJSON ne les dessine pas
+METROPOLE = sorted([f"{n:02d}" for n in range(1, 96) if n != 20] + ["2A", "2B"])
+OUTRE_MER = ["971", "972", "973", "974", "976"]
+NOMS_OUTRE_MER = {"971": "Guadeloupe", "972": "Martinique", "973": "Guyane", "974": "La Réunion", "976": "Mayotte"}
+
+# Régions (découpage 2016), anciennes régions, grands quarts et outre-mer -> codes des départements membres
+REGIONS = {
+    "auvergne rhone alpes": ["01", "03", "07", "15", "26", "38", "42", "43", "63", "69", "73", "74"],
+    "bourgogne franche comte": ["21", "25", "39", "58", "70", "71", "89", "90"],
+    "bretagne": ["22", "29", "35", "56"],
+    "centre val de loire": ["18", "28", "36", "37", "41", "45"],
+    "corse": ["2A", "2B"],
+    "grand est": ["08", "10", "51", "52", "54", "55", "57", "67", "68", "88"],
+    "hauts de france": ["02", "59", "60", "62", "80"],
+    "ile de france": ["75", "77", "78", "91", "92", "93", "94", "95"],
+    "normandie": ["14", "27", "50", "61", "76"],
+    "nouvelle aquitaine": ["16", "17", "19", "23", "24", "33", "40", "47", "64", "79", "86", "87"],
+    "occitanie": ["09", "11", "12", "30", "31", "32", "34", "46", "48", "65", "66", "81", "82"],
+    "pays de la loire": ["44", "49", "53", "72", "85"],
+    "provence alpes cote d azur": ["04", "05", "06", "13", "83", "84"],
+    "paca": ["04", "05", "06", "13", "83", "84"],
+    "aquitaine": ["24", "33", "40", "47", "64"],
+    "midi pyrenees": ["09", "12", "31", "32", "46", "65", "81", "82"],
+    "languedoc roussillon": ["11", "30", "34", "48", "66"],
+    "rhone alpes": ["01", "07", "26", "38", "42", "69", "73", "74"],
+    "poitou charentes": ["16", "17", "79", "86"],
+    "nord pas de calais": ["59", "62"],
+    "alsace": ["67", "68"],
+    "lorraine": ["54", "55", "57", "88"],
+    "sud ouest": ["09", "12", "16", "17", "24", "31", "32", "33", "40", "46", "47", "64", "65", "81", "82"],
+    "sud est": ["01", "04", "05", "06", "07", "11", "13", "26", "2A", "2B", "30", "34", "38", "42", "48", "66", "69", "73", "74", "83", "84"],
+    "nord ouest": ["14", "22", "27", "29", "35", "44", "49", "50", "53", "56", "61", "72", "76", "85"],
+    "nord est": ["08", "10", "51", "52", "54", "55", "57", "67", "68", "88"],
+    "outre mer": OUTRE_MER,
+    "dom": OUTRE_MER,
+    "drom": OUTRE_MER,
+    "dom tom": OUTRE_MER,
+    "guadeloupe": ["971"],
+    "martinique": ["972"],
+    "guyane": ["973"],
+    "la reunion": ["974"],
+    "reunion": ["974"],
+    "mayotte": ["976"],
+}
+
+# Libellés désignant l'ensemble du territoire (outre-mer compris) ou la seule métropole
+NATIONAL = {
+    "france": METROPOLE + OUTRE_MER,
+    "france entiere": METROPOLE + OUTRE_MER,
+    "toute la france": METROPOLE + OUTRE_MER,
+    "national": METROPOLE + OUTRE_MER,
+    "territoire national": METROPOLE + OUTRE_MER,
+    "france metropolitaine": METROPOLE,
+    "metropole": METROPOLE,
+}
+
+ZONE_COLUMN = "zone_geographique_de_vente"
+ZONE_CACHE_SIZE = 32 # États de filtres dont les effectifs par département sont conservés
+
+# Codes départementaux existants : un nombre n'est lu comme code que seul, entre parenthèses ou après « département »
+_CODE = r"(?:2a|2b|97[1-46]|0[1-9]|1\d|2[1-9]|[3-8]\d|9[0-5])"
+_CODES_ONLY = re.compile(rf"^{_CODE}(?: {_CODE})*$")
+_CODE_IN_CONTEXT = re.compile(rf"\(\s*({_CODE})\s*\)|\b(?:departements?|dept|dpt)\.?\s*({_CODE})\b")
+_CODE_PATTERN = re.compile(rf"\b{_CODE}\b")
+# « France métropolitaine sauf Corse », « toute la France hors DOM » : zone de base privée des zones exclues
+# (le texte est replié sans ponctuation retirée : « à l'exception de » garde son apostrophe)
+_EXCLUSION = re.compile(r"\b(?:sauf|hors|excepte|a l['’\s]+exception\s*(?:d['’]|de\b|des\b|du\b))")
+
+
+def _fold(text):
+    """Minuscules sans accents, ponctuation conservée."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize_name(text):
+    """Minuscules, sans accents ni ponctuation (tirets, apostrophes) : 'Côte-d'Or' -> 'cote d or'."""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", _fold(text)).split())
+
+
+class ZoneResolver:
+    """
+    Table de correspondance normalisée construite à partir des propriétés du GeoJSON (code, nom) :
+    codes départementaux, noms sans accents, régions -> départements membres, territoire national -> tous.
+    Les départements d'outre-mer sont toujours connus, même absents du GeoJSON.
+    """
+
+    def __init__(self, departements):
+        # departements : {code: nom}
+        departements = dict(departements)
+        for code, nom in NOMS_OUTRE_MER.items():
+            departements[code] = departements.get(code) or nom
+        self.codes = sorted(departements)
+        self.names = dict(departements)
+        self._by_code = {code.lower(): code for code in self.codes}
+        self._by_name = {normalize_name(nom): code for code, nom in departements.items() if nom}
+        self._regions = {name: [c for c in codes if c in departements] for name, codes in REGIONS.items()}
+        self._regions = {name: codes for name, codes in self._regions.items() if codes}
+        self._national = {name: [c for c in codes if c in departements] for name, codes in NATIONAL.items()}
+        names = sorted(self._by_name, key=len, reverse=True)
+        self._name_pattern = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b") if names else None
+        regions = sorted(self._regions, key=len, reverse=True)
+        self._region_pattern = re.compile(r"\b(" + "|".join(re.escape(n) for n in regions) + r")\b") if regions else None
+
+    @classmethod
+    def from_geojson(cls, geojson, code_key="code", name_key="nom"):
+        departements = {}
+        for feature in geojson.get("features", []):
+            properties = feature.get("properties") or {}
+            if properties.get(code_key):
+                departements[str(properties[code_key])] = properties.get(name_key, "")
+        return cls(departements)
+
+    @classmethod
+    def from_regions(cls):
+        """Résolveur sans GeoJSON : tous les départements, sans recherche par nom."""
+        return cls({code: "" for code in METROPOLE + OUTRE_MER})
+
+    def resolve_token(self, token):
+        """Codes des départements désignés par une zone élémentaire (liste vide si non reconnue)."""
+        folded = _fold(token)
+        parts = _EXCLUSION.split(folded)
+        if len(parts) > 1:
+            # Sans zone de base (« hors Corse »), l'exclusion s'applique au territoire national
+            base = self.resolve_token(parts[0]) if normalize_name(parts[0]) else self._national["france"]
+            excluded = {code for part in parts[1:] for code in self.resolve_token(part)}
+            return [code for code in base if code not in excluded] if excluded else []
+
+        normalized = normalize_name(folded)
+        if not normalized:
+            return []
+        if normalized in self._national:
+            return list(self._national[normalized])
+        if _CODES_ONLY.match(normalized):
+            found = _CODE_PATTERN.findall(normalized)
+        else:
+            found = [a or b for a, b in _CODE_IN_CONTEXT.findall(folded)]
+        codes = [self._by_code[c] for c in found if c in self._by_code]
+        if codes:
+            return codes
+        if normalized in self._by_name:
+            return [self._by_name[normalized]]
+        if normalized in self._regions:
+            return list(self._regions[normalized])
+        if self._region_pattern is not None:
+            for region in self._region_pattern.findall(normalized):
+                codes.extend(c for c in self._regions[region] if c not in codes)
+        if not codes and self._name_pattern is not None:
+            codes = [self._by_name[name] for name in self._name_pattern.findall(normalized)]
+        if not codes and "france" in normalized.split():
+            return list(self._national["france"])
+        return codes
+
+    def resolve_value(self, value):
+        """
+        Codes distincts (ordre de première apparition) désignés par une valeur multi-zones, et zones élémentaires
+        non reconnues (signalées plutôt qu'ignorées).
+        """
+        codes, unresolved = [], []
+        for token in indexes.split_tokens(value):
+            resolved = self.resolve_token(token)
+            if not resolved:
+                unresolved.append(token)
+            for code in resolved:
+                if code not in codes:
+                    codes.append(code)
+        return codes, unresolved
+
+    def resolve(self, value):
+        """Codes distincts (ordre de première apparition) désignés par une valeur multi-zones."""
+        return self.resolve_value(value)[0]
+
+
+class DepartementBridge:
+    """
+    Pont rappel x département précalculé une fois par version du jeu : chaque valeur distincte de la zone
+    de vente est résolue une seule fois (CSR valeur -> départements), les lignes pointent sur leur valeur.
+    Le nombre de rappels par département d'une sélection est un bincount, mémorisé par état des filtres.
+    """
+
+    def __init__(self, df, resolver, column=ZONE_COLUMN, cache_size=ZONE_CACHE_SIZE):
+        self.resolver = resolver
+        self.codes = list(resolver.codes)
+        code_ids = {code: i for i, code in enumerate(self.codes)}
+        s = df[column] if column in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            row_values, values = s.cat.codes.to_numpy(), list(s.cat.categories)
+        else:
+            row_values, values = pd.factorize(s)
+        self._row_values = np.asarray(row_values, dtype=np.int32)
+        self.n_values = len(values)
+
+        flat_values, flat_codes = [], []
+        # Zones élémentaires non reconnues : paires (valeur, zone), signalées à côté de la carte
+        unresolved_values, unresolved_ids, unresolved = [], [], {}
+        for value_code, value in enumerate(values):
+            resolved, tokens = resolver.resolve_value(value)
+            for code in resolved:
+                flat_values.append(value_code)
+                flat_codes.append(code_ids[code])
+            for token in tokens:
+                unresolved_values.append(value_code)
+                unresolved_ids.append(unresolved.setdefault(token, len(unresolved)))
+        self._flat_values = np.array(flat_values, dtype=np.int64)
+        self._flat_codes = np.array(flat_codes, dtype=np.int64)
+        self.unresolved = list(unresolved)
+        self._unresolved_values = np.array(unresolved_values, dtype=np.int64)
+        self._unresolved_ids = np.array(unresolved_ids, dtype=np.int64)
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pairs(self, selection=None):
+        """Pont explicite (position de ligne, code département) d'une sélection."""
+        positions = np.arange(len(self._row_values)) if selection is None else selection.positions
+        row_values = self._row_values[positions]
+        # _flat_values est trié par construction : starts[v]..starts[v+1] = départements de la valeur v
+        starts = np.searchsorted(self._flat_values, np.arange(self.n_values + 1))
+        first = starts[np.maximum(row_values, 0)]
+        lengths = np.where(row_values >= 0, starts[row_values + 1] - first, 0)
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        flat = np.repeat(first, lengths) + within
+        return pd.DataFrame({"position": np.repeat(positions, lengths), "code": np.array(self.codes, dtype=object)[self._flat_codes[flat]]})
+
+    def _value_counts(self, selection):
+        """Nombre de lignes de la sélection par valeur distincte de la zone de vente."""
+        if selection.mask is None:
+            row_values = self._row_values[:selection.stop]
+        else:
+            row_values = self._row_values[selection.positions]
+        return np.bincount(row_values + 1, minlength=self.n_values + 1)[1:] # Le code -1 (zone manquante) est écarté
+
+    def unresolved_counts(self, selection):
+        """Nombre de rappels de la sélection par zone élémentaire non reconnue (absente de la carte), décroissant."""
+        counts = np.bincount(self._unresolved_ids, weights=self._value_counts(selection)[self._unresolved_values],
+                             minlength=len(self.unresolved)).astype(np.int64)
+        result = pd.Series(counts, index=pd.Index(self.unresolved, name="zone"), name="Nombre_Rappels")
+        return result[result > 0].sort_values(ascending=False, kind="stable")
+
+    def counts(self, selection, context_key=None):
+        """Nombre de rappels par code département (départements sans rappel exclus), trié par code."""
+        with self._lock:
+            if context_key is not None and context_key in self._cache:
+                self._cache.move_to_end(context_key)
+                return self._cache[context_key]
+
+        value_counts = self._value_counts(selection)
+        counts = np.bincount(self._flat_codes, weights=value_counts[self._flat_values], minlength=len(self.codes)).astype(np.int64)
+        result = pd.Series(counts, index=pd.Index(self.codes, name="code"), name="Nombre_Rappels")
+        result = result[result > 0]
+
+        if context_key is not None:
+            with self._lock:
+                self._cache[context_key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
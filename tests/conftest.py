@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from recall_analytics import benchmark, dataset, engine
+
+NOW = pd.Timestamp("2026-06-30T12:00:00Z")
+
+
+@pytest.fixture(scope="session")
+def now():
+    return NOW
+
+
+@pytest.fixture(scope="session")
+def export_csv(tmp_path_factory):
+    """Export RappelConso synthétique (graine fixe) : 3 000 fiches sur trois ans avant NOW."""
+    path = tmp_path_factory.mktemp("export") / "rappelconso_export.csv"
+    return benchmark.generate_export(str(path), 3000, seed=7, now=NOW.floor("D"))
+
+
+@pytest.fixture(scope="session")
+def frame(export_csv):
+    """Jeu chargé comme par le dashboard : trié par date de publication décroissante, colonnes compactées et classées."""
+    df, _, _ = dataset.load_csv(export_csv)
+    return df
+
+
+@pytest.fixture(scope="session")
+def shuffled(frame):
+    """Même jeu dans un ordre quelconque : les fenêtres de période passent par un masque et non un préfixe."""
+    df = frame.sample(frac=1, random_state=11).reset_index(drop=True)
+    df.attrs = dict(frame.attrs)
+    return df
+
+
+@pytest.fixture(scope="session")
+def analytics(frame):
+    return engine.AnalyticsEngine(frame)
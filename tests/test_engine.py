@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recall_analytics import engine
+
+
+def _full_sort(analytics, selection, sort, descending):
+    """Registre complet trié par un tri stable (valeurs manquantes en dernier, ex aequo dans l'ordre du jeu)."""
+    rows = selection.filtree.frame
+    if sort == engine.TRI_PERTINENCE:
+        keys = analytics.search_index.scores(selection.state.recherche, selection.filtree.positions)
+        order = np.argsort(-keys if descending else keys, kind="stable")
+        return rows.iloc[order]
+    codes, _ = pd.factorize(rows[sort], sort=True)
+    n_values = codes.max() + 1
+    keys = np.where(codes < 0, n_values, (n_values - 1 - codes) if descending else codes)
+    return rows.iloc[np.argsort(keys, kind="stable")]
+
+
+def _check_pages(analytics, selection, sort, descending, page_size=37):
+    expected = _full_sort(analytics, selection, sort, descending)["reference_fiche"].to_numpy()
+    n_pages = -(-len(expected) // page_size)
+    for page in sorted({1, 2, n_pages // 2 or 1, n_pages, n_pages + 1}):
+        frame, n_rows = analytics.registry_page(selection, sort, descending, page, page_size)
+        start = (page - 1) * page_size
+        assert n_rows == len(expected)
+        assert list(frame.index) == list(range(start, start + len(frame)))
+        np.testing.assert_array_equal(frame["reference_fiche"].to_numpy(), expected[start:start + page_size])
+
+
+@pytest.mark.parametrize("sort", engine.REGISTRE_TRIS)
+@pytest.mark.parametrize("descending", [True, False])
+def test_registry_page_matches_full_stable_sort(frame, shuffled, now, sort, descending):
+    for df in (frame, shuffled):
+        analytics = engine.AnalyticsEngine(df)
+        selection = analytics.select(engine.FilterState("12 derniers mois", distrib="leclerc"), now)
+        _check_pages(analytics, selection, sort, descending)
+
+
+@pytest.mark.parametrize("descending", [True, False])
+def test_registry_relevance_page_matches_full_stable_sort(analytics, now, descending):
+    # Scores très répétés (quelques combinaisons de champs) : les ex aequo traversent les limites de page
+    selection = analytics.select(engine.FilterState("Toute la période", recherche="listeria"), now)
+    assert len(selection) > 100
+    _check_pages(analytics, selection, engine.TRI_PERTINENCE, descending)
+    frame, _ = analytics.registry_page(selection, engine.TRI_PERTINENCE, descending, 1, 10)
+    assert frame.columns[0] == engine.TRI_PERTINENCE
+
+
+def test_registry_page_projects_columns(analytics, now):
+    selection = analytics.select(engine.FilterState("6 derniers mois"), now)
+    frame, _ = analytics.registry_page(selection, "nom_marque_du_produit", columns=["nom_marque_du_produit", "absente", "reference_fiche"])
+    assert list(frame.columns) == ["nom_marque_du_produit", "reference_fiche"]
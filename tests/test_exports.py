@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recall_analytics import engine, exports
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pa_parquet # noqa: E402
+
+COLUMNS = ["reference_fiche", "date_publication", "nom_marque_du_produit", "motif_du_rappel"]
+
+
+def _read(fmt, data):
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    if fmt == "parquet":
+        return pa_parquet.read_table(io.BytesIO(data)).to_pandas()
+    if fmt == "arrow":
+        return pa.ipc.open_file(io.BytesIO(data)).read_all().to_pandas()
+    return pd.read_excel(io.BytesIO(data), sheet_name="Rappels", dtype=str, keep_default_na=False)
+
+
+@pytest.mark.parametrize("fmt", list(exports.EXPORT_FORMATS))
+def test_export_round_trip(shuffled, fmt):
+    if not exports.EXPORT_FORMATS[fmt].available:
+        pytest.skip(f"moteur {fmt} non installé")
+    positions = np.flatnonzero(shuffled["nom_marque_du_produit"].notna().to_numpy())[::3]
+    # Blocs volontairement petits : l'export est écrit en plusieurs morceaux
+    data = exports.write_export(shuffled, positions, COLUMNS, fmt, chunk_rows=97)
+    expected = shuffled.iloc[positions][COLUMNS].reset_index(drop=True)
+    result = _read(fmt, data)
+
+    assert list(result.columns) == COLUMNS
+    assert len(result) == len(positions)
+    if fmt in ("parquet", "arrow"):
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    else:
+        pd.testing.assert_series_equal(result["reference_fiche"], expected["reference_fiche"].astype(str), check_dtype=False)
+        pd.testing.assert_series_equal(result["motif_du_rappel"], expected["motif_du_rappel"].fillna("").astype(str), check_dtype=False)
+
+
+def test_export_empty_selection_keeps_header(frame):
+    data = exports.write_export(frame, np.array([], dtype=np.int64), COLUMNS, "csv")
+    assert data.decode("utf-8").strip() == ",".join(COLUMNS)
+
+
+def test_export_cache_reuses_file(analytics, now):
+    selection = analytics.select(engine.FilterState("3 derniers mois"), now)
+    first = analytics.export(selection, "csv")
+    assert analytics.export(selection, "csv") is first
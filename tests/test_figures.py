@@ -0,0 +1,48 @@
+import pandas as pd
+
+from recall_analytics import figures
+
+
+def _bubbles():
+    return pd.DataFrame({
+        "distributeurs": ["leclerc", "carrefour", "auchan"],
+        "Délai_Moyen_Jours": [12.0, 30.5, 7.25],
+        "Nb_Rappels": [40, 12, 3],
+        "Coût_Risque_Simulé": [1.5e6, 2.0e5, 9.0e4],
+        "Gravite_Moyenne": [1.6, 1.2, 1.0],
+    })
+
+
+def test_cached_figure_serializes_like_the_built_figure():
+    avg_distrib = _bubbles()
+    cache = figures.FigureCache()
+    built = figures.figure_bulles_distributeurs(avg_distrib)
+
+    first = cache.get("bulles", avg_distrib, (), lambda: built)
+    second = cache.get("bulles", avg_distrib.copy(), (), lambda: figures.figure_bulles_distributeurs(avg_distrib))
+
+    assert second is first
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    assert figures.chart_spec(first) == figures.chart_spec(built)
+    # Servie telle quelle : ni copie ni revalidation à l'affichage
+    assert first.to_dict() is first.to_dict()
+
+
+def test_cache_key_follows_aggregate_content_and_params():
+    avg_distrib = _bubbles()
+    cache = figures.FigureCache()
+    build = lambda: figures.figure_bulles_distributeurs(avg_distrib)
+
+    cache.get("bulles", avg_distrib, (), build)
+    cache.get("bulles", avg_distrib.assign(Nb_Rappels=[41, 12, 3]), (), build)
+    cache.get("bulles", avg_distrib, ("autre",), build)
+    assert (cache.hits, cache.misses) == (0, 3)
+
+
+def test_cache_evicts_by_serialized_size():
+    avg_distrib = _bubbles()
+    size = len(figures.figure_bulles_distributeurs(avg_distrib).to_json())
+    cache = figures.FigureCache(max_bytes=int(size * 1.5))
+    for i in range(3):
+        cache.get("bulles", avg_distrib, (i,), lambda: figures.figure_bulles_distributeurs(avg_distrib))
+    assert len(cache) == 1 and cache.size <= cache.max_bytes
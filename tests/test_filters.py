@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from recall_analytics import filters
+
+
+@pytest.mark.parametrize("periode", list(filters.PERIODE_OPTIONS))
+def test_period_prefix_matches_mask(frame, shuffled, now, periode):
+    sorted_engine = filters.FilterEngine(frame)
+    shuffled_engine = filters.FilterEngine(shuffled)
+    assert sorted_engine.dates_sorted and not shuffled_engine.dates_sorted
+
+    prefix = sorted_engine.period(periode, now)
+    masked = shuffled_engine.period(periode, now)
+
+    assert prefix.mask is None
+    assert periode == "Toute la période" or masked.mask is not None
+    assert len(prefix) == len(masked)
+    assert set(prefix.frame["reference_fiche"]) == set(masked.frame["reference_fiche"])
+
+
+def test_prefix_selection_matches_equivalent_mask(frame):
+    stop = len(frame) // 3
+    prefix = filters.RowSelection(frame, stop=stop)
+    mask = np.zeros(len(frame), dtype=bool)
+    mask[:stop] = True
+    masked = filters.RowSelection(frame, mask=mask)
+
+    np.testing.assert_array_equal(prefix.positions, masked.positions)
+    assert prefix.frame.equals(masked.frame)
+
+
+def test_refine_on_prefix_matches_refine_on_mask(frame, shuffled, now):
+    criteria = {"nom_marque_du_produit": str(frame["nom_marque_du_produit"].mode()[0]), "distributeurs": "leclerc"}
+    selections = []
+    for df in (frame, shuffled):
+        engine = filters.FilterEngine(df)
+        selections.append(engine.period("12 derniers mois", now).refine(engine.combined_mask(criteria)))
+
+    prefix, masked = selections
+    assert len(prefix) > 0
+    assert sorted(prefix.frame["reference_fiche"]) == sorted(masked.frame["reference_fiche"])
+    # Les lignes hors préfixe ne passent jamais, même si elles vérifient les critères
+    assert not prefix.mask[prefix.stop:].any() or prefix.stop == len(frame)
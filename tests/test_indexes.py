@@ -0,0 +1,56 @@
+import pandas as pd
+
+from recall_analytics import filters, indexes
+
+
+def _expected_counts(s):
+    """explode().value_counts(), ex aequo rangés par première apparition (contrat de TokenBridge.counts)."""
+    exploded = s.astype(object).map(indexes.split_tokens).explode().dropna()
+    counts = exploded.value_counts(sort=False)
+    first_seen = pd.Series(range(len(exploded)), index=exploded.to_numpy()).groupby(level=0).min()
+    order = sorted(counts.index, key=lambda token: (-counts[token], first_seen[token]))
+    return [(token, int(counts[token])) for token in order]
+
+
+def test_bridge_counts_tie_order_follows_first_appearance():
+    # b, c, a et d ont le même effectif : ordre de première apparition dans la sélection
+    s = pd.Series(["b;c", "a", "c;a", "d", "b", None, "d;e"], dtype="category")
+
+    counts = indexes.TokenBridge.from_series(s).counts()
+
+    assert list(counts.items()) == [("b", 2), ("c", 2), ("a", 2), ("d", 2), ("e", 1)]
+    assert list(counts.items()) == _expected_counts(s)
+
+
+def test_bridge_counts_tie_order_within_selection():
+    s = pd.Series(["x", "y", "z;x", "y", "z"], dtype="category")
+    # Sélection des lignes 2..4 : z (2), puis x et y (1), x apparu le premier
+    selection = filters.RowSelection.from_positions(pd.DataFrame(index=s.index), [2, 3, 4])
+
+    counts = indexes.TokenBridge.from_series(s).counts(selection)
+
+    assert list(counts.items()) == [("z", 2), ("x", 1), ("y", 1)]
+
+
+def test_bridge_counts_on_selection(frame, now):
+    engine = filters.FilterEngine(frame)
+    selection = engine.period("6 derniers mois", now).refine(engine.mask("categorie_de_produit", str(frame["categorie_de_produit"].mode()[0])))
+    for col in indexes.MULTI_VALUED_COLUMNS:
+        if col in frame.columns:
+            counts = indexes.TokenBridge.from_series(frame[col]).counts(selection)
+            assert list(counts.items()) == _expected_counts(selection.frame[col]), col
+
+
+def test_bridge_counts_by_matches_counts_per_group():
+    s = pd.Series(["b;c", "a", "c;a", "d", "b", None, "d;e", "a;b"], dtype="category")
+    groups = pd.Series(["x", "y", "x", "y", "x", "x", "y", "z"])
+    bridge = indexes.TokenBridge.from_series(s)
+    codes, labels = pd.factorize(groups)
+
+    by_group = bridge.counts_by(codes, groups=labels)
+
+    assert list(by_group.index.get_level_values(0).unique()) == ["x", "y", "z"]
+    for label in labels:
+        selection = filters.RowSelection.from_positions(pd.DataFrame(index=s.index), (groups == label).to_numpy().nonzero()[0])
+        expected = bridge.counts(selection)
+        assert list(by_group.loc[label].items()) == list(expected.items())
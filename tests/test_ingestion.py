@@ -0,0 +1,127 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from recall_analytics import ingestion
+
+pytest.importorskip("pyarrow")
+
+
+def make_record(number, modified, published=None, motif="listeria"):
+    return {
+        "numero_fiche": f"2024-{number:05d}",
+        "date_publication": published or modified,
+        ingestion.SYNC_DATE_FIELD: modified,
+        "categorie_produit": "alimentation",
+        "marque_produit": f"marque {number % 7}",
+        "motif_rappel": motif,
+        "distributeurs": ["carrefour", "leclerc"],
+    }
+
+
+class FakeRecordsApi(BaseHTTPRequestHandler):
+    """Endpoint "records" minimal : tri (date de modification, numéro de fiche), bornes du curseur, offset/limit."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        self.server.queries.append(query)
+        offset, limit = int(query["offset"][0]), int(query["limit"][0])
+        if offset + limit > ingestion.MAX_OFFSET:
+            self.send_error(400, "offset + limit > MAX_OFFSET")
+            return
+
+        position = lambda r: (pd.Timestamp(r[ingestion.SYNC_DATE_FIELD]), r["numero_fiche"])
+        records = sorted(self.server.records, key=position)
+        if "where" in query:
+            where = query["where"][0]
+            cursor = pd.Timestamp(re.search(r"date'([^']*)'", where).group(1))
+            key = re.search(r"numero_fiche > '([^']*)'", where)
+            if key:
+                records = [r for r in records if position(r) > (cursor, key.group(1))]
+            else:
+                records = [r for r in records if position(r)[0] >= cursor]
+
+        body = json.dumps({"total_count": len(records), "results": records[offset:offset + limit]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRecordsApi)
+    server.records, server.queries = [], []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/records"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_full_pull(api, tmp_path):
+    api.records = [make_record(i, f"2024-01-{1 + i // 3:02d}T10:00:00+00:00") for i in range(30)]
+
+    resume = ingestion.sync(tmp_path, base_url=api.url, page_size=7)
+
+    store = ingestion.load_store(tmp_path)
+    assert resume["recus"] == 30
+    assert resume["revision"] == 1
+    assert sorted(store["reference_fiche"]) == sorted(r["numero_fiche"] for r in api.records)
+    assert store["date_publication"].is_monotonic_decreasing
+    state = ingestion.read_state(tmp_path)
+    assert (state["cursor"], state["cursor_key"]) == ("2024-01-10T10:00:00+00:00", "2024-00029")
+
+
+def test_keyset_past_max_offset_keeps_ties(api, monkeypatch):
+    monkeypatch.setattr(ingestion, "MAX_OFFSET", 10)
+    # 14 fiches à la même seconde : des pages entières partagent la date du curseur
+    api.records = ([make_record(i, "2024-01-01T00:00:00+00:00") for i in range(3)]
+                   + [make_record(i, "2024-02-01T00:00:00+00:00") for i in range(3, 17)]
+                   + [make_record(i, "2024-03-01T00:00:00+00:00") for i in range(17, 23)])
+
+    pages = list(ingestion.fetch_pages(base_url=api.url, page_size=5))
+
+    received = [r["numero_fiche"] for page in pages for r in page]
+    assert received == [f"2024-{i:05d}" for i in range(23)]
+    assert any("numero_fiche >" in q.get("where", [""])[0] for q in api.queries)
+    assert all(int(q["offset"][0]) + 5 <= 10 for q in api.queries)
+
+
+def test_delta_upserts_modified_fiche(api, tmp_path):
+    api.records = [make_record(i, f"2024-01-{1 + i:02d}T08:00:00+00:00") for i in range(10)]
+    ingestion.sync(tmp_path, base_url=api.url, page_size=4)
+
+    modified = make_record(2, "2024-02-15T09:30:00+00:00", published="2024-01-03T08:00:00+00:00", motif="salmonelle")
+    api.records[2] = modified
+    api.records.append(make_record(10, "2024-02-16T08:00:00+00:00"))
+    resume = ingestion.sync(tmp_path, base_url=api.url, page_size=4)
+
+    store = ingestion.load_store(tmp_path).set_index("reference_fiche")
+    assert resume["recus"] == 2
+    assert resume["revision"] == 2
+    assert len(store) == 11
+    assert store.loc["2024-00002", "motif_du_rappel"] == "salmonelle"
+    assert store.loc["2024-00002", "date_publication"] == pd.Timestamp("2024-01-03T08:00:00Z")
+
+
+def test_empty_sync_keeps_revision(api, tmp_path):
+    api.records = [make_record(i, "2024-01-05T12:00:00+00:00") for i in range(5)]
+    first = ingestion.sync(tmp_path, base_url=api.url, page_size=5)
+    state = ingestion.read_state(tmp_path)
+
+    second = ingestion.sync(tmp_path, base_url=api.url, page_size=5)
+
+    assert second["recus"] == 0
+    assert second["revision"] == first["revision"] == 1
+    assert len(ingestion._parts(tmp_path)) == 1
+    assert ingestion.read_state(tmp_path)["cursor_key"] == state["cursor_key"] == "2024-00004"
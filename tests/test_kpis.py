@@ -0,0 +1,56 @@
+import dataclasses
+
+import pandas as pd
+import pytest
+
+from recall_analytics import engine, filters, kpis
+
+
+def _rows_only(selection):
+    """Mêmes KPIs recalculés depuis les lignes : références marché, séries mensuelles et effectifs par token."""
+    state = selection.state
+    periode = selection.periode.frame
+    categorie = periode if state.cat == filters.TOUTES else periode[periode["categorie_de_produit"] == state.cat]
+    return kpis.compute_kpis(selection.frame, kpis.market_baseline(periode), kpis.market_baseline(categorie),
+                             marque=state.marque, cat=state.cat,
+                             imr_mensuel_marque=(kpis.imr_per_month(periode[periode["nom_marque_du_produit"] == state.marque])
+                                                 if state.marque != filters.TOUTES else None))
+
+
+def _states(frame):
+    periode = "12 derniers mois"
+    marque = str(frame["nom_marque_du_produit"].mode()[0])
+    cat = str(frame["categorie_de_produit"].mode()[0])
+    return [
+        engine.FilterState(periode),
+        engine.FilterState("Toute la période", cat=cat),
+        engine.FilterState(periode, marque=marque),
+        engine.FilterState(periode, cat=cat, distrib="leclerc"),
+    ]
+
+
+def test_engine_kpis_match_row_computation(analytics, frame, now):
+    for state in _states(frame):
+        selection = analytics.select(state, now)
+        assert len(selection) > 0
+        expected = dataclasses.asdict(_rows_only(selection))
+        for name, value in dataclasses.asdict(analytics.kpis(selection)).items():
+            if isinstance(value, float):
+                assert value == pytest.approx(expected[name], rel=1e-9, abs=1e-9), (state, name)
+            else:
+                assert value == expected[name], (state, name)
+
+
+def test_severe_share_label_without_risks(frame):
+    sans_risques = frame.drop(columns=["risques_encourus"]).head(200)
+    bundle = kpis.compute_kpis(sans_risques, kpis.market_baseline(sans_risques))
+    assert bundle.pc_risques_graves is None
+    assert bundle.pc_risques_graves_label == "N/A"
+
+    bundle = kpis.compute_kpis(frame.head(200), kpis.market_baseline(frame.head(200)))
+    assert bundle.pc_risques_graves_label == f"{frame.head(200)['is_risque_grave'].mean() * 100:.1f}%"
+
+
+def test_empty_selection_is_rejected(frame):
+    with pytest.raises(ValueError):
+        kpis.compute_kpis(frame.iloc[:0], kpis.market_baseline(frame))
@@ -0,0 +1,43 @@
+from recall_analytics import perf
+
+
+def test_disabled_recorder_records_nothing():
+    recorder = perf.PerfRecorder()
+    recorder.start_run(False)
+    with recorder.span("etape") as span:
+        span.rows = 3
+    assert recorder.last_run == [] and recorder.totals == {} and recorder.runs == 0
+
+
+def test_nested_spans_and_totals():
+    recorder = perf.PerfRecorder()
+    recorder.start_run(True)
+    with recorder.span("parent"):
+        with recorder.span("enfant", rows=10):
+            pass
+    assert [(r["etape"], r["profondeur"]) for r in recorder.last_run] == [("parent", 0), ("enfant", 1)]
+    assert recorder.totals["enfant"]["lignes"] == 10
+    assert list(recorder.last_run_frame()["Étape"]) == ["parent", "· enfant"]
+
+
+def test_fragment_rerun_starts_its_own_run():
+    recorder = perf.PerfRecorder()
+    recorder.start_run(True)
+    with recorder.span("onglet1"):
+        # Rerun complet : le fragment s'exécute dans le span de son onglet
+        recorder.start_fragment("onglet_fabricants")
+        with recorder.span("classement"):
+            pass
+    assert [r["etape"] for r in recorder.last_run] == ["onglet1", "classement"]
+    assert recorder.runs == 1 and recorder.fragment is None
+
+    # Rerun du fragment seul : nouvelles mesures, sans mélange avec le rerun complet précédent
+    recorder.start_fragment("onglet_fabricants")
+    with recorder.span("classement"):
+        pass
+    assert [(r["etape"], r["rerun"], r["fragment"]) for r in recorder.last_run] == [("classement", 2, "onglet_fabricants")]
+    assert recorder.runs == 2
+    assert recorder.totals["classement"]["appels"] == 2 and recorder.totals["onglet1"]["appels"] == 1
+
+    recorder.start_run(True)
+    assert recorder.last_run == [] and recorder.fragment is None and recorder.runs == 3
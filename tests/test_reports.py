@@ -0,0 +1,52 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from recall_analytics import filters, kpis, reports
+
+
+@pytest.fixture(scope="module")
+def scorecards(export_csv, now):
+    return reports.generate(export_csv, periodes=["12 derniers mois", "Toute la période"], workers=1, now=now)
+
+
+def _same(expected, actual):
+    if expected is None:
+        return pd.isna(actual)
+    if isinstance(expected, str):
+        return expected == actual
+    return np.isclose(expected, actual)
+
+
+@pytest.mark.parametrize("col", list(reports.DIMENSIONS))
+def test_scorecards_match_compute_kpis(scorecards, analytics, now, col):
+    baselines = analytics.market_baselines(now)
+    for periode in ("12 derniers mois", "Toute la période"):
+        selection = analytics.period(periode, now)
+        frame = selection.frame
+        marche = kpis.lookup_baseline(baselines, periode)
+        fiches = scorecards[(scorecards["periode"] == periode) & (scorecards["dimension"] == col)].set_index("valeur")
+        assert set(fiches.index) == set(frame[col].dropna().unique())
+
+        for value in list(fiches.index)[::7]:
+            rows = selection.positions[(frame[col] == value).to_numpy()]
+            value_selection = filters.RowSelection.from_positions(analytics.df, rows)
+            sub = analytics.df.iloc[rows]
+            if col == "nom_marque_du_produit":
+                options = dict(marque=value, imr_mensuel_marque=kpis.imr_per_month(sub))
+                marche_categorie = marche
+            else:
+                options = dict(cat=value)
+                marche_categorie = kpis.lookup_baseline(baselines, periode, value)
+            token_counts = {c: analytics.token_bridges[c].counts(value_selection) for c in ("risques_encourus", "distributeurs")}
+            bundle = kpis.compute_kpis(sub, marche, marche_categorie, token_counts=token_counts, **options)
+            for field, expected in dataclasses.asdict(bundle).items():
+                assert _same(expected, fiches.loc[value, field]), (value, field)
+
+
+def test_scorecards_order_and_pool(scorecards, export_csv, now):
+    assert (scorecards.groupby(["periode", "dimension"], observed=True)["total_rappels"].apply(lambda s: s.is_monotonic_decreasing)).all()
+    pooled = reports.generate(export_csv, periodes=["12 derniers mois", "Toute la période"], workers=2, now=now)
+    pd.testing.assert_frame_equal(pooled, scorecards)
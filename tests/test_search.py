@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from recall_analytics import search
+
+
+@pytest.fixture(scope="module")
+def index(frame):
+    return search.SearchIndex(frame)
+
+
+@pytest.mark.parametrize("prefix", ["", "a", "list", "listeria", "sal", "zz", "￿"])
+def test_prefix_range_matches_brute_force(index, prefix):
+    start, stop = index._prefix_range(prefix)
+    expected = [i for i, term in enumerate(index._terms) if term.startswith(prefix)]
+    assert list(range(start, stop)) == expected
+
+
+def _documents(frame):
+    terms = [set() for _ in range(len(frame))]
+    for col in search.SEARCH_COLUMNS:
+        for i, value in enumerate(frame[col].to_numpy()):
+            if isinstance(value, str):
+                terms[i].update(search.analyze(value))
+    return terms
+
+
+@pytest.mark.parametrize("query", ["listeria", "Listéri", "salmonelles oeufs", "corps étranger", "de la"])
+def test_query_requires_every_term(index, frame, query):
+    result = index.query(query)
+    terms = list(dict.fromkeys(search.analyze(query)))
+    if not terms:
+        assert result is None
+        return
+    documents = _documents(frame)
+    expected = [i for i, doc in enumerate(documents) if all(any(t.startswith(term) for t in doc) for term in terms)]
+    positions, scores = result
+    np.testing.assert_array_equal(positions, expected)
+    assert (scores > 0).all()
+
+
+def test_search_orders_by_score(index):
+    positions, scores = index.search("listeria", limit=50)
+    assert len(positions) == len(scores) <= 50
+    assert (np.diff(scores) <= 0).all()
+    assert index.search("de la")[0].size == 0
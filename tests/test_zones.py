@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from recall_analytics import filters, zones
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return zones.ZoneResolver({"75": "Paris", "33": "Gironde", "2A": "Corse-du-Sud", "2B": "Haute-Corse", "21": "Côte-d'Or"}
+                              | {code: "" for code in zones.METROPOLE if code not in {"75", "33", "2A", "2B", "21"}})
+
+
+@pytest.mark.parametrize("zone, expected", [
+    ("Paris (75)", ["75"]),
+    ("Département 33", ["33"]),
+    ("75 92 93", ["75", "92", "93"]),
+    ("Côte-d'Or", ["21"]),
+    ("Outre-mer", zones.OUTRE_MER),
+    ("vendu dans 15 magasins", []),
+    ("Lot 2024 (rappel)", []),
+])
+def test_resolve_token(resolver, zone, expected):
+    assert resolver.resolve_token(zone) == expected
+
+
+def test_resolve_national_and_exclusions(resolver):
+    assert sorted(resolver.resolve_token("France entière")) == sorted(zones.METROPOLE + zones.OUTRE_MER)
+    assert resolver.resolve_token("France métropolitaine") == zones.METROPOLE
+    assert resolver.resolve_token("France métropolitaine sauf Corse") == [c for c in zones.METROPOLE if c not in {"2A", "2B"}]
+    assert resolver.resolve_token("Toute la France hors DOM") == zones.METROPOLE
+    assert resolver.resolve_token("Toute la France à l'exception de la Corse") == [c for c in zones.METROPOLE + zones.OUTRE_MER if c not in {"2A", "2B"}]
+    assert resolver.resolve_token("France métropolitaine à l’exception de la Corse") == resolver.resolve_token("France métropolitaine sauf Corse")
+    assert resolver.resolve_token("France entière à l'exception d'Outre-mer") == zones.METROPOLE
+    assert resolver.resolve_token("hors Corse") == [c for c in zones.METROPOLE + zones.OUTRE_MER if c not in {"2A", "2B"}]
+
+
+def test_resolve_regions(resolver):
+    assert resolver.resolve_token("Sud-Ouest")
+    assert resolver.resolve_token("Île-de-France") == zones.REGIONS["ile de france"]
+    assert set(resolver.resolve_token("Bretagne et Normandie")) == set(zones.REGIONS["bretagne"] + zones.REGIONS["normandie"])
+
+
+def test_resolve_value_reports_unresolved(resolver):
+    codes, unresolved = resolver.resolve_value("Paris (75);Gironde;Paris (75);magasins du centre-ville")
+    assert codes == ["75", "33"]
+    assert unresolved == ["magasins du centre-ville"]
+
+
+def test_bridge_counts_and_unresolved(resolver):
+    df = pd.DataFrame({zones.ZONE_COLUMN: ["Paris (75);Gironde", "Gironde;inconnue", None, "inconnue", "Corse;ailleurs"]})
+    bridge = zones.DepartementBridge(df, resolver)
+    everything = filters.RowSelection(df)
+    assert bridge.counts(everything).to_dict() == {"2A": 1, "2B": 1, "33": 2, "75": 1}
+    assert bridge.unresolved_counts(everything).to_dict() == {"inconnue": 2, "ailleurs": 1}
+
+    subset = filters.RowSelection.from_positions(df, [1, 4])
+    assert bridge.counts(subset).to_dict() == {"2A": 1, "2B": 1, "33": 1}
+    assert bridge.unresolved_counts(subset).to_dict() == {"inconnue": 1, "ailleurs": 1}
+    assert bridge.pairs(subset)["position"].tolist() == [1, 4, 4]